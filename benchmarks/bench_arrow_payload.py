@@ -0,0 +1,118 @@
+"""
+Cost of sending tabular inputs as Struct rows (PredictBatch) or as one
+Arrow IPC record batch (PredictArrow).
+
+    python benchmarks/bench_arrow_payload.py [--iterations N] [--columns N]
+
+For 10, 100 and 1000 rows of N float columns, "codec" is the work both
+sides do for one call without the network: the client encodes and
+serializes the request, the server parses and decodes it, and the response
+goes back the same way. "end to end" is one call through a server on
+localhost. The model does no work, so only payload handling is measured.
+Struct rows are dicts of floats; Arrow columns are numpy arrays, as a
+client holding tabular data would have them. Requires numpy and pyarrow.
+"""
+
+import argparse
+import timeit
+from concurrent import futures
+
+import grpc
+import numpy as np
+
+from aigear.service.grpc.client import ModelClient, decode_response, encode_request
+from aigear.service.grpc.grpc_package.arrow_codec import decode_table, encode_table
+from aigear.service.grpc.grpc_package.prediction import batch_response, decode_request
+from aigear.service.grpc.grpc_service import MLServicer
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+ROWS = (10, 100, 1000)
+
+
+class _Model:
+    def predict(self, data):
+        return 0.0
+
+    def predict_batch(self, inputs):
+        return [0.0] * len(inputs)
+
+    def predict_arrow(self, table):
+        return np.zeros(table.num_rows)
+
+
+def struct_codec(rows: list) -> list:
+    request = grpc_pb2.MLBatchRequest()
+    for row in rows:
+        request.requests.add().CopyFrom(encode_request(row))
+    received = grpc_pb2.MLBatchRequest.FromString(request.SerializeToString())
+    inputs = [decode_request(item) for item in received.requests]
+    response = batch_response([(0.0, None) for _ in inputs])
+    received = grpc_pb2.MLBatchResponse.FromString(response.SerializeToString())
+    return [decode_response(result.response) for result in received.results]
+
+
+def arrow_codec(columns: dict) -> list:
+    request = grpc_pb2.ArrowRequest(data=encode_table(columns))
+    received = grpc_pb2.ArrowRequest.FromString(request.SerializeToString())
+    table = decode_table(received.data)
+    response = grpc_pb2.ArrowResponse(data=encode_table(np.zeros(table.num_rows)))
+    received = grpc_pb2.ArrowResponse.FromString(response.SerializeToString())
+    return decode_table(received.data).column("prediction").to_pylist()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--columns", type=int, default=40)
+    args = parser.parse_args()
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    servicer = MLServicer(_Model(), {"request_logging": {"sample_rate": 0}})
+    grpc_pb2_grpc.add_MLServicer_to_server(servicer, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    client = ModelClient(f"localhost:{port}", retry=None)
+    client.wait_ready(timeout=10)
+
+    print(
+        f"Per-call cost, {args.columns} float columns, {args.iterations} runs "
+        f"(Struct / Arrow)"
+    )
+    print(f"  {'rows':>5} {'codec':>26} {'end to end':>26}")
+    try:
+        for row_count in ROWS:
+            names = [f"f{index}" for index in range(args.columns)]
+            rows = [
+                {
+                    name: float(row * args.columns + index)
+                    for index, name in enumerate(names)
+                }
+                for row in range(row_count)
+            ]
+            columns = {name: np.array([row[name] for row in rows]) for name in names}
+            calls = {
+                "struct codec": lambda: struct_codec(rows),
+                "arrow codec": lambda: arrow_codec(columns),
+                "struct call": lambda: client.predict_batch(rows),
+                "arrow call": lambda: client.predict_arrow(columns),
+            }
+            micros = {
+                name: timeit.timeit(call, number=args.iterations)
+                / args.iterations
+                * 1e6
+                for name, call in calls.items()
+            }
+            print(
+                f"  {row_count:>5} "
+                f"{micros['struct codec']:>10.0f} / {micros['arrow codec']:>7.0f} us "
+                f"({micros['struct codec'] / micros['arrow codec']:4.1f}x) "
+                f"{micros['struct call']:>10.0f} / {micros['arrow call']:>7.0f} us "
+                f"({micros['struct call'] / micros['arrow call']:4.1f}x)"
+            )
+    finally:
+        client.close()
+        server.stop(grace=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Memory used by N worker processes that each load the same model artifact.
+
+    python benchmarks/bench_model_memory.py [--workers N] [--mb SIZE]
+
+Each worker loads a model holding SIZE MB of float32 weights, runs a
+prediction over all of it and reports its PSS and USS. This is what happens
+when workers are restarted or hot-reload a new model after the fork. With
+plain pickle every worker holds a private copy; with `load_model` the
+weights are mapped from the file and shared, so the total PSS stays close
+to one copy however many workers run. Linux only (reads smaps_rollup).
+"""
+
+import argparse
+import multiprocessing
+import pickle
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from aigear.management.model_artifact import load_model, save_model
+from aigear.service.grpc.grpc_package.worker_pool import process_memory
+
+MB = 1024 * 1024
+
+
+def _worker(load, path, ready, results, done):
+    model = load(path)
+    # Touch every page, as inference over the full weight matrix would
+    float(model["weights"].sum())
+    ready.wait()
+    results.put(process_memory())
+    done.wait()
+
+
+def _pickle_load(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def _measure(load, path, workers):
+    ready = multiprocessing.Barrier(workers)
+    done = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(load, path, ready, results, done))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    # Sample while every worker is alive so shared pages are split between all
+    memory = [results.get() for _ in processes]
+    done.set()
+    for process in processes:
+        process.join()
+    return memory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mb", type=int, default=256)
+    args = parser.parse_args()
+
+    if process_memory() is None:
+        raise SystemExit("/proc/self/smaps_rollup is not available on this system.")
+
+    model = {"weights": np.ones(args.mb * MB // 4, dtype=np.float32)}
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = Path(tmp) / "model_pickle.pkl"
+        with open(pickle_path, "wb") as f:
+            pickle.dump(model, f, protocol=5)
+        mmap_path = save_model(model, Path(tmp) / "model_mmap.pkl")
+        del model
+
+        print(f"{args.workers} workers, {args.mb} MB model")
+        print(f"{'loader':<12}{'total PSS':>12}{'USS/worker':>12}")
+        for name, load, path in (
+            ("pickle", _pickle_load, pickle_path),
+            ("load_model", load_model, mmap_path),
+        ):
+            memory = _measure(load, path, args.workers)
+            total_pss = sum(m["pss"] for m in memory) / MB
+            uss = sum(m["uss"] for m in memory) / len(memory) / MB
+            print(f"{name:<12}{total_pss:>10.0f}MB{uss:>10.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-request cost of request logging as paid by the serving thread.
+
+    python benchmarks/bench_request_logging.py [--iterations N] [--features N]
+
+Each row runs the three log calls MLServicer.Predict makes for one request
+with a payload of N floats. "legacy" is the previous synchronous
+`logger.info(f"...")` pattern. Output goes to /dev/null.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+from aigear.common.logger import Logging
+from aigear.service.grpc.grpc_package.request_logging import RequestLogger
+
+CONFIGS = {
+    "sampling off": {"sample_rate": 0.0},
+    "1% sampled, truncate": {"sample_rate": 0.01, "payload": "truncate"},
+    "all, hash": {"sample_rate": 1.0, "payload": "hash"},
+    "all, truncate": {"sample_rate": 1.0, "payload": "truncate"},
+    "all, full": {"sample_rate": 1.0, "payload": "full"},
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--features", type=int, default=1000)
+    args = parser.parse_args()
+
+    model_input = {"features": [0.5] * args.features}
+    model_output = [1]
+
+    sys.stdout = open(os.devnull, "w")
+    legacy_logger = Logging(log_name="bench.legacy").console_logging()
+
+    def legacy():
+        legacy_logger.info("Predict function called:")
+        legacy_logger.info(f"Model input: {model_input}.")
+        legacy_logger.info(f"Model output: {model_output}.")
+
+    calls = {"legacy": legacy}
+    for name, config in CONFIGS.items():
+        request_logger = RequestLogger.from_config(config)
+
+        def run(request_logger=request_logger):
+            request_log = request_logger.sample()
+            request_log.info("Predict function called:")
+            request_log.payload("Model input", model_input)
+            request_log.payload("Model output", model_output)
+
+        calls[name] = run
+
+    results = {
+        name: timeit.timeit(call, number=args.iterations) / args.iterations * 1e6
+        for name, call in calls.items()
+    }
+    sys.stdout = sys.__stdout__
+
+    print(f"Logging cost per request, {args.features} features, {args.iterations} runs")
+    for name, micros in results.items():
+        print(f"  {name:<22} {micros:9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Cost of converting Predict payloads with `struct_codec` instead of
+`MessageToDict` and `Struct.update`.
+
+    python benchmarks/bench_struct_codec.py [--iterations N]
+
+Three retail-shaped payloads: a recommendation request (user and store ids,
+a 64-float user embedding and 50 candidate items with a sku, price, flags
+and 16 features each), a scoring request (one 1000-float feature vector)
+and a batch of 256 rows of 40 features. "decode" is the request side
+(Struct to dict), "encode" the response side (model output to Struct): a
+list of floats per candidate or row, as `.tolist()` would give it, or the
+numpy array itself with `struct_codec`. Requires numpy.
+"""
+
+import argparse
+import random
+import timeit
+
+import numpy as np
+from google.protobuf import struct_pb2
+from google.protobuf.json_format import MessageToDict
+
+from aigear.service.grpc.grpc_package.struct_codec import decode_struct, encode_struct
+
+
+def recommendation() -> dict:
+    return {
+        "user_id": "u-1024",
+        "store_id": 12,
+        "member": True,
+        "embedding": [random.random() for _ in range(64)],
+        "candidates": [
+            {
+                "sku": f"sku-{index}",
+                "price": round(random.random() * 10, 2),
+                "in_stock": True,
+                "features": [random.random() for _ in range(16)],
+            }
+            for index in range(50)
+        ],
+    }
+
+
+def scoring() -> dict:
+    return {"user_id": "u-1024", "features": [random.random() for _ in range(1000)]}
+
+
+def batch() -> dict:
+    return {"rows": [[random.random() for _ in range(40)] for _ in range(256)]}
+
+
+PAYLOADS = {
+    "recommendation": (recommendation, 50),
+    "scoring (1000 floats)": (scoring, 1),
+    "batch (256 x 40)": (batch, 256),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    def micros(call) -> float:
+        return timeit.timeit(call, number=args.iterations) / args.iterations * 1e6
+
+    print(f"Per-payload cost, {args.iterations} runs (protobuf / struct_codec)")
+    print(f"  {'payload':<22} {'decode':>26} {'decode numpy':>14} {'encode':>26}")
+    for name, (make_payload, outputs) in PAYLOADS.items():
+        payload = make_payload()
+        struct = struct_pb2.Struct()
+        struct.update(payload)
+        assert decode_struct(struct) == MessageToDict(struct)
+        scores = np.random.rand(outputs)
+        output = scores.tolist()
+
+        def update():
+            response = struct_pb2.Struct()
+            response.update({"response": output})
+            return response
+
+        assert encode_struct({"response": scores}) == update()
+        results = {
+            "MessageToDict": micros(lambda: MessageToDict(struct)),
+            "decode": micros(lambda: decode_struct(struct)),
+            "decode numpy": micros(lambda: decode_struct(struct, numpy_arrays=True)),
+            "update": micros(update),
+            "encode": micros(lambda: encode_struct({"response": scores})),
+        }
+        print(
+            f"  {name:<22} "
+            f"{results['MessageToDict']:>7.0f} / {results['decode']:>6.0f} us "
+            f"({results['MessageToDict'] / results['decode']:5.1f}x) "
+            f"{results['decode numpy']:>11.0f} us "
+            f"{results['update']:>7.0f} / {results['encode']:>6.0f} us "
+            f"({results['update'] / results['encode']:5.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
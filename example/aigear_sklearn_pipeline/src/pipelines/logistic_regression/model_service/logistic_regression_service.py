@@ -1,8 +1,8 @@
-import pickle
 from pathlib import Path
 from typing import Any
 import numpy as np
 from aigear.management.asset import AssetManagement
+from aigear.management.model_artifact import load_model
 from aigear.common.config import EnvConfig
 from config_schema.env_schema import EnvSchema
 from src.pipelines.common.constant import gcs_switch
@@ -21,9 +21,8 @@ class ModelService:
 
     @staticmethod
     def _load_model(model_path: Path) -> Any:
-        with open(model_path, "rb") as f:
-            model = pickle.load(f)
-        return model
+        # Arrays are mapped read-only from the file and shared by all workers
+        return load_model(model_path)
 
     def load_all_model(
         self,
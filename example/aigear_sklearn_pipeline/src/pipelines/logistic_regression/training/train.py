@@ -3,6 +3,7 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, classification_report
 import pickle
 from aigear.common.logger import Logging
+from aigear.management import model_artifact
 from aigear.management.asset import AssetManagement
 from aigear.common.config import EnvConfig
 from config_schema.env_schema import EnvSchema
@@ -15,8 +16,8 @@ def save_model(
     model: LogisticRegression,
     save_path: Path,
 ) -> None:
-    with open(save_path, "wb") as f:
-        pickle.dump(model, f)
+    # Large arrays are stored so the model service can memory-map them
+    model_artifact.save_model(model, save_path)
 
 
 def train_model(pipeline_version: str) -> None:
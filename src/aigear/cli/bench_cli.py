@@ -0,0 +1,102 @@
+import argparse
+import json
+import sys
+
+from aigear.service.grpc.bench import format_summary, load_payloads, run_benchmark
+
+
+def get_argument(argv: list | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark a running aigear gRPC model service with Predict calls.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--target",
+        default="localhost:50051",
+        help="Server address (default: localhost:50051).",
+    )
+    parser.add_argument(
+        "--payload",
+        required=True,
+        help="JSON file with a request object or a list of them, or a JSONL file "
+        "with one request object per line. Requests are sent round-robin.",
+    )
+    parser.add_argument(
+        "--model", default="", help="Model (pipeline version) to call, if several."
+    )
+    load_group = parser.add_mutually_exclusive_group()
+    load_group.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Closed loop: number of callers sending back to back (default: 8).",
+    )
+    load_group.add_argument(
+        "--qps",
+        type=float,
+        default=None,
+        help="Open loop: send this many requests per second regardless of responses.",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10, help="Measured seconds (default: 10)."
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=2,
+        help="Seconds of unmeasured load before measuring (default: 2).",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=10, help="Per-request deadline in seconds."
+    )
+    parser.add_argument(
+        "--json",
+        default=None,
+        help="Also write the report as JSON to this file ('-' for stdout).",
+    )
+    parser.add_argument(
+        "--max-p99-ms",
+        type=float,
+        default=None,
+        help="Exit with status 1 if the p99 latency is above this value.",
+    )
+    parser.add_argument(
+        "--max-error-rate",
+        type=float,
+        default=None,
+        help="Exit with status 1 if the error rate (0-1) is above this value.",
+    )
+    return parser.parse_args(argv)
+
+
+def bench(argv: list | None = None) -> None:
+    args = get_argument(argv)
+    summary = run_benchmark(
+        args.target,
+        load_payloads(args.payload),
+        concurrency=args.concurrency,
+        qps=args.qps,
+        duration=args.duration,
+        warmup=args.warmup,
+        timeout=args.timeout,
+        model=args.model,
+    )
+    print(format_summary(summary))
+    if args.json == "-":
+        print(json.dumps(summary, indent=2))
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    failures = []
+    if args.max_p99_ms is not None and summary["latency_ms"]["p99"] > args.max_p99_ms:
+        failures.append(
+            f"p99 {summary['latency_ms']['p99']:.2f}ms > {args.max_p99_ms:g}ms"
+        )
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        failures.append(
+            f"error rate {summary['error_rate']:.2%} > {args.max_error_rate:.2%}"
+        )
+    if failures:
+        print("FAILED: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
@@ -1,9 +1,12 @@
 import logging
 import argparse
+import json
 import sys
 import os
 from aigear.common.config import PipelinesConfig
 from aigear.common.loading_module import LoadModule
+from aigear.management import onnx_model
+from aigear.service.batch_inference import DEFAULT_CHUNK_SIZE, batch_inference
 from aigear.service.grpc.grpc_service import grpc_service
 
 
@@ -45,7 +48,93 @@ def get_argument() -> argparse.Namespace:
     )
 
     grpc_parser = subparsers.add_parser("grpc", help="Run a gRPC model service")
-    grpc_parser.add_argument("--version", default="", help="Version of the pipeline")
+    grpc_parser.add_argument(
+        "--version",
+        default="",
+        help="Version of the pipeline; comma-separate several to serve them "
+        "from one server (e.g. ranker,ctr)",
+    )
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Run offline batch inference with the model service"
+    )
+    batch_parser.add_argument("--version", default="", help="Version of the pipeline")
+    batch_parser.add_argument(
+        "--input", required=True, help="Input file: .jsonl, .csv or .parquet"
+    )
+    batch_parser.add_argument(
+        "--output",
+        required=True,
+        help="Output file: .jsonl, .csv or .parquet (may differ from the input)",
+    )
+    batch_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Rows per chunk (default: {DEFAULT_CHUNK_SIZE})",
+    )
+    batch_parser.add_argument(
+        "--processes",
+        default="auto",
+        help="Worker processes, or 'auto' for one per CPU core (default: auto)",
+    )
+    batch_parser.add_argument(
+        "--keep-columns",
+        default=None,
+        help="Comma-separated input columns to copy to the output (default: all)",
+    )
+
+    onnx_parser = subparsers.add_parser(
+        "onnx",
+        help="Convert a released model to ONNX, check parity and compare backends",
+    )
+    onnx_parser.add_argument(
+        "--model",
+        required=True,
+        help="Released model: a pickle / save_model file, or .pt / .pth for torch",
+    )
+    onnx_parser.add_argument(
+        "--holdout",
+        required=True,
+        help="Holdout inputs: .npy, or .jsonl, .csv or .parquet with one feature per column",
+    )
+    onnx_parser.add_argument(
+        "--output", default=None, help="ONNX file (default: the model path with .onnx)"
+    )
+    onnx_parser.add_argument(
+        "--rows",
+        type=int,
+        default=onnx_model.DEFAULT_HOLDOUT_ROWS,
+        help=f"Holdout rows used for the parity check (default: {onnx_model.DEFAULT_HOLDOUT_ROWS})",
+    )
+    onnx_parser.add_argument(
+        "--rtol", type=float, default=onnx_model.DEFAULT_RTOL, help="Relative tolerance"
+    )
+    onnx_parser.add_argument(
+        "--atol", type=float, default=onnx_model.DEFAULT_ATOL, help="Absolute tolerance"
+    )
+    onnx_parser.add_argument(
+        "--max-mismatch-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of output values allowed outside the tolerances (default: 0)",
+    )
+    onnx_parser.add_argument(
+        "--opset", type=int, default=None, help="ONNX opset (default: the converter's)"
+    )
+    onnx_parser.add_argument(
+        "--benchmark-iterations",
+        type=int,
+        default=onnx_model.DEFAULT_BENCHMARK_ITERATIONS,
+        help="Predictions timed per backend; 0 skips the comparison "
+        f"(default: {onnx_model.DEFAULT_BENCHMARK_ITERATIONS})",
+    )
+    onnx_parser.add_argument(
+        "--benchmark-rows",
+        type=int,
+        default=1,
+        help="Rows per timed prediction (default: 1)",
+    )
 
     return parser.parse_args()
 
@@ -66,3 +155,32 @@ def task_run() -> None:
             else None
         )
         grpc_service(args.version, model_class_path)
+    elif args.subcommand == "batch":
+        stats = batch_inference(
+            args.version,
+            args.input,
+            args.output,
+            chunk_size=args.chunk_size,
+            processes=(
+                args.processes if args.processes == "auto" else int(args.processes)
+            ),
+            keep_columns=args.keep_columns.split(",") if args.keep_columns else None,
+        )
+        if stats is None:
+            sys.exit(1)
+    elif args.subcommand == "onnx":
+        report = onnx_model.onnx_release(
+            args.model,
+            args.holdout,
+            args.output,
+            holdout_rows=args.rows,
+            rtol=args.rtol,
+            atol=args.atol,
+            max_mismatch_rate=args.max_mismatch_rate,
+            target_opset=args.opset,
+            benchmark_iterations=args.benchmark_iterations,
+            benchmark_rows=args.benchmark_rows,
+        )
+        if report is None:
+            sys.exit(1)
+        print(json.dumps(report, indent=2))
@@ -1,7 +1,11 @@
+import atexit
 import logging
+import os
+import queue
 import sys
 import json
 import threading
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any, Dict, Optional
 
 # Thread-local log buffer — set to a list to enable buffering for the current thread
@@ -119,3 +123,29 @@ class Logging:
     def cloud_logging(self) -> logging.Logger:
         logger = self._base_logger()
         return self._patch_cloud_logging(logger)
+
+    def queue_logging(self) -> logging.Logger:
+        """
+        Console logger whose records are written to stdout by a background thread.
+
+        Callers only enqueue the record, so they never block on stdout. The
+        writer thread does not survive fork, so a forked child that calls this
+        again gets a fresh queue and writer.
+        """
+        logger = logging.getLogger(self.log_name)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+        if getattr(logger, "_queue_pid", None) != os.getpid():
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            log_queue = queue.SimpleQueue()
+            stream_handler = _ThreadAwareStreamHandler(sys.stdout)
+            stream_handler.setFormatter(LocalJsonFormatter())
+            listener = QueueListener(log_queue, stream_handler)
+            listener.start()
+            atexit.register(listener.stop)
+            logger.addHandler(QueueHandler(log_queue))
+            logger._queue_pid = os.getpid()
+
+        return logger
@@ -0,0 +1,83 @@
+"""
+Row-oriented data files: JSONL, CSV and Parquet, read in chunks of dicts.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+from pathlib import Path
+from typing import Any, Iterator
+
+DEFAULT_CHUNK_SIZE = 1000
+_SUFFIX_FORMATS = {
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+
+def file_format(path: str | Path) -> str:
+    """`jsonl`, `csv` or `parquet`, from the file extension."""
+    suffix = Path(path).suffix.lower()
+    if suffix not in _SUFFIX_FORMATS:
+        raise ValueError(
+            f"Unsupported file type {suffix!r} for {path}; "
+            f"expected one of {sorted(_SUFFIX_FORMATS)}."
+        )
+    return _SUFFIX_FORMATS[suffix]
+
+
+def read_chunks(path: str | Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator:
+    """Yield the rows of `path` as lists of at most `chunk_size` dicts."""
+    chunk_size = max(1, int(chunk_size))
+    input_format = file_format(path)
+    if input_format == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+    with open(path, newline="" if input_format == "csv" else None) as f:
+        if input_format == "csv":
+            rows = (
+                {name: _csv_value(value) for name, value in row.items()}
+                for row in csv.DictReader(f)
+            )
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def count_rows(path: str | Path) -> int | None:
+    """Number of input rows when known without reading the file (Parquet)."""
+    if file_format(path) != "parquet":
+        return None
+    import pyarrow.parquet as pq
+
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def _csv_value(value: str | None) -> Any:
+    # Numbers are passed to the model as numbers, everything else as text.
+    # Integers with leading zeros ("007") are identifiers and stay text.
+    if value is None or value == "":
+        return None
+    try:
+        number = int(value)
+        return number if str(number) == value else value
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
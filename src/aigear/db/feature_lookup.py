@@ -0,0 +1,293 @@
+"""
+Online lookup of per-entity features stored in MongoDB, for ModelServices.
+
+A ModelService that reads the features of a user, store or item from
+MongoDB on every request pays a network round trip per prediction.
+`FeatureLookup` puts an in-process cache in front of the collection:
+
+- Documents are cached by key for `ttl_seconds`, at most `max_entries` of
+  them, least recently used first out. Keys without a document are cached
+  too, so unknown entities do not reach MongoDB on every request.
+- Cache misses from concurrent requests are gathered by a `MicroBatcher`
+  into one `{key_field: {"$in": keys}}` query.
+- With `refresh_ahead`, a key read after that fraction of its TTL is
+  reloaded in the background, so hot keys are not left to expire and
+  requests for them keep hitting the cache.
+
+Hits, misses, refreshes and query latency are kept in `stats()` and, when
+the server exports metrics (`model_service.grpc.metrics.on`), exported as
+`aigear_feature_lookups_total{collection, result}`,
+`aigear_feature_refreshes_total{collection}` and
+`aigear_feature_lookup_duration_seconds{collection, stage}`.
+
+Cached documents are shared between requests and must not be modified.
+A lookup built before the server forks its workers (in a ModelService's
+`__init__`) is inherited by each worker, which keeps its own cache and
+query thread from then on.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Iterable
+
+from aigear.common.logger import Logging
+from aigear.service.grpc.grpc_package.batching import MicroBatcher
+
+logger = Logging(log_name=__name__).console_logging()
+
+_prometheus_metrics = None
+_prometheus_metrics_lock = threading.Lock()
+_RESULTS = {"hits": "hit", "misses": "miss"}
+_lookups = weakref.WeakSet()
+# Longest a `get` waits for its query by default (seconds)
+DEFAULT_TIMEOUT = 5.0
+
+
+class FeatureLookup:
+    """
+    Cached, batched reads of one MongoDB collection by key.
+
+    `collection` is a pymongo collection, such as
+    `MDBClient(project_id).connect_db(uri, db_name)["user_features"]`.
+    Documents are matched on `key_field`; `fields` limits the fields that
+    are read. `timeout` bounds how long `get` waits for a query (seconds,
+5 by default; None waits for as long as the query takes).
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        key_field: str = "_id",
+        fields: Iterable[str] | None = None,
+        ttl_seconds: float = 60,
+        max_entries: int = 100000,
+        refresh_ahead: float | None = None,
+        max_batch_size: int = 256,
+        max_wait_ms: float = 2,
+        timeout: float | None = DEFAULT_TIMEOUT,
+        metrics: bool | None = None,
+        name: str | None = None,
+    ):
+        self.collection = collection
+        self.key_field = key_field
+        self.projection = None
+        if fields is not None:
+            self.projection = {field: 1 for field in fields}
+            self.projection[key_field] = 1
+        self.ttl = max(0.0, float(ttl_seconds))
+        self.max_entries = max(1, int(max_entries))
+        # Keys read after this age are reloaded in the background
+        self.refresh_after = None
+        if refresh_ahead is not None and 0 < refresh_ahead < 1:
+            self.refresh_after = self.ttl * refresh_ahead
+        self.timeout = timeout
+        self.name = name or getattr(collection, "name", "")
+        self._cache = OrderedDict()
+        self._refreshing = set()
+        self._counts = {
+            "hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "queries": 0,
+            "keys_queried": 0,
+        }
+        self._query_seconds = 0.0
+        self._lock = threading.Lock()
+        _lookups.add(self)
+        self._metrics = _lookup_metrics(metrics)
+        self._batcher = MicroBatcher(
+            self._load,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name=f"aigear-feature-lookup-{self.name}",
+        )
+
+    def get(self, key: Any) -> dict | None:
+        """
+        The document for `key`, or None if the collection has none.
+
+        Raises:
+            concurrent.futures.TimeoutError: if the query takes longer than `timeout`.
+        """
+        started = time.perf_counter()
+        found, document = self._cached(key)
+        if not found:
+            document = self._batcher.submit(key).result(timeout=self.timeout)
+        self._observe("lookup", started)
+        return document
+
+    def get_many(self, keys: Iterable[Any]) -> dict:
+        """`{key: document or None}`; the keys not cached are read in one query."""
+        started = time.perf_counter()
+        documents, missing = {}, []
+        for key in keys:
+            found, document = self._cached(key)
+            if found:
+                documents[key] = document
+            else:
+                missing.append(key)
+        if missing:
+            documents.update(zip(missing, self._load(missing)))
+        self._observe("lookup", started)
+        return documents
+
+    def invalidate(self, key: Any = None) -> None:
+        """Drop `key` from the cache, or every key if none is given."""
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counts, entries=len(self._cache))
+            stats["query_seconds"] = round(self._query_seconds, 6)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        self._batcher.close()
+
+    def _reset_after_fork(self) -> None:
+        # A parent thread may have held the lock, or had a refresh in flight
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def _cached(self, key: Any) -> tuple:
+        refresh = False
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                document, loaded_at = entry
+                age = time.monotonic() - loaded_at
+                if age < self.ttl:
+                    self._cache.move_to_end(key)
+                    self._count("hits")
+                    refresh = (
+                        self.refresh_after is not None
+                        and age >= self.refresh_after
+                        and key not in self._refreshing
+                    )
+                    if refresh:
+                        self._refreshing.add(key)
+                else:
+                    del self._cache[key]
+                    entry = None
+            if entry is None:
+                self._count("misses")
+        if refresh:
+            self._refresh(key)
+        return (True, document) if entry is not None else (False, None)
+
+    def _count(self, name: str, value: int = 1) -> None:
+        # Called with the lock held
+        self._counts[name] += value
+        if self._metrics is not None:
+            if name in _RESULTS:
+                self._metrics.lookups.labels(self.name, _RESULTS[name]).inc(value)
+            elif name == "refreshes":
+                self._metrics.refreshes.labels(self.name).inc(value)
+
+    def _refresh(self, key: Any) -> None:
+        def _done(future):
+            with self._lock:
+                self._refreshing.discard(key)
+            if future.exception() is not None:
+                logger.warning(
+                    f"Refreshing features of {key!r} from {self.name} failed: "
+                    f"{future.exception()!r}"
+                )
+
+        with self._lock:
+            self._count("refreshes")
+        self._batcher.submit(key).add_done_callback(_done)
+
+    def _load(self, keys: list) -> list:
+        """Read `keys` in one query and cache every result; one document or None per key."""
+        unique = list(dict.fromkeys(keys))
+        started = time.perf_counter()
+        documents = {
+            document[self.key_field]: document
+            for document in self.collection.find(
+                {self.key_field: {"$in": unique}}, self.projection
+            )
+        }
+        seconds = self._observe("query", started)
+        loaded_at = time.monotonic()
+        with self._lock:
+            self._count("queries")
+            self._count("keys_queried", len(unique))
+            self._query_seconds += seconds
+            if self.ttl > 0:
+                for key in unique:
+                    self._cache[key] = (documents.get(key), loaded_at)
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return [documents.get(key) for key in keys]
+
+    def _observe(self, stage: str, started: float) -> float:
+        seconds = time.perf_counter() - started
+        if self._metrics is not None:
+            self._metrics.latency.labels(self.name, stage).observe(seconds)
+        return seconds
+
+
+def _reset_after_fork() -> None:
+    for lookup in list(_lookups):
+        lookup._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class _LookupMetrics:
+    def __init__(self):
+        from prometheus_client import Counter, Histogram
+
+        from aigear.service.grpc.grpc_package.metrics import LATENCY_BUCKETS
+
+        self.lookups = Counter(
+            "aigear_feature_lookups",
+            "Feature lookups by collection and result (hit, miss).",
+            ["collection", "result"],
+            registry=None,
+        )
+        self.refreshes = Counter(
+            "aigear_feature_refreshes",
+            "Cached feature documents reloaded in the background.",
+            ["collection"],
+            registry=None,
+        )
+        self.latency = Histogram(
+            "aigear_feature_lookup_duration_seconds",
+            "Feature lookup latency by collection and stage: lookup (one "
+            "get or get_many, cache hits included) or query (one MongoDB query).",
+            ["collection", "stage"],
+            buckets=LATENCY_BUCKETS,
+            registry=None,
+        )
+
+
+def _lookup_metrics(enabled: bool | None) -> _LookupMetrics | None:
+    # One set per process: metric objects with the same name would overwrite
+    # each other's samples. By default, on when the server exports metrics.
+    global _prometheus_metrics
+    if enabled is None:
+        from aigear.service.grpc.grpc_package.metrics import METRICS_DIR_ENV
+
+        enabled = METRICS_DIR_ENV in os.environ
+    if not enabled:
+        return None
+    with _prometheus_metrics_lock:
+        if _prometheus_metrics is None:
+            _prometheus_metrics = _LookupMetrics()
+    return _prometheus_metrics
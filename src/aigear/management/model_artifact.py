@@ -0,0 +1,112 @@
+"""
+Model artifacts whose large arrays are memory-mapped when loaded.
+
+`save_model` pickles an object with protocol 5 and writes every large
+contiguous buffer (numpy arrays, including those inside scikit-learn
+estimators) out-of-band, after the pickle stream, in the same file.
+`load_model` maps the file read-only and hands those buffers back to
+pickle, so the arrays are zero-copy views of the file's page-cache pages.
+Forked model-service workers, and even separate processes, then share one
+copy of the weights, and since the pages are never written they are never
+copied per worker.
+
+Arrays loaded this way are read-only. Files that are not in this format
+are loaded with plain `pickle.load`, so existing artifacts keep working.
+"""
+
+from __future__ import annotations
+
+import mmap
+import pickle
+import struct
+from pathlib import Path
+from typing import Any
+
+MAGIC = b"AIGEARMM"
+FORMAT_VERSION = 1
+# magic, format version, buffer count, pickle length
+_HEADER = struct.Struct("<8sIIQ")
+# offset, length of one out-of-band buffer
+_BUFFER_ENTRY = struct.Struct("<QQ")
+# Buffers start on cache-line boundaries so SIMD loads stay aligned
+_ALIGNMENT = 64
+DEFAULT_MIN_BUFFER_BYTES = 64 * 1024
+
+
+def save_model(
+    obj: Any,
+    path: str | Path,
+    min_buffer_bytes: int = DEFAULT_MIN_BUFFER_BYTES,
+) -> Path:
+    """
+    Save `obj` so that `load_model` can memory-map its large buffers.
+
+    Buffers smaller than `min_buffer_bytes` stay inside the pickle stream.
+    """
+    path = Path(path)
+    buffers = []
+
+    def _buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        # A true return value keeps the buffer in-band
+        with buffer.raw() as raw:
+            if raw.nbytes < min_buffer_bytes:
+                return True
+        buffers.append(buffer)
+        return False
+
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=_buffer_callback)
+    table_size = len(buffers) * _BUFFER_ENTRY.size
+    offset = _align(_HEADER.size + table_size + len(payload))
+    entries = []
+    for buffer in buffers:
+        with buffer.raw() as raw:
+            entries.append((offset, raw.nbytes))
+            offset = _align(offset + raw.nbytes)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(buffers), len(payload)))
+        for entry in entries:
+            f.write(_BUFFER_ENTRY.pack(*entry))
+        f.write(payload)
+        for buffer, (offset, _) in zip(buffers, entries):
+            f.write(b"\0" * (offset - f.tell()))
+            with buffer.raw() as raw:
+                f.write(raw)
+    return path
+
+
+def load_model(path: str | Path, mmap_buffers: bool = True) -> Any:
+    """
+    Load an object saved by `save_model`, or any plain pickle file.
+
+    With `mmap_buffers` the out-of-band buffers are read-only views of the
+    memory-mapped file; otherwise they are read into private memory.
+    """
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size or not header.startswith(MAGIC):
+            f.seek(0)
+            return pickle.load(f)
+        _, version, n_buffers, payload_length = _HEADER.unpack(header)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model artifact version {version}: {path}")
+        if mmap_buffers:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        else:
+            f.seek(0)
+            data = memoryview(f.read())
+
+    start = _HEADER.size
+    entries = [
+        _BUFFER_ENTRY.unpack_from(data, start + i * _BUFFER_ENTRY.size)
+        for i in range(n_buffers)
+    ]
+    start += n_buffers * _BUFFER_ENTRY.size
+    payload = data[start : start + payload_length]
+    buffers = [data[offset : offset + length] for offset, length in entries]
+    return pickle.loads(payload, buffers=buffers)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
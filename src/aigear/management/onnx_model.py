@@ -0,0 +1,375 @@
+"""
+ONNX export of trained models and an onnxruntime backend to serve them.
+
+`release_onnx` is an optional release stage: it converts a trained
+scikit-learn estimator (or pipeline) or torch module to ONNX, runs both on
+a holdout sample and refuses the export if any output differs beyond the
+tolerances. A ModelService then serves the exported file with `OnnxModel`,
+one onnxruntime CPU session whose thread pools are sized by
+`thread_config`, instead of running the model in its Python framework.
+
+`compare_backends` loads the native model and the ONNX file in separate
+forked processes and reports the latency of a prediction and the memory
+each one adds, so each pipeline can be served by the faster backend.
+
+Requires `pip install aigear[onnx]`, plus torch for torch models.
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from aigear.common.logger import Logging
+from aigear.management.model_artifact import load_model
+from aigear.service.grpc.grpc_package import thread_config
+from aigear.service.grpc.grpc_package.worker_pool import process_memory
+
+logger = Logging(log_name=__name__).console_logging()
+
+DEFAULT_RTOL = 1e-4
+DEFAULT_ATOL = 1e-4
+DEFAULT_HOLDOUT_ROWS = 1000
+DEFAULT_BENCHMARK_ITERATIONS = 200
+_TORCH_SUFFIXES = (".pt", ".pth")
+
+
+class ParityError(ValueError):
+    """The ONNX export does not reproduce the native model's outputs."""
+
+    def __init__(self, report: dict):
+        super().__init__(
+            f"ONNX outputs differ from the native model on "
+            f"{report['mismatches']} of {report['values']} values "
+            f"(max abs diff {report['max_abs_diff']:g})."
+        )
+        self.report = report
+
+
+def model_framework(model: Any) -> str:
+    """`torch` for a torch module, `sklearn` for anything with `predict`."""
+    if type(model).__module__.startswith("torch") or hasattr(model, "forward"):
+        return "torch"
+    if hasattr(model, "predict"):
+        return "sklearn"
+    raise TypeError(f"Cannot convert a {type(model).__name__} to ONNX.")
+
+
+def load_native_model(path: str | Path) -> Any:
+    """Load a released model: a torch file (.pt, .pth) or a pickle / `save_model` file."""
+    if Path(path).suffix in _TORCH_SUFFIXES:
+        import torch
+
+        return torch.load(path, weights_only=False)
+    return load_model(path)
+
+
+def load_holdout(path: str | Path, rows: int = DEFAULT_HOLDOUT_ROWS) -> Any:
+    """
+    The first `rows` rows of a holdout file as a float32 matrix: a `.npy`
+    array, or a JSONL, CSV or Parquet file whose columns are the features.
+    """
+    import numpy as np
+
+    if Path(path).suffix == ".npy":
+        return np.asarray(np.load(path)[:rows], dtype=np.float32)
+    from aigear.common.row_files import read_chunks
+
+    matrix = []
+    for chunk in read_chunks(path, rows):
+        matrix.extend(list(row.values()) for row in chunk[: rows - len(matrix)])
+        if len(matrix) >= rows:
+            break
+    return np.asarray(matrix, dtype=np.float32)
+
+
+def convert_to_onnx(
+    model: Any, sample: Any, path: str | Path, target_opset: int | None = None
+) -> Path:
+    """
+    Export `model` to an ONNX file at `path`.
+
+    `sample` is a 2-D float array of model inputs; only its row shape is
+    used, the batch dimension stays dynamic. Classifiers output labels and
+    class probabilities as plain tensors.
+    """
+    import numpy as np
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sample = np.asarray(sample[:1], dtype=np.float32)
+    if model_framework(model) == "torch":
+        import torch
+
+        model.eval()
+        torch.onnx.export(
+            model,
+            (torch.from_numpy(sample),),
+            str(path),
+            input_names=["input"],
+            output_names=["output"],
+            dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+            opset_version=target_opset,
+        )
+        return path
+    from skl2onnx import to_onnx
+
+    # The final step of a Pipeline makes the predictions
+    estimator = getattr(model, "_final_estimator", model)
+    options = None
+    if hasattr(estimator, "predict_proba"):
+        # Probabilities as a tensor instead of a list of {class: probability}
+        options = {type(estimator): {"zipmap": False}}
+    onnx_model = to_onnx(model, sample, target_opset=target_opset, options=options)
+    path.write_bytes(onnx_model.SerializeToString())
+    return path
+
+
+class OnnxModel:
+    """
+    An ONNX model served by one onnxruntime CPU session.
+
+    `predict` returns the first output (labels of a classifier, values of a
+    regressor, the output of a torch module); `run` returns all of them.
+    Intra-op threads default to the limit `thread_config` set for this
+    process (`INFERENCE_NUM_THREADS`, or the topology of the server).
+    """
+
+    def __init__(self, path: str | Path, intra_op_threads: int | None = None):
+        import onnxruntime as ort
+
+        self.path = str(path)
+        self.session = ort.InferenceSession(
+            self.path,
+            sess_options=thread_config.onnxruntime_session_options(
+                None if intra_op_threads is None else str(intra_op_threads)
+            ),
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [output.name for output in self.session.get_outputs()]
+
+    def run(self, inputs: Any) -> list:
+        import numpy as np
+
+        array = np.asarray(inputs, dtype=np.float32)
+        if array.ndim == 1:
+            array = array.reshape(1, -1)
+        return self.session.run(None, {self.input_name: array})
+
+    def predict(self, inputs: Any) -> Any:
+        return self.run(inputs)[0]
+
+    # PredictTensor passes its numpy array straight to the session
+    predict_tensor = predict
+
+
+def native_outputs(model: Any, inputs: Any, count: int = 1) -> list:
+    """The native outputs matching the first `count` outputs of the ONNX export."""
+    import numpy as np
+
+    if model_framework(model) == "torch":
+        import torch
+
+        with torch.no_grad():
+            output = model(torch.from_numpy(np.asarray(inputs, dtype=np.float32)))
+        return [output.numpy()]
+    outputs = [model.predict(inputs)]
+    if count > 1 and hasattr(model, "predict_proba"):
+        outputs.append(model.predict_proba(inputs))
+    return outputs
+
+
+def check_parity(
+    model: Any,
+    onnx_model: OnnxModel,
+    holdout: Any,
+    rtol: float = DEFAULT_RTOL,
+    atol: float = DEFAULT_ATOL,
+    max_mismatch_rate: float = 0.0,
+) -> dict:
+    """
+    Compare native and ONNX outputs on `holdout`.
+
+    Float outputs match within `rtol` / `atol` (ONNX runs in float32), other
+    outputs (class labels) must be equal. The export passes when at most
+    `max_mismatch_rate` of the values differ.
+    """
+    import numpy as np
+
+    onnx_outputs = onnx_model.run(holdout)
+    expected = native_outputs(model, holdout, len(onnx_outputs))
+    values = mismatches = 0
+    max_abs_diff = 0.0
+    for native, exported in zip(expected, onnx_outputs):
+        native = np.asarray(native).reshape(np.shape(exported))
+        if np.issubdtype(exported.dtype, np.floating):
+            close = np.isclose(exported, native, rtol=rtol, atol=atol)
+            max_abs_diff = max(
+                max_abs_diff, float(np.max(np.abs(exported - native), initial=0.0))
+            )
+        else:
+            close = exported == native.astype(exported.dtype)
+        values += close.size
+        mismatches += int(close.size - np.count_nonzero(close))
+    return {
+        "rows": len(holdout),
+        "values": values,
+        "mismatches": mismatches,
+        "max_abs_diff": max_abs_diff,
+        "passed": mismatches <= max_mismatch_rate * values,
+    }
+
+
+def release_onnx(
+    model: Any,
+    holdout: Any,
+    path: str | Path,
+    rtol: float = DEFAULT_RTOL,
+    atol: float = DEFAULT_ATOL,
+    max_mismatch_rate: float = 0.0,
+    target_opset: int | None = None,
+) -> dict:
+    """
+    Convert `model` to ONNX at `path` and check parity on `holdout`.
+
+    Returns the parity report. Raises `ParityError`, and removes the file,
+    if the export does not reproduce the model.
+    """
+    path = convert_to_onnx(model, holdout, path, target_opset)
+    report = check_parity(
+        model, OnnxModel(path), holdout, rtol, atol, max_mismatch_rate
+    )
+    logger.info(f"ONNX parity on {report['rows']} holdout rows: {report}")
+    if not report["passed"]:
+        path.unlink()
+        raise ParityError(report)
+    return {**report, "path": str(path)}
+
+
+def _measure(
+    load: Callable[[], Any], sample: Any, iterations: int, results: Any
+) -> None:
+    # Runs in a fresh fork so the memory delta is this backend's alone
+    try:
+        before = process_memory()
+        started = time.perf_counter()
+        model = load()
+        predict = model.predict
+        predict(sample)
+        load_seconds = time.perf_counter() - started
+        after = process_memory()
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            predict(sample)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        results.put(
+            {
+                "load_seconds": round(load_seconds, 3),
+                "memory_bytes": (
+                    None if before is None else after["uss"] - before["uss"]
+                ),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p99_ms": round(
+                    latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                    * 1000,
+                    3,
+                ),
+            }
+        )
+    except Exception as e:
+        results.put({"error": str(e)})
+
+
+def compare_backends(
+    native_path: str | Path,
+    onnx_path: str | Path,
+    sample: Any,
+    iterations: int = DEFAULT_BENCHMARK_ITERATIONS,
+) -> dict:
+    """
+    Latency of `predict(sample)` (p50 / p99 over `iterations` calls), load
+    time and memory added (USS, Linux only) for the native model and the
+    ONNX export, each measured in its own forked process.
+    """
+    context = multiprocessing.get_context("fork")
+    loaders = {
+        "native": lambda: _NativeModel(load_native_model(native_path)),
+        "onnx": lambda: OnnxModel(onnx_path),
+    }
+    report = {}
+    for backend, load in loaders.items():
+        results = context.SimpleQueue()
+        process = context.Process(
+            target=_measure, args=(load, sample, max(1, int(iterations)), results)
+        )
+        process.start()
+        process.join()
+        report[backend] = (
+            results.get()
+            if not results.empty()
+            else {"error": f"exit code {process.exitcode}"}
+        )
+    native, onnx = report["native"], report["onnx"]
+    if "p50_ms" in native and "p50_ms" in onnx:
+        report["faster"] = "onnx" if onnx["p50_ms"] < native["p50_ms"] else "native"
+    logger.info(f"Backend comparison: {json.dumps(report)}")
+    return report
+
+
+class _NativeModel:
+    def __init__(self, model: Any):
+        self.model = model
+
+    def predict(self, inputs: Any) -> Any:
+        return native_outputs(self.model, inputs)[0]
+
+
+def onnx_release(
+    model_path: str | Path,
+    holdout_path: str | Path,
+    output_path: str | Path | None = None,
+    holdout_rows: int = DEFAULT_HOLDOUT_ROWS,
+    rtol: float = DEFAULT_RTOL,
+    atol: float = DEFAULT_ATOL,
+    max_mismatch_rate: float = 0.0,
+    target_opset: int | None = None,
+    benchmark_iterations: int = DEFAULT_BENCHMARK_ITERATIONS,
+    benchmark_rows: int = 1,
+) -> dict | None:
+    """
+    Release stage of `aigear-task onnx`: export the model at `model_path`
+    next to it (or to `output_path`), check parity on the holdout file and
+    compare both backends on `benchmark_rows` rows. Returns the report, or
+    None if the export failed parity.
+    """
+    model_path = Path(model_path)
+    if output_path is None:
+        output_path = model_path.with_suffix(".onnx")
+    model = load_native_model(model_path)
+    holdout = load_holdout(holdout_path, holdout_rows)
+    try:
+        report = {
+            "parity": release_onnx(
+                model,
+                holdout,
+                output_path,
+                rtol=rtol,
+                atol=atol,
+                max_mismatch_rate=max_mismatch_rate,
+                target_opset=target_opset,
+            )
+        }
+    except ParityError as e:
+        logger.error(f"{e} The ONNX export was not released.")
+        return None
+    if benchmark_iterations > 0:
+        report["benchmark"] = compare_backends(
+            model_path, output_path, holdout[:benchmark_rows], benchmark_iterations
+        )
+    return report
@@ -0,0 +1,394 @@
+"""
+Offline batch inference with a pipeline's ModelService (`aigear-task batch`).
+
+The input is read in chunks of `chunk_size` rows from a JSONL, CSV or
+Parquet file. Each row is one request payload, as the gRPC server would
+receive it. Chunks are predicted by a pool of forked worker processes that
+share the model loaded once in the parent, copy-on-write. Results are
+written in input order as soon as they come back. At most two chunks per
+worker are read ahead, so memory stays bounded whatever the input size.
+
+Each output row holds the input columns (or only `keep_columns`), the
+model output in `prediction` and, for a row the model failed on, the
+error message in `error`.
+"""
+
+from __future__ import annotations
+
+import csv
+import gc
+import json
+import multiprocessing
+import platform
+import signal
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any
+
+from aigear.common.config import PipelinesConfig
+from aigear.common.logger import Logging
+from aigear.common.row_files import (
+    DEFAULT_CHUNK_SIZE,
+    count_rows,
+    file_format,
+    read_chunks,
+)
+from aigear.service.grpc.grpc_package import thread_config
+from aigear.service.grpc.grpc_package.model_registry import load_served_model
+from aigear.service.grpc.grpc_package.prediction import predict_items
+from aigear.service.grpc.grpc_package.topology import AUTO, Topology
+
+logger = Logging(log_name=__name__).console_logging()
+
+DEFAULT_PROGRESS_SECONDS = 10
+# Rows a ParquetWriter holds back while a column has no value yet
+_MAX_PENDING_ROWS = 10 * DEFAULT_CHUNK_SIZE
+# Model of the forked workers, set in the parent before the pool starts
+_worker_model = None
+
+
+def _json_default(value: Any) -> Any:
+    # numpy arrays and scalars
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonlWriter:
+    def __init__(self, path: str | Path):
+        self._file = open(path, "w")
+
+    def write(self, rows: list) -> None:
+        self._file.write(
+            "".join(json.dumps(row, default=_json_default) + "\n" for row in rows)
+        )
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CsvWriter:
+    """Columns come from the first chunk; list and dict values are written as JSON."""
+
+    def __init__(self, path: str | Path):
+        self._file = open(path, "w", newline="")
+        self._writer = None
+
+    def write(self, rows: list) -> None:
+        if not rows:
+            return
+        if self._writer is None:
+            self._writer = csv.DictWriter(
+                self._file, fieldnames=list(rows[0]), extrasaction="ignore"
+            )
+            self._writer.writeheader()
+        self._writer.writerows(
+            {
+                name: (
+                    json.dumps(value, default=_json_default)
+                    if isinstance(value, (list, dict)) or hasattr(value, "tolist")
+                    else value
+                )
+                for name, value in row.items()
+            }
+            for row in rows
+        )
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Every row is written with one schema, settled from the first rows that
+    have a value in every column; rows are held back until then, at most
+    `_MAX_PENDING_ROWS` of them. Integer predictions are stored as doubles and
+    columns still all null are strings. A value that does not fit its column
+    is written as null, with the reason added to the row's `error`.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = path
+        self._writer = None
+        self._schema = None
+        self._pending = []
+
+    def write(self, rows: list) -> None:
+        import pyarrow as pa
+
+        if not rows:
+            return
+        if self._writer is None:
+            self._pending.extend(rows)
+            schema = pa.Table.from_pylist(self._pending).schema
+            if (
+                any(pa.types.is_null(field.type) for field in schema)
+                and len(self._pending) < _MAX_PENDING_ROWS
+            ):
+                return
+            rows = self._open(schema)
+        self._writer.write_table(_parquet_table(rows, self._schema))
+
+    def close(self) -> None:
+        if self._writer is None and self._pending:
+            # Every row so far had a column without a value
+            import pyarrow as pa
+
+            rows = self._open(pa.Table.from_pylist(self._pending).schema)
+            self._writer.write_table(_parquet_table(rows, self._schema))
+        if self._writer is not None:
+            self._writer.close()
+
+    def _open(self, schema: Any) -> list:
+        """Open the file with the settled `schema`; returns the rows held back."""
+        import pyarrow.parquet as pq
+
+        self._schema = _parquet_schema(schema)
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+        rows, self._pending = self._pending, []
+        return rows
+
+
+def _parquet_schema(schema: Any) -> Any:
+    import pyarrow as pa
+
+    fields = []
+    for field in schema:
+        if pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        elif field.name == "prediction":
+            # A model may return 0 for one row and 0.5 for the next
+            field = field.with_type(_float_numbers(field.type))
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def _float_numbers(data_type: Any) -> Any:
+    import pyarrow as pa
+
+    if pa.types.is_integer(data_type):
+        return pa.float64()
+    if pa.types.is_list(data_type):
+        return pa.list_(_float_numbers(data_type.value_type))
+    if pa.types.is_struct(data_type):
+        return pa.struct(
+            [field.with_type(_float_numbers(field.type)) for field in data_type]
+        )
+    return data_type
+
+
+def _parquet_table(rows: list, schema: Any) -> Any:
+    import pyarrow as pa
+
+    try:
+        return pa.Table.from_pylist(rows, schema=schema)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    for field in schema:
+        try:
+            pa.array([row.get(field.name) for row in rows], field.type)
+            continue
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+        for row in rows:
+            value = row.get(field.name)
+            try:
+                pa.array([value], field.type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                row[field.name] = None
+                reason = (
+                    f"{field.name} of type {type(value).__name__} does not fit "
+                    f"the output column ({field.type})"
+                )
+                error = row.get("error")
+                row["error"] = f"{error}; {reason}" if error else reason
+    return pa.Table.from_pylist(rows, schema=schema)
+
+
+_WRITERS = {"jsonl": JsonlWriter, "csv": CsvWriter, "parquet": ParquetWriter}
+
+
+def open_writer(path: str | Path) -> Any:
+    """A writer for `path`, chosen by its extension."""
+    return _WRITERS[file_format(path)](path)
+
+
+def predict_chunk(
+    model_service: Any, rows: list, keep_columns: list | None = None
+) -> list:
+    """Predict a chunk the way PredictBatch does; returns one output row per input."""
+    output_rows = []
+    for row, (model_out, error) in zip(rows, predict_items(model_service, rows)):
+        if keep_columns is not None:
+            row = {name: row.get(name) for name in keep_columns}
+        output_rows.append(
+            {
+                **row,
+                "prediction": model_out,
+                "error": None if error is None else str(error),
+            }
+        )
+    return output_rows
+
+
+def _init_worker() -> None:
+    # Forked workers must not inherit a SIGTERM handler, or `Pool.terminate`
+    # would not stop them
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _predict_chunk_in_worker(rows: list, keep_columns: list | None) -> list:
+    return predict_chunk(_worker_model, rows, keep_columns)
+
+
+class Progress:
+    """Counts rows and errors and logs progress every `interval_seconds`."""
+
+    def __init__(
+        self,
+        total_rows: int | None = None,
+        interval_seconds: float = DEFAULT_PROGRESS_SECONDS,
+    ):
+        self.total_rows = total_rows
+        self.interval_seconds = float(interval_seconds)
+        self.rows = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self._logged_at = self.started
+
+    def update(self, output_rows: list) -> None:
+        self.rows += len(output_rows)
+        self.errors += sum(1 for row in output_rows if row["error"] is not None)
+        now = time.monotonic()
+        if now - self._logged_at >= self.interval_seconds:
+            self._logged_at = now
+            logger.info(f"Batch inference: {self.describe()}")
+
+    def stats(self) -> dict:
+        seconds = time.monotonic() - self.started
+        return {
+            "rows": self.rows,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.rows / seconds, 1) if seconds else 0.0,
+        }
+
+    def describe(self) -> str:
+        stats = self.stats()
+        done = f"{self.rows}"
+        if self.total_rows:
+            done += f"/{self.total_rows} ({self.rows / self.total_rows:.1%})"
+        return (
+            f"{done} rows, {stats['rows_per_second']:.1f} rows/s, "
+            f"{self.errors} errors, {stats['seconds']:.1f}s."
+        )
+
+
+def run_batch(
+    model_service: Any,
+    input_path: str | Path,
+    output_path: str | Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    processes: int = 1,
+    keep_columns: list | None = None,
+    progress_seconds: float = DEFAULT_PROGRESS_SECONDS,
+) -> dict:
+    """
+    Predict every row of `input_path` with `model_service` and write the
+    results to `output_path`. Returns rows, errors, seconds and rows_per_second.
+
+    With `processes` > 1 the chunks are predicted by forked worker
+    processes (not available on Windows, where one process is used).
+    """
+    global _worker_model
+
+    progress = Progress(count_rows(input_path), progress_seconds)
+    chunks = read_chunks(input_path, chunk_size)
+    writer = open_writer(output_path)
+    if platform.system().lower() == "windows":
+        processes = 1
+    try:
+        if processes <= 1:
+            for rows in chunks:
+                output_rows = predict_chunk(model_service, rows, keep_columns)
+                writer.write(output_rows)
+                progress.update(output_rows)
+        else:
+            _worker_model = model_service
+            # Keep GC scans from dirtying the model's shared pages (COW)
+            gc.freeze()
+            try:
+                with multiprocessing.get_context("fork").Pool(
+                    processes, initializer=_init_worker
+                ) as pool:
+                    in_flight = deque()
+                    for rows in chunks:
+                        in_flight.append(
+                            pool.apply_async(
+                                _predict_chunk_in_worker, (rows, keep_columns)
+                            )
+                        )
+                        # Read ahead at most two chunks per worker
+                        if len(in_flight) >= 2 * processes:
+                            _write_result(in_flight.popleft(), writer, progress)
+                    while in_flight:
+                        _write_result(in_flight.popleft(), writer, progress)
+            finally:
+                gc.unfreeze()
+                _worker_model = None
+    finally:
+        writer.close()
+    logger.info(f"Batch inference finished: {progress.describe()}")
+    return progress.stats()
+
+
+def _write_result(result: Any, writer: Any, progress: Progress) -> None:
+    output_rows = result.get()
+    writer.write(output_rows)
+    progress.update(output_rows)
+
+
+def batch_inference(
+    pipeline_version: str,
+    input_path: str,
+    output_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    processes: int | str = AUTO,
+    keep_columns: list | None = None,
+    model_class_path: str | None = None,
+) -> dict | None:
+    """
+    Load the ModelService of `pipeline_version` once and score `input_path`.
+
+    `processes="auto"` uses one process per core of the container's CPU
+    quota, each limited to one framework thread.
+    """
+    pipeline_config = PipelinesConfig.get_version_config(pipeline_version)
+    if pipeline_config is None:
+        logger.error(
+            f"No pipeline_version({pipeline_version}) config found in `env.json`."
+        )
+        return None
+    model_service_config = pipeline_config.get("model_service", {})
+    if model_class_path is None:
+        model_class_path = model_service_config.get("model_class_path")
+    topology = Topology.detect({"on": True, "process_count": processes})
+    logger.info(
+        f"Batch inference with {topology.process_count} processes x "
+        f"{topology.intra_op_threads} intra-op threads, chunks of {chunk_size} rows."
+    )
+    with thread_config.ml_thread_scope(True, str(topology.intra_op_threads)):
+        served_model = load_served_model(
+            pipeline_version, model_class_path, model_service_config.get("grpc", {})
+        )
+    if served_model is None:
+        return None
+    return run_batch(
+        served_model.model_service,
+        input_path,
+        output_path,
+        chunk_size=chunk_size,
+        processes=topology.process_count,
+        keep_columns=keep_columns,
+    )
@@ -0,0 +1,241 @@
+"""
+Load generator for aigear model services, used by `aigear-bench`.
+
+Two modes:
+
+- closed loop: `concurrency` callers each send a request, wait for the
+  answer and send the next one. Measures the throughput the server sustains.
+- open loop: requests are sent at a fixed `qps` whether or not earlier ones
+  have been answered, as independent clients would. Latency is measured
+  from the time a request was *due* to be sent, so a server (or client)
+  that falls behind shows up in the percentiles instead of being hidden by
+  a slower send rate.
+
+Only successful requests count towards latency percentiles; failures are
+broken down by gRPC status code.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import grpc
+from google.protobuf import struct_pb2
+
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+PERCENTILES = (("p50", 50), ("p90", 90), ("p99", 99), ("p999", 99.9))
+
+
+def load_payloads(path: str | Path) -> list:
+    """
+    Read request payloads from a JSON file (one object or a list of them) or
+    a JSONL file (one object per line).
+    """
+    text = Path(path).read_text()
+    try:
+        payloads = json.loads(text)
+    except json.JSONDecodeError:
+        payloads = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(payloads, dict):
+        payloads = [payloads]
+    if not payloads or not all(isinstance(payload, dict) for payload in payloads):
+        raise ValueError(f"No request objects found in payload file: {path}")
+    return payloads
+
+
+def build_requests(payloads: list, model: str = "") -> list:
+    """Encode the payloads once, so the benchmark does not measure client-side encoding."""
+    requests = []
+    for payload in payloads:
+        struct = struct_pb2.Struct()
+        struct.update(payload)
+        requests.append(grpc_pb2.MLRequest(request=struct, model=model))
+    return requests
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[min(int(rank), len(sorted_values)) - 1]
+
+
+class BenchResult:
+    """Latencies and status codes collected during one measured run."""
+
+    def __init__(self, mode: str, **settings: Any):
+        self.mode = mode
+        self.settings = settings
+        self.latencies = []
+        self.codes = Counter()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, code: grpc.StatusCode) -> None:
+        with self._lock:
+            self.codes[code.name] += 1
+            if code is grpc.StatusCode.OK:
+                self.latencies.append(latency)
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        requests = sum(self.codes.values())
+        ok = self.codes.get("OK", 0)
+        latency_ms = {
+            "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0
+        }
+        for name, pct in PERCENTILES:
+            latency_ms[name] = percentile(latencies, pct) * 1000
+        latency_ms["max"] = latencies[-1] * 1000 if latencies else 0.0
+        return {
+            "mode": self.mode,
+            **self.settings,
+            "duration_seconds": round(self.elapsed, 3),
+            "requests": requests,
+            "ok": ok,
+            "errors": {code: n for code, n in self.codes.items() if code != "OK"},
+            "error_rate": (requests - ok) / requests if requests else 0.0,
+            "throughput_rps": ok / self.elapsed if self.elapsed else 0.0,
+            "latency_ms": {name: round(value, 3) for name, value in latency_ms.items()},
+        }
+
+
+def format_summary(summary: dict) -> str:
+    settings = (
+        f"concurrency {summary['concurrency']}"
+        if summary["mode"] == "closed"
+        else f"target {summary['qps']:g} QPS"
+    )
+    latency = summary["latency_ms"]
+    lines = [
+        f"{summary['mode']}-loop, {settings}, {summary['duration_seconds']:.1f}s",
+        f"requests:   {summary['requests']} ({summary['ok']} ok, "
+        f"error rate {summary['error_rate']:.2%})",
+        f"throughput: {summary['throughput_rps']:.1f} req/s",
+        "latency ms: "
+        + ", ".join(f"{name} {value:.2f}" for name, value in latency.items()),
+    ]
+    for code, count in sorted(summary["errors"].items()):
+        lines.append(f"  {code}: {count}")
+    return "\n".join(lines)
+
+
+def run_closed_loop(
+    stub: grpc_pb2_grpc.MLStub,
+    requests: list,
+    concurrency: int,
+    duration: float,
+    timeout: float | None = None,
+) -> BenchResult:
+    """`concurrency` callers send requests back to back for `duration` seconds."""
+    result = BenchResult("closed", concurrency=concurrency)
+    counter = itertools.count()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def _caller():
+        while time.perf_counter() < deadline:
+            request = requests[next(counter) % len(requests)]
+            sent = time.perf_counter()
+            try:
+                stub.Predict(request, timeout=timeout)
+                code = grpc.StatusCode.OK
+            except grpc.RpcError as e:
+                code = e.code()
+            result.record(time.perf_counter() - sent, code)
+
+    callers = [
+        threading.Thread(target=_caller, name=f"aigear-bench-{i}", daemon=True)
+        for i in range(concurrency)
+    ]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run_open_loop(
+    stub: grpc_pb2_grpc.MLStub,
+    requests: list,
+    qps: float,
+    duration: float,
+    timeout: float | None = None,
+) -> BenchResult:
+    """Send `qps` requests per second for `duration` seconds, then wait for the answers."""
+    result = BenchResult("open", qps=qps)
+    interval = 1.0 / qps
+    count = max(1, int(duration * qps))
+    outstanding = threading.Semaphore(0)
+    started = time.perf_counter()
+
+    def _on_done(future, due):
+        try:
+            future.result()
+            code = grpc.StatusCode.OK
+        except grpc.RpcError as e:
+            code = e.code()
+        except grpc.FutureCancelledError:
+            code = grpc.StatusCode.CANCELLED
+        except Exception:
+            code = grpc.StatusCode.UNKNOWN
+        try:
+            result.record(time.perf_counter() - due, code)
+        finally:
+            # Every request must release, or the final wait never returns
+            outstanding.release()
+
+    for i in range(count):
+        due = started + i * interval
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        future = stub.Predict.future(requests[i % len(requests)], timeout=timeout)
+        future.add_done_callback(lambda f, due=due: _on_done(f, due))
+    for _ in range(count):
+        outstanding.acquire()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run_benchmark(
+    target: str,
+    payloads: list,
+    concurrency: int = 8,
+    qps: float | None = None,
+    duration: float = 10.0,
+    warmup: float = 2.0,
+    timeout: float | None = 10.0,
+    model: str = "",
+) -> dict:
+    """
+    Benchmark the model server at `target` and return the summary.
+
+    Open loop when `qps` is given, closed loop otherwise. The first `warmup`
+    seconds run the same load and are not measured.
+    """
+    if duration <= 0:
+        raise ValueError(f"duration must be positive, got {duration}.")
+    requests = build_requests(payloads, model)
+
+    def _run(run_duration: float) -> BenchResult:
+        if qps:
+            return run_open_loop(stub, requests, qps, run_duration, timeout)
+        return run_closed_loop(stub, requests, concurrency, run_duration, timeout)
+
+    with grpc.insecure_channel(target) as channel:
+        grpc.channel_ready_future(channel).result(timeout=timeout)
+        stub = grpc_pb2_grpc.MLStub(channel)
+        if warmup > 0:
+            _run(warmup)
+        result = _run(duration)
+    return result.summary()
@@ -0,0 +1,281 @@
+"""
+Python client for aigear gRPC model services.
+
+`ModelClient` keeps a pool of channels to one target and spreads calls over
+them:
+
+- Each pooled channel has its own subchannels (TCP connections), so one
+  busy HTTP/2 connection does not limit concurrent calls.
+- Each channel balances round-robin over every address its target
+  resolves to. With a Kubernetes headless service
+  (`dns:///model-headless.ns.svc:50051`), calls are spread over all pods
+  instead of pinned to the one the first connection reached.
+- UNAVAILABLE and RESOURCE_EXHAUSTED (a worker shedding load) are retried
+  with exponential backoff by gRPC itself.
+- With `hedging_delay_ms`, a call that has not answered after that delay is
+  sent again on another channel. The first successful answer is used and
+  the other call is cancelled, which cuts tail latency caused by a single
+  slow worker. Model predictions have no side effects, so sending them
+  twice is safe.
+- With `batching`, concurrent `predict` calls from many threads are sent
+  together as one PredictBatch call.
+
+Requests and responses use the same encoding as the server: a payload dict
+goes into a `Struct`, and the model output is read back from its
+`"response"` field. Tables go to PredictArrow as Arrow IPC streams.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import queue
+import time
+from typing import Any
+
+import grpc
+from google.protobuf import struct_pb2
+
+from aigear.service.grpc.grpc_package import arrow_codec
+from aigear.service.grpc.grpc_package.batching import MicroBatcher
+from aigear.service.grpc.grpc_package.struct_codec import decode_struct, encode_struct
+from aigear.service.grpc.grpc_package.tensor_codec import decode_tensor, encode_tensor
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+DEFAULT_RETRY = {
+    "max_attempts": 3,
+    "initial_backoff_ms": 50,
+    "max_backoff_ms": 1000,
+    "backoff_multiplier": 2,
+    "status_codes": ["UNAVAILABLE", "RESOURCE_EXHAUSTED"],
+}
+_HEDGE_STATUS_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+)
+
+
+class PredictionError(Exception):
+    """One input of a PredictBatch call failed on the server."""
+
+    def __init__(self, code: grpc.StatusCode, message: str):
+        super().__init__(f"{code.name}: {message}")
+        self.code = code
+        self.message = message
+
+
+def encode_request(payload: dict) -> struct_pb2.Struct:
+    """Encode a request payload the way the server decodes it."""
+    return encode_struct(payload)
+
+
+def decode_response(response: struct_pb2.Struct) -> Any:
+    """The model output of an encoded response."""
+    return decode_struct(response).get("response")
+
+
+def service_config(retry: dict | None = DEFAULT_RETRY) -> str:
+    """gRPC service config: round-robin balancing and, if given, the retry policy."""
+    config = {"loadBalancingConfig": [{"round_robin": {}}]}
+    if retry:
+        retry = {**DEFAULT_RETRY, **retry}
+        config["methodConfig"] = [
+            {
+                "name": [{"service": "ML"}],
+                "retryPolicy": {
+                    "maxAttempts": int(retry["max_attempts"]),
+                    "initialBackoff": f"{retry['initial_backoff_ms'] / 1000:g}s",
+                    "maxBackoff": f"{retry['max_backoff_ms'] / 1000:g}s",
+                    "backoffMultiplier": retry["backoff_multiplier"],
+                    "retryableStatusCodes": list(retry["status_codes"]),
+                },
+            }
+        ]
+    return json.dumps(config)
+
+
+class ModelClient:
+    """
+    Client for one aigear model service.
+
+    Args:
+        target: server address, e.g. `localhost:50051` or
+            `dns:///model-headless:50051` to balance over every pod.
+        pool_size: number of channels (each with its own connections).
+        timeout: default deadline of a call in seconds.
+        model: pipeline version to call on a server hosting several.
+        retry: overrides of `DEFAULT_RETRY`; `None` disables retries.
+        hedging_delay_ms: send a second copy of a call still unanswered
+            after this delay; `None` disables hedging.
+        max_hedged_attempts: calls sent at most per request when hedging.
+        batching: `{"max_batch_size": 32, "max_wait_ms": 2}` to send
+            concurrent `predict` calls as one PredictBatch call.
+        keep_alive_seconds: send HTTP/2 keepalive pings this often.
+    """
+
+    def __init__(
+        self,
+        target: str,
+        pool_size: int = 1,
+        timeout: float | None = 10.0,
+        model: str = "",
+        retry: dict | None = DEFAULT_RETRY,
+        hedging_delay_ms: float | None = None,
+        max_hedged_attempts: int = 2,
+        batching: dict | None = None,
+        keep_alive_seconds: float | None = None,
+    ):
+        self.target = target
+        self.timeout = timeout
+        self.model = model
+        self.hedging_delay = (
+            None if hedging_delay_ms is None else float(hedging_delay_ms) / 1000
+        )
+        self.max_hedged_attempts = max(1, int(max_hedged_attempts))
+        options = [
+            ("grpc.service_config", service_config(retry)),
+            ("grpc.enable_retries", 1 if retry else 0),
+            # Without this, channels to the same target share connections
+            ("grpc.use_local_subchannel_pool", 1),
+        ]
+        if keep_alive_seconds:
+            options.append(("grpc.keepalive_time_ms", int(keep_alive_seconds * 1000)))
+        self._channels = [
+            grpc.insecure_channel(target, options=options)
+            for _ in range(max(1, int(pool_size)))
+        ]
+        self._stubs = [grpc_pb2_grpc.MLStub(channel) for channel in self._channels]
+        self._counter = itertools.count()
+        self._batcher = None
+        if batching:
+            self._batcher = MicroBatcher(
+                self.predict_batch,
+                max_batch_size=batching.get("max_batch_size", 32),
+                max_wait_ms=batching.get("max_wait_ms", 2),
+                name="aigear-client-batcher",
+            )
+
+    def __enter__(self) -> "ModelClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
+        for channel in self._channels:
+            channel.close()
+
+    def wait_ready(self, timeout: float | None = None) -> None:
+        """Block until every pooled channel is connected."""
+        for channel in self._channels:
+            grpc.channel_ready_future(channel).result(timeout=timeout)
+
+    def predict(self, payload: dict, timeout: float | None = None) -> Any:
+        """Send one request and return the model output."""
+        if self._batcher is not None and timeout is None:
+            result = self._batcher(payload)
+            if isinstance(result, PredictionError):
+                raise result
+            return result
+        request = grpc_pb2.MLRequest(request=encode_request(payload), model=self.model)
+        response = self._call("Predict", request, timeout)
+        return decode_response(response.response)
+
+    def predict_batch(self, payloads: list, timeout: float | None = None) -> list:
+        """
+        Send several requests in one PredictBatch call.
+
+        Returns one model output per payload, in order. An input the server
+        failed to predict is returned as a `PredictionError` instead of
+        failing the whole call.
+        """
+        request = grpc_pb2.MLBatchRequest(model=self.model)
+        for payload in payloads:
+            encode_struct(payload, request.requests.add())
+        response = self._call("PredictBatch", request, timeout)
+        return [
+            (
+                PredictionError(_status_code(result.code), result.error)
+                if result.code
+                else decode_response(result.response)
+            )
+            for result in response.results
+        ]
+
+    def predict_tensor(self, array: Any, timeout: float | None = None) -> Any:
+        """Send a numpy array to PredictTensor and return the output array."""
+        request = grpc_pb2.TensorRequest(model=self.model)
+        encode_tensor(array, request.tensor)
+        response = self._call("PredictTensor", request, timeout)
+        return decode_tensor(response.tensor)
+
+    def predict_arrow(self, table: Any, timeout: float | None = None) -> Any:
+        """
+        Send a table of inputs to PredictArrow and return the predictions as
+        a `pyarrow.Table`. `table` is a pyarrow Table or RecordBatch, a
+        pandas DataFrame or a dict of columns.
+        """
+        request = grpc_pb2.ArrowRequest(
+            data=arrow_codec.encode_table(table), model=self.model
+        )
+        response = self._call("PredictArrow", request, timeout)
+        return arrow_codec.decode_table(response.data)
+
+    def _next_stub(self) -> grpc_pb2_grpc.MLStub:
+        return self._stubs[next(self._counter) % len(self._stubs)]
+
+    def _call(self, method: str, request: Any, timeout: float | None) -> Any:
+        timeout = self.timeout if timeout is None else timeout
+        if self.hedging_delay is None:
+            return getattr(self._next_stub(), method)(request, timeout=timeout)
+        return self._hedged_call(method, request, timeout)
+
+    def _hedged_call(self, method: str, request: Any, timeout: float | None) -> Any:
+        completed = queue.Queue()
+        pending = []
+        # Every copy shares the caller's deadline
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def _send():
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            call = getattr(self._next_stub(), method).future(request, timeout=remaining)
+            pending.append(call)
+            call.add_done_callback(completed.put)
+
+        def _expired():
+            return deadline is not None and time.monotonic() >= deadline
+
+        _send()
+        sent, error = 1, None
+        while pending:
+            can_hedge = sent < self.max_hedged_attempts and not _expired()
+            try:
+                call = completed.get(timeout=self.hedging_delay if can_hedge else None)
+            except queue.Empty:
+                if not _expired():
+                    _send()
+                    sent += 1
+                continue
+            pending.remove(call)
+            error = call.exception()
+            if error is None:
+                for other in pending:
+                    other.cancel()
+                return call.result()
+            # An overloaded or unreachable worker: try the next copy right away
+            if can_hedge and not _expired() and error.code() in _HEDGE_STATUS_CODES:
+                _send()
+                sent += 1
+        raise error
+
+
+def _status_code(code: int) -> grpc.StatusCode:
+    for status in grpc.StatusCode:
+        if status.value[0] == code:
+            return status
+    return grpc.StatusCode.UNKNOWN
@@ -0,0 +1,497 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+from concurrent import futures
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+import grpc
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+from sentry_sdk.integrations.grpc.aio.server import ServerInterceptor
+
+from aigear.common.logger import Logging
+from aigear.service.grpc.grpc_package import arrow_codec, grpc_features, tensor_codec
+from aigear.service.grpc.grpc_package import metrics as server_metrics
+from aigear.service.grpc.grpc_package.admission import AdmissionControl
+from aigear.service.grpc.grpc_package.coalescing import SingleFlight
+from aigear.service.grpc.grpc_package.metrics import NULL_METRICS, ServerMetrics
+from aigear.service.grpc.grpc_package.model_registry import (
+    ModelRegistry,
+    ServedModel,
+    UnknownModelError,
+)
+from aigear.service.grpc.grpc_package.prediction import (
+    StreamEnd,
+    arrow_model_call,
+    batch_outputs,
+    batch_response,
+    cache_lookup,
+    cache_store,
+    decode_request,
+    encode_response,
+    item_model,
+    log_batch_fallback,
+    stream_response,
+    unknown_model,
+)
+from aigear.service.grpc.grpc_package.profiler import ProfilerControl
+from aigear.service.grpc.grpc_package.request_context import (
+    CANCELLED,
+    COMPLETED,
+    DEADLINE,
+    NO_CONTEXT,
+    QUEUED,
+    RUNNING,
+    AbandonedRequests,
+    RequestAbandoned,
+    RequestContext,
+    call_model,
+    run_queued,
+)
+from aigear.service.grpc.grpc_package.request_logging import RequestLogger
+from aigear.service.grpc.grpc_package.response_cache import (
+    SharedResponseCache,
+    request_digest,
+)
+from aigear.service.grpc.grpc_package.server_setup import (
+    health_names,
+    server_options,
+    start_memory_reporting,
+    start_model_reloaders,
+)
+from aigear.service.grpc.grpc_package.warmup import warm_up_models
+from aigear.service.grpc.grpc_package.worker_pool import WorkerRecycler
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+logger = Logging(log_name=__name__).console_logging()
+
+
+class AsyncMLServicer(grpc_pb2_grpc.MLServicer):
+    """
+    `grpc.aio` counterpart of `MLServicer`.
+
+    A model whose `predict` is `async def` is awaited on the event loop, so
+    I/O-bound steps no longer hold a thread. A sync `predict` runs on a
+    bounded executor of `multi_processing.thread_count` threads.
+    """
+
+    def __init__(
+        self,
+        model_instance,
+        grpc_options: dict | None = None,
+        response_cache: SharedResponseCache | None = None,
+        metrics: ServerMetrics | None = None,
+        model_release: str | None = None,
+    ):
+        grpc_options = grpc_options or {}
+        if isinstance(model_instance, ModelRegistry):
+            self.models = model_instance
+        else:
+            self.models = ModelRegistry.single(
+                model_instance, grpc_options, model_release
+            )
+        self.response_cache = response_cache
+        self.metrics = metrics or NULL_METRICS
+        self.request_logger = RequestLogger.from_config(
+            grpc_options.get("request_logging")
+        )
+        thread_count = grpc_options.get("multi_processing", {}).get("thread_count", 5)
+        self.executor = futures.ThreadPoolExecutor(
+            max_workers=thread_count, thread_name_prefix="aigear-aio"
+        )
+        self.stream_max_in_flight = grpc_options.get("streaming", {}).get(
+            "max_in_flight", 64
+        )
+        self.coalescer = SingleFlight.from_config(
+            grpc_options.get("coalescing"), self.metrics.coalesced
+        )
+        self.abandoned = AbandonedRequests(self.metrics.abandoned)
+
+    async def Predict(self, request, context):
+        model = await self._resolve(context, request.model)
+        with self.metrics.track("Predict", context, model.name):
+            async with self._request_context("Predict", context) as request_context:
+                if self.coalescer is None:
+                    return await self._handle_predict(model, request, request_context)
+                try:
+                    return await self.coalescer.do_async(
+                        request_digest(request.request, model.cache_salt),
+                        lambda: self._handle_predict(model, request, NO_CONTEXT),
+                        model.name,
+                        request_context.time_remaining(),
+                    )
+                except asyncio.TimeoutError:
+                    await context.abort(
+                        grpc.StatusCode.DEADLINE_EXCEEDED,
+                        "Deadline exceeded waiting for an identical request.",
+                    )
+
+    async def PredictStream(self, request_iterator, context):
+        model = await self._resolve(context)
+        with self.metrics.track("PredictStream", context, model.name):
+            async for response in self._handle_predict_stream(model, request_iterator):
+                yield response
+
+    async def PredictTensor(self, request, context):
+        model = await self._resolve(context, request.model)
+        with self.metrics.track("PredictTensor", context, model.name):
+            async with self._request_context(
+                "PredictTensor", context
+            ) as request_context:
+                return await self._handle_predict_tensor(
+                    model, request, context, request_context
+                )
+
+    async def PredictBatch(self, request, context):
+        model = await self._resolve(context, request.model)
+        with self.metrics.track("PredictBatch", context, model.name):
+            async with self._request_context(
+                "PredictBatch", context
+            ) as request_context:
+                return await self._handle_predict_batch(model, request, request_context)
+
+    async def PredictArrow(self, request, context):
+        model = await self._resolve(context, request.model)
+        with self.metrics.track("PredictArrow", context, model.name):
+            async with self._request_context(
+                "PredictArrow", context
+            ) as request_context:
+                return await self._handle_predict_arrow(
+                    model, request, context, request_context
+                )
+
+    async def _resolve(self, context, name: str = "") -> ServedModel:
+        model = self.models.resolve(context, name)
+        if model is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, unknown_model(self.models))
+        return model
+
+    @asynccontextmanager
+    async def _request_context(
+        self, method: str, context
+    ) -> AsyncIterator[RequestContext]:
+        """As `MLServicer._request_context`; also counts RPCs gRPC cancelled."""
+        request_context = RequestContext(context)
+        reason = request_context.abandoned()
+        if reason is not None:
+            await self._abandon(method, context, RequestAbandoned(reason, QUEUED))
+        try:
+            yield request_context
+        except RequestAbandoned as e:
+            await self._abandon(method, context, e)
+        except asyncio.CancelledError:
+            # grpc.aio cancels the handler when the client cancels or expires
+            reason = DEADLINE if request_context.expired else CANCELLED
+            self.abandoned.record(method, reason, RUNNING)
+            raise
+        reason = request_context.abandoned()
+        if reason is not None:
+            self.abandoned.record(method, reason, COMPLETED)
+
+    async def _abandon(self, method: str, context, abandoned: RequestAbandoned):
+        self.abandoned.record(method, abandoned.reason, abandoned.stage)
+        await context.abort(abandoned.code, str(abandoned))
+
+    async def _handle_predict(
+        self, model: ServedModel, request, request_context: RequestContext
+    ):
+        metrics = self.metrics
+        request_log = self.request_logger.sample()
+        request_log.info("Predict function called:")
+        cache_key, cached = cache_lookup(
+            self.response_cache, request, request_log, model.cache_salt
+        )
+        if cached is not None:
+            return cached
+        with metrics.stage("Predict", "decode", model.name):
+            request = decode_request(request.request, model.numpy_inputs)
+        request_log.payload("Model input", request)
+        with metrics.stage("Predict", "predict", model.name):
+            model_out = await self._predict(model, request, request_context)
+        request_log.payload("Model output", model_out)
+        with metrics.stage("Predict", "encode", model.name):
+            response = grpc_pb2.MLResponse(response=encode_response(model_out))
+        cache_store(self.response_cache, cache_key, response)
+        return response
+
+    async def _handle_predict_tensor(
+        self, model: ServedModel, request, context, request_context: RequestContext
+    ):
+        metrics = self.metrics
+        self.request_logger.sample().info(
+            f"PredictTensor function called: dtype={request.tensor.dtype}, "
+            f"shape={list(request.tensor.shape)}."
+        )
+        with metrics.stage("PredictTensor", "decode", model.name):
+            try:
+                model_input = tensor_codec.decode_tensor(request.tensor)
+            except ValueError as e:
+                await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+            except ImportError:
+                await context.abort(
+                    grpc.StatusCode.FAILED_PRECONDITION,
+                    "PredictTensor requires numpy on the server.",
+                )
+        model_service = model.model_service
+        predict_tensor = getattr(model_service, "predict_tensor", None)
+        if not callable(predict_tensor):
+            predict_tensor = model_service.predict
+        with metrics.stage("PredictTensor", "predict", model.name):
+            model_out = await self._call(predict_tensor, model_input, request_context)
+        with metrics.stage("PredictTensor", "encode", model.name):
+            response = grpc_pb2.TensorResponse()
+            tensor_codec.encode_tensor(model_out, response.tensor)
+        return response
+
+    async def _handle_predict_arrow(
+        self, model: ServedModel, request, context, request_context: RequestContext
+    ):
+        metrics = self.metrics
+        with metrics.stage("PredictArrow", "decode", model.name):
+            try:
+                table = arrow_codec.decode_table(request.data)
+                predict, model_input = arrow_model_call(model.model_service, table)
+            except ValueError as e:
+                await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+            except ImportError as e:
+                await context.abort(
+                    grpc.StatusCode.FAILED_PRECONDITION,
+                    f"PredictArrow requires {e.name or 'pyarrow'} on the server.",
+                )
+        self.request_logger.sample().info(
+            f"PredictArrow function called: {table.num_rows} rows x "
+            f"{table.num_columns} columns."
+        )
+        with metrics.stage("PredictArrow", "predict", model.name):
+            model_out = await self._call(predict, model_input, request_context)
+        with metrics.stage("PredictArrow", "encode", model.name):
+            return grpc_pb2.ArrowResponse(data=arrow_codec.encode_table(model_out))
+
+    async def _handle_predict_stream(self, stream_model: ServedModel, request_iterator):
+        logger.info("PredictStream opened.")
+        completed = asyncio.Queue()
+        in_flight = asyncio.Semaphore(self.stream_max_in_flight)
+        pending = set()
+
+        def _on_done(request_id, task):
+            pending.discard(task)
+            in_flight.release()
+            completed.put_nowait((request_id, task))
+
+        async def _predict_item(request):
+            model = item_model(self.models, stream_model, request.model)
+            if model is None:
+                raise UnknownModelError(unknown_model(self.models))
+            return await self._predict(
+                model, decode_request(request.request, model.numpy_inputs)
+            )
+
+        async def _read_requests():
+            count = 0
+            try:
+                async for request in request_iterator:
+                    await in_flight.acquire()
+                    task = asyncio.ensure_future(_predict_item(request))
+                    pending.add(task)
+                    task.add_done_callback(
+                        lambda t, request_id=request.request_id: _on_done(request_id, t)
+                    )
+                    count += 1
+            finally:
+                completed.put_nowait(StreamEnd(count))
+
+        reader = asyncio.ensure_future(_read_requests())
+        total, sent = None, 0
+        try:
+            while total is None or sent < total:
+                item = await completed.get()
+                if isinstance(item, StreamEnd):
+                    total = item.count
+                    continue
+                request_id, task = item
+                sent += 1
+                yield stream_response(request_id, task)
+        finally:
+            reader.cancel()
+        logger.info(f"PredictStream closed after {sent} predictions.")
+
+    async def _handle_predict_batch(
+        self, model: ServedModel, request, request_context: RequestContext
+    ):
+        metrics = self.metrics
+        self.request_logger.sample().info(
+            f"PredictBatch function called: {len(request.requests)} inputs."
+        )
+        with metrics.stage("PredictBatch", "decode", model.name):
+            model_inputs = [
+                decode_request(item, model.numpy_inputs) for item in request.requests
+            ]
+        with metrics.stage("PredictBatch", "predict", model.name):
+            results = await self._predict_items(
+                model.model_service, model_inputs, request_context
+            )
+        with metrics.stage("PredictBatch", "encode", model.name):
+            return batch_response(results)
+
+    async def _predict_items(
+        self,
+        model_service: Any,
+        model_inputs: list,
+        request_context: RequestContext = NO_CONTEXT,
+    ) -> list:
+        # As `predict_items`, with per-input `predict` calls
+        # running concurrently.
+        predict_batch = getattr(model_service, "predict_batch", None)
+        if callable(predict_batch):
+            try:
+                model_outputs = await self._call(
+                    predict_batch, model_inputs, request_context
+                )
+                return batch_outputs(model_outputs, len(model_inputs))
+            except RequestAbandoned:
+                raise
+            except Exception as e:
+                log_batch_fallback(len(model_inputs), e)
+        model_outputs = await asyncio.gather(
+            *(
+                self._call(model_service.predict, x, request_context)
+                for x in model_inputs
+            ),
+            return_exceptions=True,
+        )
+        for out in model_outputs:
+            if isinstance(out, RequestAbandoned):
+                raise out
+        return [
+            (None, out) if isinstance(out, Exception) else (out, None)
+            for out in model_outputs
+        ]
+
+    async def _predict(
+        self,
+        model: ServedModel,
+        model_input: Any,
+        request_context: RequestContext = NO_CONTEXT,
+    ) -> Any:
+        if model.batcher is not None:
+            return await asyncio.wrap_future(
+                model.batcher.submit(model_input, request_context)
+            )
+        return await self._call(
+            model.model_service.predict, model_input, request_context
+        )
+
+    async def _call(
+        self,
+        method,
+        model_input: Any,
+        request_context: RequestContext = NO_CONTEXT,
+    ) -> Any:
+        if inspect.iscoroutinefunction(method):
+            return await call_model(method, model_input, request_context)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, run_queued, method, model_input, request_context
+        )
+
+
+async def build_aio_server(
+    model_instance: Any,
+    grpc_options: dict,
+    response_cache: SharedResponseCache | None = None,
+    recycler: WorkerRecycler | None = None,
+    profiler: ProfilerControl | None = None,
+) -> grpc.aio.Server:
+    """Create a `grpc.aio` server with the ML and health services registered.
+
+    The models are warmed up before this returns, so the caller binds the port
+    only once the worker can serve at full speed.
+    """
+    metrics = server_metrics.create_server_metrics(grpc_options.get("metrics"))
+    admission = AdmissionControl.from_config(
+        grpc_options.get("admission"),
+        grpc_options.get("multi_processing", {}).get("thread_count", 5),
+        metrics.rejections,
+    )
+    interceptors = [ServerInterceptor()]
+    # Admission runs first so shed requests cost as little as possible
+    if admission is not None:
+        interceptors.insert(0, admission.aio_interceptor())
+    if recycler is not None:
+        interceptors.append(recycler.aio_interceptor())
+    server = grpc.aio.server(
+        interceptors=interceptors,
+        options=server_options(grpc_options),
+    )
+    servicer = AsyncMLServicer(model_instance, grpc_options, response_cache, metrics)
+    grpc_pb2_grpc.add_MLServicer_to_server(servicer, server)
+
+    # health check service - add this service to server; each model is also a health service name.
+    # It reports NOT_SERVING until the models are warmed up.
+    health_servicer = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    for name in health_names(servicer.models):
+        await health_servicer.set(name, health_pb2.HealthCheckResponse.NOT_SERVING)
+    if profiler is not None:
+        grpc_pb2_grpc.add_AdminServicer_to_server(profiler.aio_servicer(), server)
+        profiler.install_signal_handler()
+    # Warm before the caller binds the port: with SO_REUSEPORT the kernel hands
+    # connections to a worker as soon as it listens.
+    await _warm_up(servicer.models, health_servicer)
+    start_model_reloaders(servicer.models)
+    start_memory_reporting(grpc_options, metrics)
+    return server
+
+
+async def _warm_up(models: ModelRegistry, health_servicer) -> None:
+    # Warm on a thread so the event loop is not blocked by model code
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, warm_up_models, models)
+    for name in health_names(models):
+        await health_servicer.set(name, health_pb2.HealthCheckResponse.SERVING)
+
+
+async def _serve(
+    bind_address: str,
+    model_instance: Any,
+    grpc_options: dict,
+    response_cache: SharedResponseCache | None,
+    recycler: WorkerRecycler | None,
+    profiler: ProfilerControl | None = None,
+) -> None:
+    server = await build_aio_server(
+        model_instance, grpc_options, response_cache, recycler, profiler
+    )
+    server.add_insecure_port(bind_address)
+    await server.start()
+    if recycler is not None:
+        loop = asyncio.get_running_loop()
+        recycler.watch(
+            lambda: asyncio.run_coroutine_threadsafe(
+                server.stop(grace=recycler.grace_seconds), loop
+            )
+        )
+    await grpc_features.wait_until_closed_async(server)
+
+
+def run_aio_server(
+    bind_address: str,
+    model_instance: Any,
+    grpc_options: dict,
+    response_cache: SharedResponseCache | None = None,
+    recycler: WorkerRecycler | None = None,
+    profiler: ProfilerControl | None = None,
+) -> None:
+    """Start an asyncio server in the current (sub)process."""
+    logger.info("Starting new aio server.")
+    asyncio.run(
+        _serve(
+            bind_address,
+            model_instance,
+            grpc_options,
+            response_cache,
+            recycler,
+            profiler,
+        )
+    )
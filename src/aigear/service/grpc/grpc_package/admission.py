@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import inspect
+import threading
+import time
+from collections import Counter
+from concurrent import futures
+from typing import Any
+
+import grpc
+
+from aigear.common.logger import Logging
+
+logger = Logging(log_name=__name__).console_logging()
+
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_QUEUE_BUDGET_MS = 100
+# Health checks and admin calls (e.g. profiling an overloaded worker)
+_EXEMPT_METHOD_PREFIXES = ("/grpc.health.", "/Admin/")
+_QUEUE_FULL = (grpc.StatusCode.RESOURCE_EXHAUSTED, "Server overloaded: queue full.")
+_BEHAVIORS = ("unary_unary", "unary_stream", "stream_unary", "stream_stream")
+
+
+class AdmissionControl:
+    """
+    Sheds load before it is computed instead of letting the queue grow.
+
+    - A worker admits at most `thread_count + max_queue` concurrent RPCs;
+      further calls are answered with RESOURCE_EXHAUSTED without being
+      computed.
+    - A request that waited longer than `queue_budget_ms` for a thread is
+      answered with RESOURCE_EXHAUSTED instead of being computed.
+    - A request whose deadline passed while it was queued is answered with
+      DEADLINE_EXCEEDED.
+
+    Health checks and admin calls are exempt from all three rules, and do not
+    count against the bound. Every rejection is counted by reason:
+    `queue_full`, `queue_budget` or `deadline`.
+    """
+
+    def __init__(
+        self,
+        thread_count: int,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        queue_budget_ms: float = DEFAULT_QUEUE_BUDGET_MS,
+        rejections: Any = None,
+    ):
+        self.max_queue = int(max_queue)
+        self.queue_budget_seconds = float(queue_budget_ms) / 1000
+        self.max_admitted = (
+            int(thread_count) + self.max_queue if self.max_queue > 0 else None
+        )
+        self._rejections = rejections
+        self._rejected = Counter()
+        self._admitted = 0
+        self._lock = threading.Lock()
+        # Set by `interceptor` on the thread that submits the admitted call
+        self._pending = threading.local()
+
+    @classmethod
+    def from_config(
+        cls, admission_config: dict | None, thread_count: int, rejections: Any = None
+    ) -> "AdmissionControl | None":
+        """Build the admission control for `model_service.grpc.admission` if it is enabled."""
+        admission_config = admission_config or {}
+        if not admission_config.get("on", False):
+            return None
+        admission = cls(
+            thread_count,
+            max_queue=admission_config.get("max_queue", DEFAULT_MAX_QUEUE),
+            queue_budget_ms=admission_config.get(
+                "queue_budget_ms", DEFAULT_QUEUE_BUDGET_MS
+            ),
+            rejections=rejections,
+        )
+        logger.info(
+            f"Enable admission control. max admitted RPCs: "
+            f"{admission.max_admitted}, queue budget: "
+            f"{admission.queue_budget_seconds * 1000:g}ms."
+        )
+        return admission
+
+    def stats(self) -> dict:
+        return {
+            reason: self._rejected[reason]
+            for reason in ("queue_full", "queue_budget", "deadline")
+        }
+
+    def track(self, future: futures.Future) -> None:
+        """
+        Hold the admitted RPC's slot until its pool task completes.
+
+        gRPC submits an RPC to its thread pool right after the interceptors
+        have run, on the same thread, so the task submitted after `interceptor`
+        admitted a call is that call. Exempt and rejected calls hold no slot.
+        """
+        if getattr(self._pending, "admitted", False):
+            self._pending.admitted = False
+            future.add_done_callback(self._release)
+
+    def interceptor(self) -> grpc.ServerInterceptor:
+        return _AdmissionInterceptor(self)
+
+    def aio_interceptor(self) -> grpc.aio.ServerInterceptor:
+        return _AsyncAdmissionInterceptor(self)
+
+    def _admit(self, method: str) -> bool:
+        """Take a slot for one RPC, or count a `queue_full` rejection if none is left."""
+        with self._lock:
+            admitted = self.max_admitted is None or self._admitted < self.max_admitted
+            if admitted:
+                self._admitted += 1
+        if not admitted:
+            self._reject(method, "queue_full")
+        return admitted
+
+    def _release(self, _future: futures.Future | None = None) -> None:
+        with self._lock:
+            self._admitted -= 1
+
+    def _rejection(
+        self, method: str, queued_at: float, context: Any
+    ) -> tuple[grpc.StatusCode, str] | None:
+        time_remaining = context.time_remaining()
+        if time_remaining is not None and time_remaining <= 0:
+            self._reject(method, "deadline")
+            return grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline passed while queued."
+        waited = time.monotonic() - queued_at
+        if 0 < self.queue_budget_seconds < waited:
+            self._reject(method, "queue_budget")
+            return (
+                grpc.StatusCode.RESOURCE_EXHAUSTED,
+                f"Server overloaded: queued {waited * 1000:.0f}ms.",
+            )
+        return None
+
+    def _reject(self, method: str, reason: str) -> None:
+        self._rejected[reason] += 1
+        if self._rejections is not None:
+            self._rejections.labels(method, reason).inc()
+
+
+def _method_name(handler_call_details) -> str:
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+class _AdmissionInterceptor(grpc.ServerInterceptor):
+    def __init__(self, admission: AdmissionControl):
+        self._admission = admission
+
+    def intercept_service(self, continuation, handler_call_details):
+        admission = self._admission
+        handler = continuation(handler_call_details)
+        if handler is None or handler_call_details.method.startswith(
+            _EXEMPT_METHOD_PREFIXES
+        ):
+            return handler
+        method = _method_name(handler_call_details)
+        # Runs on the server's polling thread, just before gRPC queues the
+        # call on its thread pool. A call admitted before but never submitted
+        # gives its slot back.
+        if getattr(admission._pending, "admitted", False):
+            admission._release()
+        admission._pending.admitted = admission._admit(method)
+        if not admission._pending.admitted:
+            return _wrap_behaviors(handler, _rejected)
+        queued_at = time.monotonic()
+
+        def _wrap(behavior):
+            def _admitted(request, context):
+                rejection = admission._rejection(method, queued_at, context)
+                if rejection is not None:
+                    context.abort(*rejection)
+                return behavior(request, context)
+
+            return _admitted
+
+        return _wrap_behaviors(handler, _wrap)
+
+
+class _AsyncAdmissionInterceptor(grpc.aio.ServerInterceptor):
+    def __init__(self, admission: AdmissionControl):
+        self._admission = admission
+
+    async def intercept_service(self, continuation, handler_call_details):
+        admission = self._admission
+        handler = await continuation(handler_call_details)
+        if handler is None or handler_call_details.method.startswith(
+            _EXEMPT_METHOD_PREFIXES
+        ):
+            return handler
+        method = _method_name(handler_call_details)
+        queued_at = time.monotonic()
+
+        # There is no thread pool to queue on: a call holds its slot while its
+        # handler runs, awaited I/O included.
+        def _wrap(behavior):
+            if inspect.isasyncgenfunction(behavior):
+
+                async def _admitted_stream(request, context):
+                    if not admission._admit(method):
+                        await context.abort(*_QUEUE_FULL)
+                    try:
+                        rejection = admission._rejection(method, queued_at, context)
+                        if rejection is not None:
+                            await context.abort(*rejection)
+                        async for response in behavior(request, context):
+                            yield response
+                    finally:
+                        admission._release()
+
+                return _admitted_stream
+
+            async def _admitted(request, context):
+                if not admission._admit(method):
+                    await context.abort(*_QUEUE_FULL)
+                try:
+                    rejection = admission._rejection(method, queued_at, context)
+                    if rejection is not None:
+                        await context.abort(*rejection)
+                    return await behavior(request, context)
+                finally:
+                    admission._release()
+
+            return _admitted
+
+        return _wrap_behaviors(handler, _wrap)
+
+
+def _rejected(_behavior):
+    def _reject(request, context):
+        context.abort(*_QUEUE_FULL)
+
+    return _reject
+
+
+def _wrap_behaviors(handler, wrap):
+    return handler._replace(
+        **{
+            name: wrap(getattr(handler, name))
+            for name in _BEHAVIORS
+            if getattr(handler, name) is not None
+        }
+    )
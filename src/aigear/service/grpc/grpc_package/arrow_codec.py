@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Any
+
+# Column name used when a model returns a plain list or array
+PREDICTION_COLUMN = "prediction"
+
+
+def decode_table(data: bytes) -> Any:
+    """
+    Decode an Arrow IPC stream into a `pyarrow.Table` without copying.
+
+    The columns are views over `data`, which the table keeps alive.
+
+    Raises:
+        ValueError: if `data` is not a valid Arrow IPC stream.
+    """
+    import pyarrow as pa
+
+    try:
+        with pa.ipc.open_stream(pa.py_buffer(data)) as reader:
+            return reader.read_all()
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Invalid Arrow IPC stream: {e}") from e
+
+
+def encode_table(value: Any) -> bytes:
+    """
+    Encode a model output as an Arrow IPC stream.
+
+    Accepts a pyarrow Table or RecordBatch, a pandas DataFrame, a dict of
+    columns, or a list / array, which becomes the single column
+    `prediction` (one row per element; rows of a 2-D array become lists).
+    """
+    import pyarrow as pa
+
+    table = to_table(value)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_table(value: Any) -> Any:
+    import pyarrow as pa
+
+    if isinstance(value, pa.Table):
+        return value
+    if isinstance(value, pa.RecordBatch):
+        return pa.Table.from_batches([value])
+    if type(value).__module__.startswith("pandas") and hasattr(value, "columns"):
+        return pa.Table.from_pandas(value, preserve_index=False)
+    if isinstance(value, dict):
+        return pa.table(value)
+    if getattr(value, "ndim", 1) > 1:
+        value = list(value)
+    return pa.table({PREDICTION_COLUMN: value})
@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+from aigear.service.grpc.grpc_package.request_context import QUEUED, RequestAbandoned
+
+_STOP = object()
+_batchers = weakref.WeakSet()
+
+
+class MicroBatcher:
+    """
+    Gather concurrent single-item calls into one call of a vectorized handler.
+
+    Callers submit one input and get a Future for their own output. A single
+    background thread pulls queued inputs, calls ``handler(inputs)`` once per
+    batch and hands each caller the output at the same position.
+
+    Batching is adaptive: when the previous batch held a single item (idle or
+    light traffic) the batch is dispatched as soon as it is picked up, so no
+    latency is added. Once concurrent requests are seen, the batcher waits up
+    to ``max_wait_ms`` for the batch to fill to ``max_batch_size``.
+
+    An item submitted with a ``RequestContext`` whose client stopped waiting
+    while it was queued is not passed to the handler; its future fails with
+    ``RequestAbandoned``.
+
+    The batch thread starts on the first call. It does not survive fork, so
+    a batcher built in the parent starts a fresh thread and queue in each
+    forked worker that uses it.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        name: str = "aigear-batcher",
+    ):
+        self.handler = handler
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.name = name
+        self._reset()
+        _batchers.add(self)
+
+    def _reset(self) -> None:
+        self._queue = queue.Queue()
+        self._last_batch_size = 1
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(
+                    target=self._loop, name=self.name, daemon=True
+                )
+                thread.start()
+                self._thread = thread
+
+    def submit(self, item: Any, context: Any = None) -> Future:
+        if self._thread is None:
+            self._start()
+        future = Future()
+        self._queue.put((item, future, context))
+        return future
+
+    def __call__(self, item: Any, context: Any = None) -> Any:
+        return self.submit(item, context).result()
+
+    def close(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+        self._thread = None
+
+    def _collect(self, first) -> tuple:
+        batch = [first]
+        wait = self.max_wait if self._last_batch_size > 1 else 0.0
+        deadline = time.monotonic() + wait
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._last_batch_size = len(batch)
+            self._run(batch)
+            if stop:
+                return
+
+    def _run(self, batch: list) -> None:
+        batch = [
+            (item, future)
+            for item, future, context in batch
+            if future.set_running_or_notify_cancel() and not _abandoned(future, context)
+        ]
+        if not batch:
+            return
+        try:
+            outputs = list(self.handler([item for item, _ in batch]))
+            if len(outputs) != len(batch):
+                raise ValueError(
+                    f"Batch handler returned {len(outputs)} outputs for {len(batch)} inputs."
+                )
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), output in zip(batch, outputs):
+            future.set_result(output)
+
+
+def _reset_after_fork() -> None:
+    for batcher in list(_batchers):
+        batcher._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _abandoned(future: Future, context: Any) -> bool:
+    reason = None if context is None else context.abandoned()
+    if reason is None:
+        return False
+    future.set_exception(RequestAbandoned(reason, QUEUED))
+    return True
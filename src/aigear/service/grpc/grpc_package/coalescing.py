@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import Counter
+from concurrent import futures
+from typing import Any, Awaitable, Callable
+
+from aigear.common.logger import Logging
+
+logger = Logging(log_name=__name__).console_logging()
+
+
+class SingleFlight:
+    """
+    Coalesces identical requests that are in flight at the same time.
+
+    The first caller for a key (the leader) runs the call. Callers with the
+    same key that arrive before it returns (followers) wait for its result,
+    or its exception, instead of running the call again. Nothing is kept
+    once the call returns: the next request with that key leads a new call.
+
+    Keys are request digests (see `request_digest`) salted per model and
+    release, so only byte-identical payloads to the same model coalesce.
+    Leaders and followers are counted by model.
+    """
+
+    def __init__(self, counter: Any = None):
+        self._counter = counter
+        self._calls = {}
+        # The event loop only keeps weak references to running tasks
+        self._tasks = set()
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls, coalescing_config: dict | None, counter: Any = None
+    ) -> "SingleFlight | None":
+        """Build the coalescer for `model_service.grpc.coalescing` if it is enabled."""
+        if not (coalescing_config or {}).get("on", False):
+            return None
+        logger.info("Enable coalescing of identical in-flight requests.")
+        return cls(counter)
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self._counts["leader"],
+            "followers": self._counts["follower"],
+        }
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def do(
+        self,
+        key: bytes,
+        call: Callable[[], Any],
+        model: str = "",
+        timeout: float | None = None,
+    ) -> Any:
+        """
+        Run `call` unless an identical one is in flight; a follower waits at
+        most `timeout` seconds and then raises `concurrent.futures.TimeoutError`.
+        """
+        future, leader = self._join(key, model)
+        if not leader:
+            return future.result(timeout=timeout)
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+        future.set_result(result)
+        return result
+
+    async def do_async(
+        self,
+        key: bytes,
+        call: Callable[[], Awaitable[Any]],
+        model: str = "",
+        timeout: float | None = None,
+    ) -> Any:
+        """
+        `do` for coroutines on an event loop; a follower raises
+        `asyncio.TimeoutError` after `timeout` seconds.
+
+        The leader's call runs in its own task, so a leader whose RPC is
+        cancelled does not take its followers' result with it.
+        """
+        future, leader = self._join(key, model)
+        if leader:
+            task = asyncio.ensure_future(call())
+            self._tasks.add(task)
+            task.add_done_callback(lambda done: self._publish(key, future, done))
+            timeout = None
+        # shield: a caller that times out or is cancelled leaves the call running
+        return await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(future)), timeout
+        )
+
+    def _join(self, key: bytes, model: str) -> tuple:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = futures.Future()
+        role = "leader" if leader else "follower"
+        self._counts[role] += 1
+        if self._counter is not None:
+            self._counter.labels(model, role).inc()
+        return future, leader
+
+    def _leave(self, key: bytes) -> None:
+        # Removed before the result is published, so a request arriving after
+        # the call returned starts a fresh call instead of reusing this one.
+        with self._lock:
+            del self._calls[key]
+
+    def _publish(self, key: bytes, future: futures.Future, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._leave(key)
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
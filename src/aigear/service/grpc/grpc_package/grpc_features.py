@@ -1,4 +1,4 @@
-import time
+import asyncio
 import signal
 from contextlib import contextmanager
 from typing import Any
@@ -17,12 +17,31 @@ def wait_until_closed(server: Any) -> None:
     signal.signal(signal.SIGTERM, sigterm_handler)
 
     try:
-        while True:
-            time.sleep(60 * 60)
+        # Returns once the server is stopped, by a signal or from another thread
+        server.wait_for_termination()
     except KeyboardInterrupt:
         sigterm_handler(signal.SIGTERM, None)
 
 
+async def wait_until_closed_async(server: Any) -> None:
+    """
+    Asyncio variant of `wait_until_closed` for `grpc.aio` servers.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(
+            signal.SIGTERM, lambda: asyncio.ensure_future(server.stop(grace=None))
+        )
+    except NotImplementedError:
+        # Windows event loops do not support signal handlers
+        pass
+
+    try:
+        await server.wait_for_termination()
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        await server.stop(grace=None)
+
+
 @contextmanager
 def reserve_port(port: int):
     """
@@ -0,0 +1,332 @@
+"""
+Prometheus / OpenMetrics metrics for the gRPC model server.
+
+Metrics are recorded with `prometheus_client` in multiprocess mode: every
+worker process writes its samples to files under a shared directory and the
+parent process serves one scrape that aggregates all of them. The directory
+must be set up with `prepare_metrics_dir` *before* `prometheus_client` is
+imported, which is why this module imports it lazily.
+
+Requires the `metrics` extra: `pip install aigear[metrics]`.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from concurrent import futures
+from pathlib import Path
+from typing import Any
+
+import grpc
+
+from aigear.common.logger import Logging
+
+logger = Logging(log_name=__name__).console_logging()
+
+METRICS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+DEFAULT_METRICS_DIR = "/tmp/aigear_metrics"
+DEFAULT_METRICS_PORT = 9090
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def prepare_metrics_dir(path: str | Path = DEFAULT_METRICS_DIR) -> Path:
+    """
+    Empty the multiprocess metrics directory and point prometheus_client at it.
+
+    Call this in the parent before the models are loaded and any worker is
+    started.
+    """
+    path = Path(path)
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True, exist_ok=True)
+    os.environ[METRICS_DIR_ENV] = str(path)
+    return path
+
+
+def start_metrics_server(
+    port: int, response_cache: Any = None, worker_pool: Any = None
+) -> None:
+    """Serve the aggregated metrics of all worker processes over HTTP."""
+    from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    if response_cache is not None:
+        registry.register(_ResponseCacheCollector(response_cache))
+    if worker_pool is not None:
+        registry.register(_WorkerPoolCollector(worker_pool))
+    start_http_server(int(port), registry=registry)
+    logger.info(f"Metrics endpoint listening on :{port}/metrics.")
+
+
+def mark_worker_dead(pid: int) -> None:
+    """Drop the live gauges of a worker that exited."""
+    if METRICS_DIR_ENV not in os.environ:
+        return
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(pid)
+
+
+class _ResponseCacheCollector:
+    """Export the shared response cache counters, read once per scrape."""
+
+    def __init__(self, response_cache):
+        self.response_cache = response_cache
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+        stats = self.response_cache.stats()
+        for name in ("hits", "misses", "evictions"):
+            yield CounterMetricFamily(
+                f"aigear_response_cache_{name}",
+                f"Shared response cache {name}.",
+                value=stats[name],
+            )
+        yield GaugeMetricFamily(
+            "aigear_response_cache_capacity",
+            "Shared response cache capacity in entries.",
+            value=stats["capacity"],
+        )
+
+
+class _WorkerPoolCollector:
+    """Export the worker supervisor counters, which live in the parent process."""
+
+    def __init__(self, worker_pool):
+        self.worker_pool = worker_pool
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+        stats = self.worker_pool.stats()
+        for name in ("crashes", "restarts", "recycles"):
+            yield CounterMetricFamily(
+                f"aigear_worker_{name}",
+                f"Worker process {name} since the server started.",
+                value=stats[name],
+            )
+        yield GaugeMetricFamily(
+            "aigear_workers_alive", "Worker processes running.", value=stats["alive"]
+        )
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _RequestTracker:
+    __slots__ = ("_metrics", "_method", "_context", "_model", "_start")
+
+    def __init__(self, metrics: "ServerMetrics", method: str, context: Any, model: str):
+        self._metrics = metrics
+        self._method = method
+        self._context = context
+        self._model = model
+
+    def __enter__(self):
+        self._metrics.in_flight.labels(self._method, self._model).inc()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics, method, model = self._metrics, self._method, self._model
+        metrics.latency.labels(method, "total", model).observe(
+            time.perf_counter() - self._start
+        )
+        metrics.in_flight.labels(method, model).dec()
+        code = _status_code(self._context)
+        if code is None:
+            code = grpc.StatusCode.UNKNOWN if exc_type else grpc.StatusCode.OK
+        metrics.requests.labels(method, code.name, model).inc()
+        return False
+
+
+def _status_code(context: Any) -> grpc.StatusCode | None:
+    code = getattr(context, "code", None)
+    if not callable(code):
+        return None
+    try:
+        code = code()
+    except Exception:
+        return None
+    return code if isinstance(code, grpc.StatusCode) else None
+
+
+class ServerMetrics:
+    """
+    Request metrics for one worker process, labelled by method and model.
+
+    `track(method, context, model)` wraps a whole RPC: in-flight gauge, total
+    latency and a request counter labelled with the final gRPC status code.
+    `stage(method, stage, model)` times the decode / predict / encode steps.
+    """
+
+    def __init__(self):
+        from prometheus_client import Counter, Gauge, Histogram
+
+        self.requests = Counter(
+            "aigear_grpc_requests",
+            "gRPC requests handled, by method, status code and model.",
+            ["method", "code", "model"],
+            registry=None,
+        )
+        self.latency = Histogram(
+            "aigear_grpc_request_duration_seconds",
+            "gRPC request latency by method and stage (decode, predict, encode, total).",
+            ["method", "stage", "model"],
+            buckets=LATENCY_BUCKETS,
+            registry=None,
+        )
+        self.in_flight = Gauge(
+            "aigear_grpc_in_flight_requests",
+            "gRPC requests currently being handled.",
+            ["method", "model"],
+            multiprocess_mode="livesum",
+            registry=None,
+        )
+        self.rejections = Counter(
+            "aigear_grpc_rejected_requests",
+            "gRPC requests shed by admission control, by method and reason "
+            "(queue_full, queue_budget, deadline).",
+            ["method", "reason"],
+            registry=None,
+        )
+        self.coalesced = Counter(
+            "aigear_grpc_coalesced_requests",
+            "Predict requests by coalescing role: leader (ran the model) or "
+            "follower (shared an identical in-flight request's result).",
+            ["model", "role"],
+            registry=None,
+        )
+        self.abandoned = Counter(
+            "aigear_grpc_abandoned_requests",
+            "Requests the client cancelled or let expire, by method, reason "
+            "(cancelled, deadline) and stage: queued (skipped before the "
+            "model), running (the model stopped early) or completed (the "
+            "model's work was wasted).",
+            ["method", "reason", "stage"],
+            registry=None,
+        )
+        self.queue_depth = Gauge(
+            "aigear_grpc_thread_pool_queue_depth",
+            "gRPC requests waiting for a server thread.",
+            multiprocess_mode="livesum",
+            registry=None,
+        )
+        self.memory = Gauge(
+            "aigear_worker_memory_bytes",
+            "Worker process memory by kind: rss, pss (shared pages split "
+            "between processes) and uss (private pages).",
+            ["kind"],
+            multiprocess_mode="liveall",
+            registry=None,
+        )
+        self._stage_histograms = {}
+
+    def track(self, method: str, context: Any, model: str = "") -> _RequestTracker:
+        return _RequestTracker(self, method, context, model)
+
+    def stage(self, method: str, stage: str, model: str = "") -> _Timer:
+        key = (method, stage, model)
+        histogram = self._stage_histograms.get(key)
+        if histogram is None:
+            histogram = self.latency.labels(method, stage, model)
+            self._stage_histograms[key] = histogram
+        return _Timer(histogram)
+
+
+class _NullContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class NullMetrics:
+    """Stand-in used when metrics are off; every call is a no-op."""
+
+    queue_depth = None
+    memory = None
+    rejections = None
+    coalesced = None
+    abandoned = None
+
+    def track(self, method: str, context: Any, model: str = "") -> _NullContext:
+        return _NULL_CONTEXT
+
+    def stage(self, method: str, stage: str, model: str = "") -> _NullContext:
+        return _NULL_CONTEXT
+
+
+NULL_METRICS = NullMetrics()
+
+
+def create_server_metrics(metrics_config: dict | None) -> ServerMetrics | NullMetrics:
+    """Build the per-process metrics for `model_service.grpc.metrics`."""
+    if not (metrics_config or {}).get("on", False):
+        return NULL_METRICS
+    return ServerMetrics()
+
+
+class MeteredThreadPoolExecutor(futures.ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor that reports how many submitted tasks are still waiting
+    for a thread, and hands every submitted future to `on_submit`.
+    """
+
+    def __init__(self, *args, queue_depth=None, on_submit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._queue_depth = queue_depth
+        self._on_submit = on_submit
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self._queue_depth is None:
+            future = super().submit(fn, *args, **kwargs)
+        else:
+            self._queue_depth.inc()
+            queue_depth = self._queue_depth
+
+            def _run(*args, **kwargs):
+                queue_depth.dec()
+                return fn(*args, **kwargs)
+
+            future = super().submit(_run, *args, **kwargs)
+        if self._on_submit is not None:
+            self._on_submit(future)
+        return future
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Iterator
+
+from aigear.common.loading_module import LoadModule
+from aigear.common.logger import Logging
+from aigear.service.grpc.grpc_package.batching import MicroBatcher
+from aigear.service.grpc.grpc_package.model_reload import (
+    load_release,
+    read_release_pointer,
+)
+from aigear.service.grpc.grpc_package.request_context import NO_CONTEXT, call_model
+
+logger = Logging(log_name=__name__).console_logging()
+
+# Request metadata naming the model (pipeline version) a call is for
+MODEL_METADATA_KEY = "x-aigear-model"
+
+
+class UnknownModelError(LookupError):
+    """A request names a model the server does not host."""
+
+
+class ServedModel:
+    """
+    One model behind the server: the ModelService instance with its release,
+    micro-batcher and per-model `model_service.grpc` options.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model_instance: Any,
+        grpc_options: dict | None = None,
+        model_release: str | None = None,
+    ):
+        self.name = name
+        self.grpc_options = grpc_options or {}
+        self.model_service = model_instance
+        self.model_release = model_release
+        self.cache_salt = cache_salt(name, model_release)
+        self.batcher = create_batcher(self, self.grpc_options.get("batching", {}))
+        # Numeric lists of Struct inputs are passed as numpy arrays
+        self.numpy_inputs = self.grpc_options.get("numpy_inputs", {}).get("on", False)
+
+    def predict_batch(self, model_inputs: list) -> list:
+        # A micro-batch mixes requests, so it runs without a request context
+        return call_model(self.model_service.predict_batch, model_inputs, NO_CONTEXT)
+
+    def swap(self, model_instance: Any, model_release: str) -> None:
+        """Serve `model_instance` from now on; in-flight requests keep the old model."""
+        # Model first: a request that already missed the cache under the old
+        # release at worst stores a new-model response under the old key.
+        self.model_service = model_instance
+        self.model_release = model_release
+        self.cache_salt = cache_salt(self.name, model_release)
+
+
+class ModelRegistry:
+    """
+    The models one server hosts, keyed by pipeline version.
+
+    A call names its model in the request's `model` field or in the
+    `x-aigear-model` metadata; calls that name none go to the first model.
+    """
+
+    def __init__(self, models: list[ServedModel]):
+        if not models:
+            raise ValueError("A model server needs at least one model.")
+        self._models = {model.name: model for model in models}
+        self.default = models[0]
+
+    @classmethod
+    def single(
+        cls,
+        model_instance: Any,
+        grpc_options: dict | None = None,
+        model_release: str | None = None,
+        name: str = "",
+    ) -> "ModelRegistry":
+        return cls([ServedModel(name, model_instance, grpc_options, model_release)])
+
+    def __iter__(self) -> Iterator[ServedModel]:
+        return iter(self._models.values())
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    @property
+    def names(self) -> list:
+        return list(self._models)
+
+    def resolve(self, context: Any, name: str = "") -> ServedModel | None:
+        """Find the model a call is for; None if it names an unknown model."""
+        if not name:
+            name = _metadata_value(context, MODEL_METADATA_KEY)
+        if not name:
+            return self.default
+        return self._models.get(name)
+
+
+def _metadata_value(context: Any, key: str) -> str:
+    invocation_metadata = getattr(context, "invocation_metadata", None)
+    if not callable(invocation_metadata):
+        return ""
+    for metadatum in invocation_metadata() or ():
+        if metadatum.key == key:
+            return metadatum.value
+    return ""
+
+
+def cache_salt(name: str, model_release: str | None) -> bytes:
+    """Response cache key space of one model release; blake2b keys are <= 64 bytes."""
+    if not name and not model_release:
+        return b""
+    return hashlib.blake2b(
+        f"{name}\0{model_release or ''}".encode(), digest_size=32
+    ).digest()
+
+
+def create_batcher(model: ServedModel, batching: dict) -> MicroBatcher | None:
+    """
+    Build the micro-batcher for `model_service.grpc.batching` if it is enabled.
+
+    Batching needs a `predict_batch(list) -> list` method on the ModelService;
+    without one the per-request `predict` path is kept.
+    """
+    if not batching.get("on", False):
+        return None
+    if not callable(getattr(model.model_service, "predict_batch", None)):
+        logger.warning(
+            "Batching is on but the model has no `predict_batch` method, "
+            "falling back to per-request `predict`."
+        )
+        return None
+    max_batch_size = batching.get("max_batch_size", 32)
+    max_wait_ms = batching.get("max_wait_ms", 5)
+    logger.info(
+        f"Enable micro-batching. max batch size: {max_batch_size}, max wait: {max_wait_ms}ms."
+    )
+    return MicroBatcher(
+        model.predict_batch,
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        name=f"aigear-batcher-{model.name}" if model.name else "aigear-batcher",
+    )
+
+
+def load_served_model(
+    pipeline_version: str, model_class_path: str | None, grpc_options: dict
+) -> ServedModel | None:
+    logger.info(f"gRPC load module: {model_class_path}...")
+    model_class = LoadModule(model_class_path).load_module()
+    if model_class is None:
+        logger.error("model module instance fail!!!!!!")
+        return None
+    # With hot reload on, start from the release the pointer currently names
+    reload_config = grpc_options.get("reload", {})
+    model_release = None
+    if reload_config.get("on", False):
+        model_release = read_release_pointer(reload_config["pointer"])
+        logger.info(f"Model release: {model_release}.")
+    model_instance = load_release(model_class, model_release)
+    logger.info(f"gRPC load module successfully: {pipeline_version}.")
+    return ServedModel(pipeline_version, model_instance, grpc_options, model_release)
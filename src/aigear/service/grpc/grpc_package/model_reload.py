@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import gc
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from aigear.common.logger import Logging
+from aigear.service.grpc.grpc_package.warmup import warm_up
+
+logger = Logging(log_name=__name__).console_logging()
+
+
+def read_release_pointer(pointer: str, storage_client: Any = None) -> str | None:
+    """
+    Read the release a pointer refers to: the stripped content of a local file
+    or of a `gs://bucket/blob` object. Returns None if it cannot be read.
+    """
+    try:
+        if pointer.startswith("gs://"):
+            bucket_name, _, blob_name = pointer[len("gs://") :].partition("/")
+            if storage_client is None:
+                from google.cloud import storage
+
+                storage_client = storage.Client()
+            text = storage_client.bucket(bucket_name).blob(blob_name).download_as_text()
+        else:
+            text = Path(pointer).read_text()
+    except Exception as e:
+        logger.warning(f"Failed to read release pointer {pointer}: {e}")
+        return None
+    return text.strip() or None
+
+
+def load_release(model_class: Any, release: str | None) -> Any:
+    """
+    Create a ModelService for a release.
+
+    A ModelService that defines a `from_release(release)` classmethod is built
+    with it; otherwise the class is instantiated as usual.
+    """
+    from_release = getattr(model_class, "from_release", None)
+    if release is not None and callable(from_release):
+        return from_release(release)
+    return model_class()
+
+
+class ModelReloader:
+    """
+    Polls a release pointer and swaps in a new model when it changes.
+
+    The new model is created and warmed (see `warm_up`) in a background
+    thread while the current one keeps serving. The swap itself is one
+    attribute assignment, so every request runs entirely on either the old
+    or the new model. Requests already running finish on the old model,
+    which is freed once the last of them returns. If loading fails, the
+    current model keeps serving and the release is retried on the next poll.
+    """
+
+    def __init__(
+        self,
+        pointer: str,
+        load_model: Callable[[str], Any],
+        swap_model: Callable[[Any, str], None],
+        release: str | None = None,
+        poll_seconds: float = 60.0,
+        warmup_config: dict | None = None,
+    ):
+        self.pointer = pointer
+        self.load_model = load_model
+        self.swap_model = swap_model
+        self.release = release
+        self.poll_seconds = float(poll_seconds)
+        self.warmup_config = warmup_config
+        self._storage_client = None
+
+    @classmethod
+    def from_config(
+        cls,
+        reload_config: dict | None,
+        model_class: Any,
+        swap_model: Callable[[Any, str], None],
+        release: str | None = None,
+        warmup_config: dict | None = None,
+    ) -> "ModelReloader | None":
+        """Build the reloader for `model_service.grpc.reload` if it is enabled."""
+        reload_config = reload_config or {}
+        if not reload_config.get("on", False):
+            return None
+        return cls(
+            reload_config["pointer"],
+            lambda new_release: load_release(model_class, new_release),
+            swap_model,
+            release=release,
+            poll_seconds=reload_config.get("poll_seconds", 60),
+            warmup_config=warmup_config,
+        )
+
+    def check(self) -> bool:
+        """Reload if the pointer moved; returns True when a new model was swapped in."""
+        if self.pointer.startswith("gs://") and self._storage_client is None:
+            from google.cloud import storage
+
+            self._storage_client = storage.Client()
+        release = read_release_pointer(self.pointer, self._storage_client)
+        if release is None or release == self.release:
+            return False
+        logger.info(f"Loading model release {release} (serving {self.release}).")
+        started = time.monotonic()
+        try:
+            model_instance = self.load_model(release)
+            warm_up(model_instance, self.warmup_config)
+        except Exception as e:
+            logger.error(f"Failed to load model release {release}: {e}")
+            return False
+        self.swap_model(model_instance, release)
+        self.release = release
+        del model_instance
+        _release_old_model()
+        logger.info(
+            f"Serving model release {release}, "
+            f"loaded in {time.monotonic() - started:.1f}s."
+        )
+        return True
+
+    def start(self) -> threading.Thread:
+        def _poll():
+            # Check before the first sleep: a forked or restarted worker may
+            # have loaded a release that was replaced while it started.
+            while True:
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error(f"Model reload check failed: {e}")
+                # Jitter keeps worker processes from loading at the same moment
+                time.sleep(self.poll_seconds * random.uniform(0.8, 1.2))
+
+        thread = threading.Thread(target=_poll, name="aigear-model-reload", daemon=True)
+        thread.start()
+        return thread
+
+
+def _release_old_model() -> None:
+    # Refcounting frees the old model once its last request returns. Only the
+    # young generations are collected: a full collection would walk the heap
+    # frozen before fork and dirty the pages workers share copy-on-write.
+    gc.collect(1)
@@ -0,0 +1,186 @@
+"""
+Request and response helpers shared by the sync and `grpc.aio` servers and
+by batch inference: Struct decoding and encoding, the shared response cache,
+per-item stream and batch results.
+"""
+
+from __future__ import annotations
+
+from concurrent import futures
+from typing import Any
+
+import grpc
+from google.protobuf import struct_pb2
+
+from aigear.common.logger import Logging
+from aigear.service.grpc.grpc_package import struct_codec
+from aigear.service.grpc.grpc_package.model_registry import (
+    ModelRegistry,
+    ServedModel,
+    UnknownModelError,
+)
+from aigear.service.grpc.grpc_package.request_context import (
+    NO_CONTEXT,
+    RequestAbandoned,
+    RequestContext,
+    call_model,
+)
+from aigear.service.grpc.grpc_package.response_cache import (
+    SharedResponseCache,
+    request_digest,
+)
+from aigear.service.grpc.protos import grpc_pb2
+
+logger = Logging(log_name=__name__).console_logging()
+
+
+class StreamEnd:
+    def __init__(self, count: int):
+        self.count = count
+
+
+def unknown_model(models: ModelRegistry) -> str:
+    return f"Unknown model; this server hosts {models.names}."
+
+
+def item_model(
+    models: ModelRegistry, stream_model: ServedModel, name: str
+) -> ServedModel | None:
+    # A stream item may name its own model; otherwise it uses the stream's
+    if not name:
+        return stream_model
+    return models.resolve(None, name)
+
+
+def decode_request(request: struct_pb2.Struct, numpy_arrays: bool = False) -> dict:
+    return struct_codec.decode_struct(request, numpy_arrays)
+
+
+def encode_response(model_out: Any) -> struct_pb2.Struct:
+    return struct_codec.encode_struct({"response": model_out})
+
+
+def cache_lookup(
+    response_cache: SharedResponseCache | None,
+    request: grpc_pb2.MLRequest,
+    request_log: Any,
+    cache_salt: bytes = b"",
+) -> tuple:
+    """Return (cache key, cached MLResponse or None); the key is None when caching is off."""
+    if response_cache is None:
+        return None, None
+    cache_key = request_digest(request.request, cache_salt)
+    cached = response_cache.get(cache_key)
+    if cached is None:
+        return cache_key, None
+    request_log.info("Model output served from cache.")
+    return cache_key, grpc_pb2.MLResponse.FromString(cached)
+
+
+def cache_store(
+    response_cache: SharedResponseCache | None,
+    cache_key: bytes | None,
+    response: grpc_pb2.MLResponse,
+) -> None:
+    if cache_key is not None:
+        response_cache.put(cache_key, response.SerializeToString())
+
+
+def stream_response(
+    request_id: str, future: futures.Future
+) -> grpc_pb2.MLStreamResponse:
+    try:
+        response = encode_response(future.result())
+    except Exception as e:
+        logger.error(f"PredictStream item {request_id} failed: {e!r}")
+        code = grpc.StatusCode.INTERNAL
+        if isinstance(e, UnknownModelError):
+            code = grpc.StatusCode.NOT_FOUND
+        return grpc_pb2.MLStreamResponse(
+            request_id=request_id,
+            code=code.value[0],
+            error=str(e),
+        )
+    return grpc_pb2.MLStreamResponse(request_id=request_id, response=response)
+
+
+def predict_items(
+    model_service: Any,
+    model_inputs: list,
+    request_context: RequestContext = NO_CONTEXT,
+) -> list:
+    """
+    Predict every input of a PredictBatch call; returns one (output, error) per input.
+
+    A ModelService with `predict_batch` gets all inputs in one call. If it has
+    none, or that call fails, each input is predicted on its own so a bad
+    input only fails its own result. Inputs are no longer predicted once the
+    client stopped waiting.
+    """
+    predict_batch = getattr(model_service, "predict_batch", None)
+    if callable(predict_batch):
+        try:
+            return batch_outputs(
+                call_model(predict_batch, model_inputs, request_context),
+                len(model_inputs),
+            )
+        except RequestAbandoned:
+            raise
+        except Exception as e:
+            log_batch_fallback(len(model_inputs), e)
+    results = []
+    for model_input in model_inputs:
+        request_context.check()
+        try:
+            results.append(
+                (call_model(model_service.predict, model_input, request_context), None)
+            )
+        except RequestAbandoned:
+            raise
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+def arrow_model_call(model_service: Any, table: Any) -> tuple:
+    """
+    The model method PredictArrow calls and its input. Models may take the
+    Arrow table directly; otherwise `predict` gets a pandas DataFrame of the
+    rows, which raises ImportError when pandas is not installed.
+    """
+    predict_arrow = getattr(model_service, "predict_arrow", None)
+    if callable(predict_arrow):
+        return predict_arrow, table
+    return model_service.predict, table.to_pandas()
+
+
+def batch_outputs(model_outputs: Any, count: int) -> list:
+    model_outputs = list(model_outputs)
+    if len(model_outputs) != count:
+        raise ValueError(
+            f"predict_batch returned {len(model_outputs)} outputs for {count} inputs."
+        )
+    return [(model_out, None) for model_out in model_outputs]
+
+
+def log_batch_fallback(count: int, error: Exception) -> None:
+    logger.warning(
+        f"predict_batch failed, predicting {count} inputs one by one: {error!r}"
+    )
+
+
+def batch_response(results: list) -> grpc_pb2.MLBatchResponse:
+    response = grpc_pb2.MLBatchResponse()
+    for index, (model_out, error) in enumerate(results):
+        result = response.results.add()
+        if error is None:
+            try:
+                result.response.CopyFrom(encode_response(model_out))
+                continue
+            except Exception as e:
+                error = e
+        logger.error(f"PredictBatch item {index} failed: {error!r}")
+        result.Clear()
+        result.code = grpc.StatusCode.INTERNAL.value[0]
+        result.error = str(error)
+    return response
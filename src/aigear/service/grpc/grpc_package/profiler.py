@@ -0,0 +1,318 @@
+"""
+On-demand stack-sampling profiler for running model servers.
+
+Nothing runs until a profile is requested, so a server with profiling on
+has no overhead between profiles. A profile is requested with:
+
+- `kill -USR2 <pid>`: sent to the supervisor of a multi-process server, it
+  is forwarded to every worker, so each one writes its own profile;
+- the `Admin/Profile` RPC, for this worker or (with `all_workers`) for all.
+
+While a profile runs, a daemon thread samples the Python stack of every
+other thread every `interval_ms` for `seconds`. Samples are written as
+collapsed stacks (for `flamegraph.pl`, speedscope or most flame graph
+viewers) or as a speedscope JSON file, to a local directory or a
+`gs://bucket/prefix`. Every stack starts with the worker process and the
+thread (pool) it was sampled in, so the profiles of all workers can be
+concatenated into one flame graph of the whole deployment. Time spent in
+native code (e.g. inside a model's C++ kernels) is counted against the
+Python frame that called it.
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import grpc
+
+from aigear.common.logger import Logging
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+logger = Logging(log_name=__name__).console_logging()
+
+# None on platforms without SIGUSR2 (Windows): only the RPC trigger works there
+PROFILE_SIGNAL = getattr(signal, "SIGUSR2", None)
+DEFAULT_PROFILE_SECONDS = 30
+DEFAULT_INTERVAL_MS = 10
+DEFAULT_OUTPUT = "/tmp/aigear-profiles"
+FORMATS = ("collapsed", "speedscope")
+# Threads of one pool ("ThreadPoolExecutor-0_3", "aigear-grpc_1") share a name
+_POOL_THREAD_SUFFIX = re.compile(r"_\d+$")
+
+
+def process_name() -> str:
+    """`aigear-worker-<slot>` in a supervised worker, `aigear-server` otherwise."""
+    name = multiprocessing.current_process().name
+    return "aigear-server" if name == "MainProcess" else name
+
+
+def process_label() -> str:
+    """Name of this process in profiles, e.g. `aigear-worker-1 (pid 42)`."""
+    return f"{process_name()} (pid {os.getpid()})"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    module = frame.f_globals.get("__name__", code.co_filename)
+    # Separators of the collapsed format must not appear inside a frame
+    return f"{name} ({module}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """Collects how often each Python stack is seen across all threads."""
+
+    def __init__(self, interval_ms: float = DEFAULT_INTERVAL_MS, process: str = ""):
+        self.interval = max(0.001, float(interval_ms) / 1000)
+        self.process = process or process_label()
+        self.stacks = Counter()
+        self.samples = 0
+
+    def sample(self) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            thread = _POOL_THREAD_SUFFIX.sub("", names.get(ident, f"thread-{ident}"))
+            stack.extend((thread, self.process))
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def run(self, seconds: float) -> "SamplingProfiler":
+        """Sample every `interval` for `seconds`; blocks the calling thread."""
+        deadline = time.monotonic() + float(seconds)
+        next_sample = time.monotonic()
+        while next_sample < deadline:
+            self.sample()
+            next_sample += self.interval
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return self
+
+    def collapsed(self) -> str:
+        """One `frame;frame;...;frame count` line per distinct stack."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.items()
+        )
+
+    def speedscope(self) -> dict:
+        """A speedscope file with one sampled profile per thread (weights in ms)."""
+        frames, index = [], {}
+        profiles = {}
+        for stack, count in self.stacks.items():
+            thread = stack[1]
+            sample = []
+            for name in stack[2:]:
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({"name": name})
+                sample.append(index[name])
+            profile = profiles.setdefault(thread, {"samples": [], "weights": []})
+            profile["samples"].append(sample)
+            profile["weights"].append(count * self.interval * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.process,
+            "exporter": "aigear",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"{self.process} {thread}",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(profile["weights"]),
+                    **profile,
+                }
+                for thread, profile in profiles.items()
+            ],
+        }
+
+
+def write_profile(
+    text: str, output: str, file_name: str, storage_client: Any = None
+) -> str:
+    """Write a profile to a local directory or a `gs://bucket/prefix`; returns its location."""
+    if output.startswith("gs://"):
+        bucket_name, _, prefix = output[len("gs://") :].partition("/")
+        blob_name = f"{prefix.rstrip('/')}/{file_name}" if prefix else file_name
+        if storage_client is None:
+            from google.cloud import storage
+
+            storage_client = storage.Client()
+        storage_client.bucket(bucket_name).blob(blob_name).upload_from_string(text)
+        return f"gs://{bucket_name}/{blob_name}"
+    path = Path(output) / file_name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+class ProfilerControl:
+    """
+    Starts profiles of this worker on request, one at a time.
+
+    `supervisor_pid` is the process to signal for an `all_workers` request;
+    without one (a single-process server) this process is the only worker.
+    """
+
+    def __init__(
+        self,
+        seconds: float = DEFAULT_PROFILE_SECONDS,
+        interval_ms: float = DEFAULT_INTERVAL_MS,
+        output: str = DEFAULT_OUTPUT,
+        output_format: str = "collapsed",
+        supervisor_pid: int | None = None,
+    ):
+        if output_format not in FORMATS:
+            raise ValueError(
+                f"Unknown profile format {output_format!r}, expected one of {FORMATS}."
+            )
+        self.seconds = float(seconds)
+        self.interval_ms = float(interval_ms)
+        self.output = str(output)
+        self.output_format = output_format
+        self.supervisor_pid = supervisor_pid
+        self.last_output = None
+        self._running = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls, profiling_config: dict | None, supervised: bool = False
+    ) -> "ProfilerControl | None":
+        """Build the control for `model_service.grpc.profiling` if it is enabled."""
+        profiling_config = profiling_config or {}
+        if not profiling_config.get("on", False):
+            return None
+        return cls(
+            seconds=profiling_config.get("seconds", DEFAULT_PROFILE_SECONDS),
+            interval_ms=profiling_config.get("interval_ms", DEFAULT_INTERVAL_MS),
+            output=profiling_config.get("output", DEFAULT_OUTPUT),
+            output_format=profiling_config.get("format", "collapsed"),
+            supervisor_pid=os.getppid() if supervised else None,
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._running.locked()
+
+    def file_name(self) -> str:
+        suffix = "collapsed" if self.output_format == "collapsed" else "speedscope.json"
+        return (
+            f"{process_name()}-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}.{suffix}"
+        )
+
+    def start(self, seconds: float | None = None) -> str | None:
+        """
+        Profile this worker in the background for `seconds` (default: the
+        configured duration). Returns where the profile will be written, or
+        None if a profile is already running.
+        """
+        if not self._running.acquire(blocking=False):
+            logger.warning("A profile is already running; request ignored.")
+            return None
+        seconds = float(seconds) if seconds and seconds > 0 else self.seconds
+        file_name = self.file_name()
+        location = f"{self.output.rstrip('/')}/{file_name}"
+        logger.info(f"Profiling worker {os.getpid()} for {seconds:g}s -> {location}")
+        threading.Thread(
+            target=self._profile,
+            args=(seconds, file_name),
+            name="aigear-profiler",
+            daemon=True,
+        ).start()
+        return location
+
+    def start_all(self) -> None:
+        """Profile every worker of the server, for the configured duration."""
+        if self.supervisor_pid is None or PROFILE_SIGNAL is None:
+            self.start()
+            return
+        os.kill(self.supervisor_pid, PROFILE_SIGNAL)
+
+    def install_signal_handler(self) -> None:
+        """Start a profile on `PROFILE_SIGNAL`; only possible on the main thread."""
+        if PROFILE_SIGNAL is None:
+            return
+        if threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(PROFILE_SIGNAL, lambda signum, frame: self.start())
+
+    def servicer(self) -> "ProfilerServicer":
+        return ProfilerServicer(self)
+
+    def aio_servicer(self) -> "AsyncProfilerServicer":
+        return AsyncProfilerServicer(self)
+
+    def _profile(self, seconds: float, file_name: str) -> None:
+        try:
+            profiler = SamplingProfiler(self.interval_ms).run(seconds)
+            if self.output_format == "speedscope":
+                text = json.dumps(profiler.speedscope())
+            else:
+                text = profiler.collapsed()
+            self.last_output = write_profile(text, self.output, file_name)
+            logger.info(
+                f"Profile of worker {os.getpid()} written to {self.last_output} "
+                f"({profiler.samples} samples)."
+            )
+        except Exception as e:
+            logger.error(f"Profiling worker {os.getpid()} failed: {e}")
+        finally:
+            self._running.release()
+
+    def _handle(self, request: grpc_pb2.ProfileRequest) -> tuple:
+        """(response, None) or (None, (status code, details))."""
+        if request.all_workers:
+            self.start_all()
+            return (
+                grpc_pb2.ProfileResponse(
+                    output=self.output, pid=os.getpid(), all_workers=True
+                ),
+                None,
+            )
+        location = self.start(request.seconds)
+        if location is None:
+            return None, (
+                grpc.StatusCode.FAILED_PRECONDITION,
+                "A profile is already running.",
+            )
+        return grpc_pb2.ProfileResponse(output=location, pid=os.getpid()), None
+
+
+class ProfilerServicer(grpc_pb2_grpc.AdminServicer):
+    def __init__(self, control: ProfilerControl):
+        self.control = control
+
+    def Profile(self, request, context):
+        response, error = self.control._handle(request)
+        if error is not None:
+            context.abort(*error)
+        return response
+
+
+class AsyncProfilerServicer(grpc_pb2_grpc.AdminServicer):
+    def __init__(self, control: ProfilerControl):
+        self.control = control
+
+    async def Profile(self, request, context):
+        response, error = self.control._handle(request)
+        if error is not None:
+            await context.abort(*error)
+        return response
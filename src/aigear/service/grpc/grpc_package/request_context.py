@@ -0,0 +1,201 @@
+"""
+Cancellation and deadlines of the RPC a model call serves.
+
+gRPC stops waiting for an answer once the client cancels or its deadline
+passes, but the server would still compute it. Each request is given a
+`RequestContext`:
+
+- Requests already abandoned when they leave the server's thread pool or
+  the micro-batcher queue are answered without reaching the model.
+- A model method with a `context` parameter (`predict(self, data,
+  context)`, likewise `predict_batch`, `predict_tensor`, `predict_arrow`)
+  receives it. The model can read `time_remaining()` and `cancelled`,
+  register cleanup with `add_callback`, or call `check()` between steps
+  to stop early. Models without the parameter are called as before.
+
+Abandoned requests are counted by reason (`cancelled`, `deadline`) and by
+how far they got: `queued` (skipped before the model), `running` (the model
+stopped early) or `completed` (the model finished, but nobody was waiting).
+"""
+
+from __future__ import annotations
+
+import inspect
+import threading
+import time
+import weakref
+from collections import Counter
+from typing import Any, Callable
+
+import grpc
+
+CANCELLED = "cancelled"
+DEADLINE = "deadline"
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+_NO_DEADLINE = 1e9
+_STATUS_CODES = {
+    CANCELLED: grpc.StatusCode.CANCELLED,
+    DEADLINE: grpc.StatusCode.DEADLINE_EXCEEDED,
+}
+
+
+class RequestAbandoned(Exception):
+    """The client cancelled the request or its deadline passed."""
+
+    def __init__(self, reason: str, stage: str = RUNNING):
+        super().__init__(
+            "Deadline exceeded." if reason == DEADLINE else "Request cancelled."
+        )
+        self.reason = reason
+        self.stage = stage
+
+    @property
+    def code(self) -> grpc.StatusCode:
+        return _STATUS_CODES[self.reason]
+
+
+class RequestContext:
+    """
+    The RPC a model call serves; wraps a sync or `grpc.aio` servicer context.
+
+    A context without an RPC is never cancelled and has no deadline.
+    """
+
+    def __init__(self, grpc_context: Any = None):
+        self._grpc_context = grpc_context
+        self._deadline = None
+        time_remaining = _time_remaining(grpc_context)
+        if time_remaining is not None:
+            self._deadline = time.monotonic() + time_remaining
+
+    def time_remaining(self) -> float | None:
+        """Seconds until the deadline, or None if the client set none."""
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    @property
+    def cancelled(self) -> bool:
+        context = self._grpc_context
+        if context is None:
+            return False
+        # Sync contexts report cancellation as no longer active
+        is_active = getattr(context, "is_active", None)
+        if callable(is_active):
+            return is_active() is False
+        cancelled = getattr(context, "cancelled", None)
+        return callable(cancelled) and cancelled() is True
+
+    def abandoned(self) -> str | None:
+        """`deadline` or `cancelled` once the client stopped waiting, else None."""
+        if self.expired:
+            return DEADLINE
+        if self.cancelled:
+            return CANCELLED
+        return None
+
+    def check(self) -> None:
+        """Raise `RequestAbandoned` if the client stopped waiting."""
+        reason = self.abandoned()
+        if reason is not None:
+            raise RequestAbandoned(reason, RUNNING)
+
+    def add_callback(self, callback: Callable[[], None]) -> bool:
+        """
+        Call `callback()` when the RPC ends: answered, cancelled or expired.
+        Returns False if it cannot be registered (no RPC, or it already ended).
+        """
+        context = self._grpc_context
+        add_callback = getattr(context, "add_callback", None)
+        if callable(add_callback):
+            return bool(add_callback(callback))
+        add_done_callback = getattr(context, "add_done_callback", None)
+        if callable(add_done_callback):
+            add_done_callback(lambda _context: callback())
+            return True
+        return False
+
+
+def _time_remaining(context: Any) -> float | None:
+    time_remaining = getattr(context, "time_remaining", None)
+    if not callable(time_remaining):
+        return None
+    value = time_remaining()
+    # Sync servers report a call without deadline as about 292 years away
+    if not isinstance(value, (int, float)) or value > _NO_DEADLINE:
+        return None
+    return float(value)
+
+
+NO_CONTEXT = RequestContext()
+# Weak keys, so the cache does not keep the functions of replaced models alive
+_accepts_context = weakref.WeakKeyDictionary()
+
+
+def accepts_context(method: Callable) -> bool:
+    """Whether a model method declares a `context` parameter."""
+    function = getattr(method, "__func__", method)
+    try:
+        return _accepts_context[function]
+    except (KeyError, TypeError):
+        pass
+    try:
+        accepts = "context" in inspect.signature(method).parameters
+    except (TypeError, ValueError):
+        accepts = False
+    try:
+        _accepts_context[function] = accepts
+    except TypeError:
+        # Not weakly referenceable (e.g. a builtin); inspect it every call
+        pass
+    return accepts
+
+
+def call_model(method: Callable, model_input: Any, context: RequestContext) -> Any:
+    """Call a model method, with `context` if it takes one."""
+    if accepts_context(method):
+        return method(model_input, context=context)
+    return method(model_input)
+
+
+class AbandonedRequests:
+    """Counts abandoned requests by method, reason and stage."""
+
+    def __init__(self, counter: Any = None):
+        self._counter = counter
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, method: str, reason: str, stage: str) -> None:
+        with self._lock:
+            self._counts[reason, stage] += 1
+        if self._counter is not None:
+            self._counter.labels(method, reason, stage).inc()
+
+    def stats(self) -> dict:
+        """`{"cancelled": {"queued": n, ...}, "deadline": {...}}`"""
+        with self._lock:
+            return {
+                reason: {
+                    stage: self._counts[reason, stage]
+                    for stage in (QUEUED, RUNNING, COMPLETED)
+                }
+                for reason in (CANCELLED, DEADLINE)
+            }
+
+
+def run_queued(method: Callable, model_input: Any, context: RequestContext) -> Any:
+    """
+    `call_model` for a call that waited in an executor queue: it is skipped,
+    with `RequestAbandoned`, if the client stopped waiting meanwhile.
+    """
+    reason = context.abandoned()
+    if reason is not None:
+        raise RequestAbandoned(reason, QUEUED)
+    return call_model(method, model_input, context)
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+import reprlib
+from typing import Any
+
+from aigear.common.logger import Logging
+
+PAYLOAD_MODES = ("full", "truncate", "hash", "none")
+
+# Bounded repr: large lists/dicts are elided while rendering, not after
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlevel = 4
+_payload_repr.maxlist = _payload_repr.maxtuple = _payload_repr.maxdict = 32
+_payload_repr.maxstring = _payload_repr.maxother = 256
+
+
+class _NullRequestLog:
+    """Returned for requests that are not sampled; every call is a no-op."""
+
+    __slots__ = ()
+
+    def info(self, msg: str) -> None:
+        pass
+
+    def payload(self, label: str, value: Any) -> None:
+        pass
+
+
+_NULL_REQUEST_LOG = _NullRequestLog()
+
+
+class _RequestLog:
+    __slots__ = ("_owner",)
+
+    def __init__(self, owner: "RequestLogger"):
+        self._owner = owner
+
+    def info(self, msg: str) -> None:
+        self._owner.logger.log(self._owner.level, msg)
+
+    def payload(self, label: str, value: Any) -> None:
+        rendered = self._owner.render(value)
+        if rendered is not None:
+            self._owner.logger.log(self._owner.level, f"{label}: {rendered}.")
+
+
+class RequestLogger:
+    """
+    Per-request logging for the model server, configured by
+    `model_service.grpc.request_logging`.
+
+    `sample()` decides once per request whether it is logged. The level and
+    sample rate are checked before anything is formatted, so a request that is
+    not sampled costs one random draw. Sampled records go through a queue and
+    are written by a background thread.
+
+    Payload modes:
+        full      log the whole payload
+        truncate  log a bounded repr, cut to `max_payload_chars`
+        hash      log a short digest of the payload only
+        none      do not log payloads
+    """
+
+    def __init__(
+        self,
+        level: str | int = "INFO",
+        sample_rate: float = 1.0,
+        payload: str = "truncate",
+        max_payload_chars: int = 1024,
+        log_name: str = "aigear.request",
+    ):
+        if payload not in PAYLOAD_MODES:
+            raise ValueError(
+                f"request_logging.payload must be one of {PAYLOAD_MODES}, got {payload!r}."
+            )
+        self.level = _level_number(level)
+        self.logger = Logging(log_name=log_name).queue_logging()
+        # queue_logging() leaves the logger at INFO, which would drop DEBUG records
+        self.logger.setLevel(self.level)
+        self.sample_rate = float(sample_rate)
+        self.payload_mode = payload
+        self.max_payload_chars = int(max_payload_chars)
+        self.enabled = self.sample_rate > 0 and self.logger.isEnabledFor(self.level)
+
+    @classmethod
+    def from_config(cls, config: dict | None) -> "RequestLogger":
+        config = config or {}
+        return cls(
+            level=config.get("level", "INFO"),
+            sample_rate=config.get("sample_rate", 1.0),
+            payload=config.get("payload", "truncate"),
+            max_payload_chars=config.get("max_payload_chars", 1024),
+        )
+
+    def sample(self) -> _RequestLog | _NullRequestLog:
+        if not self.enabled:
+            return _NULL_REQUEST_LOG
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return _NULL_REQUEST_LOG
+        return _RequestLog(self)
+
+    def render(self, value: Any) -> str | None:
+        mode = self.payload_mode
+        if mode == "none":
+            return None
+        if mode == "full":
+            return f"{value}"
+        if mode == "hash":
+            digest = hashlib.blake2b(repr(value).encode(), digest_size=8).hexdigest()
+            return f"<hash:{digest}>"
+        rendered = _payload_repr.repr(value)
+        if len(rendered) > self.max_payload_chars:
+            rendered = rendered[: self.max_payload_chars] + "...<truncated>"
+        return rendered
+
+
+def _level_number(level: str | int) -> int:
+    if isinstance(level, int):
+        return level
+    # getLevelName maps a known name to its number and anything else to a string
+    number = logging.getLevelName(str(level).upper())
+    if not isinstance(number, int):
+        raise ValueError(f"request_logging.level {level!r} is not a logging level.")
+    return number
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import os
+import struct
+import time
+import weakref
+from multiprocessing import shared_memory
+from typing import Any
+
+# Slot header: key digest, expiry (monotonic seconds, 0 = empty), last use, value length
+_SLOT = struct.Struct("<16sddI4x")
+_LAST_USED_OFFSET = 16 + 8
+# Per lock stripe: hits, misses, evictions
+_STATS = struct.Struct("<QQQ")
+_HITS, _MISSES, _EVICTIONS = range(3)
+
+
+def request_digest(message: Any, salt: bytes = b"") -> bytes:
+    """
+    Canonical 128-bit digest of a protobuf message.
+
+    Deterministic serialization sorts map keys, so two Structs with the same
+    content produce the same digest regardless of key insertion order. A
+    `salt` (such as the model release) gives each salt its own key space.
+    """
+    payload = message.SerializeToString(deterministic=True)
+    return hashlib.blake2b(payload, digest_size=16, key=salt).digest()
+
+
+class SharedResponseCache:
+    """
+    Fixed-size response cache in shared memory, shared by all forked workers.
+
+    Entries live in a set-associative table: a digest maps to one set of
+    `ways` slots, and when the set is full its least recently used slot is
+    evicted. Every entry carries its own expiry. Each set is guarded by one of
+    `lock_stripes` process-shared locks, and hit/miss/eviction counters are
+    kept per stripe in the same shared block.
+
+    Create the cache in the parent before forking; workers inherit the mapping.
+    The instance can also be pickled, in which case it re-attaches by name.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_entry_bytes: int = 4096,
+        ttl_seconds: float = 60.0,
+        ways: int = 8,
+        lock_stripes: int = 64,
+    ):
+        self.ways = max(1, int(ways))
+        self.n_sets = max(1, -(-int(max_entries) // self.ways))
+        self.max_entry_bytes = int(max_entry_bytes)
+        self.ttl_seconds = float(ttl_seconds)
+        self.slot_size = _SLOT.size + self.max_entry_bytes
+        self.n_stripes = max(1, min(int(lock_stripes), self.n_sets))
+        self._slots_offset = self.n_stripes * _STATS.size
+        size = self._slots_offset + self.n_sets * self.ways * self.slot_size
+        # New shared memory is zero-filled, which marks every slot as empty
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._locks = [multiprocessing.Lock() for _ in range(self.n_stripes)]
+        # Forked workers inherit the finalizer too, but only this process unlinks
+        self._finalizer = weakref.finalize(self, _release_block, self._shm, os.getpid())
+
+    @property
+    def capacity(self) -> int:
+        return self.n_sets * self.ways
+
+    def get(self, digest: bytes) -> bytes | None:
+        set_index, stripe = self._locate(digest)
+        buf = self._shm.buf
+        now = time.monotonic()
+        with self._locks[stripe]:
+            for offset in self._slot_offsets(set_index):
+                slot_digest, expires_at, _, length = _SLOT.unpack_from(buf, offset)
+                if expires_at == 0.0 or slot_digest != digest:
+                    continue
+                if expires_at <= now:
+                    _SLOT.pack_into(buf, offset, b"", 0.0, 0.0, 0)
+                    break
+                struct.pack_into("<d", buf, offset + _LAST_USED_OFFSET, now)
+                start = offset + _SLOT.size
+                value = bytes(buf[start : start + length])
+                self._count(stripe, _HITS)
+                return value
+            self._count(stripe, _MISSES)
+        return None
+
+    def put(
+        self, digest: bytes, value: bytes, ttl_seconds: float | None = None
+    ) -> bool:
+        """
+        Store a value; returns False if it is too large or the TTL is not positive.
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else float(ttl_seconds)
+        if ttl <= 0 or len(value) > self.max_entry_bytes:
+            return False
+        set_index, stripe = self._locate(digest)
+        buf = self._shm.buf
+        now = time.monotonic()
+        with self._locks[stripe]:
+            target, free, lru, lru_used = None, None, None, float("inf")
+            for offset in self._slot_offsets(set_index):
+                slot_digest, expires_at, last_used, _ = _SLOT.unpack_from(buf, offset)
+                if expires_at != 0.0 and slot_digest == digest:
+                    target = offset
+                    break
+                if expires_at == 0.0 or expires_at <= now:
+                    if free is None:
+                        free = offset
+                elif last_used < lru_used:
+                    lru, lru_used = offset, last_used
+            if target is None:
+                target = free
+            if target is None:
+                target = lru
+                self._count(stripe, _EVICTIONS)
+            start = target + _SLOT.size
+            buf[start : start + len(value)] = value
+            _SLOT.pack_into(buf, target, digest, now + ttl, now, len(value))
+        return True
+
+    def stats(self) -> dict:
+        hits = misses = evictions = 0
+        for stripe in range(self.n_stripes):
+            h, m, e = _STATS.unpack_from(self._shm.buf, stripe * _STATS.size)
+            hits, misses, evictions = hits + h, misses + m, evictions + e
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "capacity": self.capacity,
+        }
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        self._finalizer()
+        self._shm = None
+
+    def _locate(self, digest: bytes) -> tuple:
+        set_index = int.from_bytes(digest[:8], "little") % self.n_sets
+        return set_index, set_index % self.n_stripes
+
+    def _slot_offsets(self, set_index: int) -> range:
+        start = self._slots_offset + set_index * self.ways * self.slot_size
+        return range(start, start + self.ways * self.slot_size, self.slot_size)
+
+    def _count(self, stripe: int, field: int) -> None:
+        # Caller holds the stripe lock
+        offset = stripe * _STATS.size + field * 8
+        (value,) = struct.unpack_from("<Q", self._shm.buf, offset)
+        struct.pack_into("<Q", self._shm.buf, offset, value + 1)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_shm"] = self._shm.name
+        del state["_finalizer"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._shm = shared_memory.SharedMemory(name=state["_shm"])
+        self._finalizer = weakref.finalize(self, _release_block, self._shm, None)
+
+
+def _release_block(shm: shared_memory.SharedMemory, owner_pid: int | None) -> None:
+    # A module-level function: a bound method would keep the cache alive
+    shm.close()
+    if os.getpid() == owner_pid:
+        shm.unlink()
+
+
+def create_response_cache(cache_config: dict) -> SharedResponseCache | None:
+    """Build the cache for `model_service.grpc.cache` if it is enabled."""
+    if not cache_config.get("on", False):
+        return None
+    return SharedResponseCache(
+        max_entries=cache_config.get("max_entries", 10000),
+        max_entry_bytes=cache_config.get("max_entry_bytes", 4096),
+        ttl_seconds=cache_config.get("ttl_seconds", 60),
+    )
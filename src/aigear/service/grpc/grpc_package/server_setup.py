@@ -0,0 +1,65 @@
+"""
+Server setup shared by the sync and `grpc.aio` servers.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from aigear.common.logger import Logging
+from aigear.service.grpc.grpc_package import worker_pool
+from aigear.service.grpc.grpc_package.model_registry import ModelRegistry
+from aigear.service.grpc.grpc_package.model_reload import ModelReloader
+
+logger = Logging(log_name=__name__).console_logging()
+
+
+def server_options(grpc_options: dict) -> list:
+    options = [
+        ("grpc.so_reuseport", 1),  # Non blocking settings
+    ]
+    # Add keepalive
+    keepalive_time = grpc_options.get("keep_alive", {}).get("time")
+    keepalive_timeout = grpc_options.get("keep_alive", {}).get("timeout")
+    if keepalive_time and keepalive_timeout:
+        options.extend(
+            [
+                ("grpc.keepalive_time_ms", keepalive_time * 1000),
+                # send keepalive ping every x second, default is 2 hours
+                ("grpc.keepalive_timeout_ms", keepalive_timeout * 1000),
+                # keepalive ping time out after x seconds, default is 20 seconds
+                (
+                    "grpc.keepalive_permit_without_calls",
+                    True,
+                ),  # allow keepalive pings when there are no gRPC calls
+            ]
+        )
+        logger.info(
+            f"gRPC has added Keepalive. interval time: {keepalive_time}s, timeout: {keepalive_timeout}s."
+        )
+    return options
+
+
+def health_names(models: ModelRegistry) -> list:
+    # The server as a whole ("") and every named model
+    return [""] + [name for name in models.names if name]
+
+
+def start_model_reloaders(models: ModelRegistry) -> None:
+    for model in models:
+        reloader = ModelReloader.from_config(
+            model.grpc_options.get("reload"),
+            type(model.model_service),
+            model.swap,
+            model.model_release,
+            model.grpc_options.get("warmup"),
+        )
+        if reloader is not None:
+            reloader.start()
+
+
+def start_memory_reporting(grpc_options: dict, metrics: Any) -> None:
+    worker_pool.start_memory_reporting(
+        grpc_options.get("multi_processing", {}).get("memory_report_seconds", 60),
+        metrics.memory,
+    )
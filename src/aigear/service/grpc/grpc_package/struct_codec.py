@@ -0,0 +1,274 @@
+"""
+Conversion between `google.protobuf.Struct` payloads and Python values.
+
+`decode_struct` walks the `Struct` / `Value` messages directly instead of
+going through `MessageToDict`'s generic JSON printer, and `encode_struct`
+writes the protobuf wire format of a `Struct` and parses it in one call
+instead of setting every `Value` from Python like `Struct.update`.
+
+Numeric lists take a fast path through numpy, when it is installed: every
+number of a `ListValue` is serialized as the same 11 bytes (a 3-byte header
+and a little-endian double), so a list of numbers is read or written as one
+structured array instead of one Python float per element. On request,
+`decode_struct` returns such lists (and lists of them, as 2-D arrays) as
+float64 arrays, and `encode_struct`
+accepts numpy arrays and scalars as model outputs without `.tolist()`.
+
+Decoding returns what `MessageToDict` returns (numbers are floats), except
+that NaN and infinity are decoded instead of rejected.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any
+
+from google.protobuf import struct_pb2
+
+# Wire format tags of the well-known types (field number << 3 | wire type)
+_STRUCT_FIELD = b"\x0a"  # Struct.fields, one map entry
+_ENTRY_KEY = b"\x0a"
+_ENTRY_VALUE = b"\x12"
+_LIST_ITEM = b"\x0a"  # ListValue.values
+_NULL = b"\x08\x00"
+_NUMBER = b"\x11"
+_STRING = b"\x1a"
+_TRUE = b"\x20\x01"
+_FALSE = b"\x20\x00"
+_STRUCT = b"\x2a"
+_LIST = b"\x32"
+# One number of a ListValue: item tag, Value length (9), number tag
+_NUMBER_ITEM = _LIST_ITEM + b"\x09" + _NUMBER
+_NUMBER_ITEM_SIZE = len(_NUMBER_ITEM) + 8
+# Shorter lists are not worth a numpy round trip
+_MIN_NUMPY_LIST = 8
+_pack_double = struct.Struct("<d").pack
+_numpy = None
+_number_dtype = None
+_number_header = None
+
+
+def decode_struct(message: struct_pb2.Struct, numpy_arrays: bool = False) -> dict:
+    """
+    Decode a `Struct` into a dict.
+
+    With `numpy_arrays`, non-empty lists of numbers become float64 numpy
+    arrays, and lists of such arrays of one length become 2-D arrays.
+    """
+    numpy_arrays = numpy_arrays and _load_numpy() is not None
+    return {
+        key: _decode_value(value, numpy_arrays) for key, value in message.fields.items()
+    }
+
+
+def encode_struct(
+    values: dict, message: struct_pb2.Struct | None = None
+) -> struct_pb2.Struct:
+    """
+    Encode a dict into a `Struct` (into `message` if given).
+
+    Accepts what `Struct.update` accepts (None, bool, int, float, str, dict,
+    list and tuple), plus numpy arrays and scalars.
+
+    Raises:
+        ValueError: for a value of any other type.
+    """
+    if message is None:
+        message = struct_pb2.Struct()
+    message.MergeFromString(_struct_bytes(values))
+    return message
+
+
+def _load_numpy() -> Any:
+    global _numpy, _number_dtype, _number_header
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            _numpy = False
+        else:
+            _number_dtype = numpy.dtype([("header", "V3"), ("value", "<f8")])
+            _number_header = numpy.frombuffer(_NUMBER_ITEM[:3], dtype="V3")[0]
+            _numpy = numpy
+    return _numpy or None
+
+
+def _decode_value(value: struct_pb2.Value, numpy_arrays: bool) -> Any:
+    kind = value.WhichOneof("kind")
+    if kind == "number_value":
+        return value.number_value
+    if kind == "string_value":
+        return value.string_value
+    if kind == "list_value":
+        return _decode_list(value.list_value, numpy_arrays)
+    if kind == "struct_value":
+        return {
+            key: _decode_value(item, numpy_arrays)
+            for key, item in value.struct_value.fields.items()
+        }
+    if kind == "bool_value":
+        return value.bool_value
+    return None
+
+
+def _decode_list(message: struct_pb2.ListValue, numpy_arrays: bool) -> Any:
+    values = message.values
+    numbers = None
+    if values and _load_numpy() is not None:
+        kind = values[0].WhichOneof("kind")
+        if kind == "number_value" and len(values) >= _MIN_NUMPY_LIST:
+            numbers = _numbers(message.SerializeToString())
+        elif kind == "list_value":
+            columns = len(values[0].list_value.values)
+            if columns and len(values) * columns >= _MIN_NUMPY_LIST:
+                numbers = _matrix(message.SerializeToString(), len(values), columns)
+    if numbers is not None:
+        return numbers.copy() if numpy_arrays else numbers.tolist()
+    items = [_decode_value(item, numpy_arrays) for item in values]
+    if numpy_arrays and items:
+        return _stack(items)
+    return items
+
+
+def _numbers(data: bytes) -> Any:
+    # The numbers of a serialized ListValue, or None if it holds anything else
+    if len(data) % _NUMBER_ITEM_SIZE:
+        return None
+    items = _numpy.frombuffer(data, dtype=_number_dtype)
+    if not (items["header"] == _number_header).all():
+        return None
+    return items["value"]
+
+
+def _matrix(data: bytes, rows: int, columns: int) -> Any:
+    # The rows x columns numbers of a serialized ListValue of number lists,
+    # or None if it holds anything else. Every row then has the same prefix.
+    row_numbers = columns * _NUMBER_ITEM_SIZE
+    row_value = _LIST + _varint(row_numbers)
+    prefix = _LIST_ITEM + _varint(len(row_value) + row_numbers) + row_value
+    if len(data) != rows * (len(prefix) + row_numbers):
+        return None
+    np = _numpy
+    row_dtype = np.dtype(
+        [("prefix", f"V{len(prefix)}"), ("items", _number_dtype, (columns,))]
+    )
+    matrix = np.frombuffer(data, dtype=row_dtype)
+    if not (matrix["prefix"] == np.frombuffer(prefix, dtype=row_dtype["prefix"])).all():
+        return None
+    items = matrix["items"]
+    if not (items["header"] == _number_header).all():
+        return None
+    return items["value"]
+
+
+def _stack(items: list) -> Any:
+    # Lists of numbers too short for the fast path, or rows of a matrix
+    np = _numpy
+    if all(type(item) is float for item in items):
+        return np.array(items)
+    shape = getattr(items[0], "shape", None)
+    if shape and all(
+        isinstance(item, np.ndarray) and item.shape == shape for item in items
+    ):
+        return np.stack(items)
+    return items
+
+
+def _varint(number: int) -> bytes:
+    if number < 0x80:
+        return _SMALL_VARINTS[number]
+    out = bytearray()
+    while number >= 0x80:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+    return bytes(out)
+
+
+_SMALL_VARINTS = [bytes((number,)) for number in range(0x80)]
+
+
+def _length_delimited(tag: bytes, data: bytes) -> bytes:
+    size = len(data)
+    return tag + (_SMALL_VARINTS[size] if size < 0x80 else _varint(size)) + data
+
+
+def _struct_bytes(values: dict) -> bytes:
+    return b"".join(
+        [
+            _length_delimited(
+                _STRUCT_FIELD,
+                _length_delimited(_ENTRY_KEY, key.encode("utf-8"))
+                + _length_delimited(_ENTRY_VALUE, _value_bytes(value)),
+            )
+            for key, value in values.items()
+        ]
+    )
+
+
+def _value_bytes(value: Any) -> bytes:
+    value_type = type(value)
+    if value_type is float or value_type is int:
+        return _NUMBER + _pack_double(value)
+    if value_type is str:
+        return _length_delimited(_STRING, value.encode("utf-8"))
+    if value is None:
+        return _NULL
+    if value is True:
+        return _TRUE
+    if value is False:
+        return _FALSE
+    if value_type is dict:
+        return _length_delimited(_STRUCT, _struct_bytes(value))
+    if value_type is list or value_type is tuple:
+        return _length_delimited(_LIST, _list_bytes(value))
+    # Subclasses and numpy values
+    if isinstance(value, bool):
+        return _TRUE if value else _FALSE
+    if isinstance(value, (int, float)):
+        return _NUMBER + _pack_double(value)
+    if isinstance(value, str):
+        return _length_delimited(_STRING, value.encode("utf-8"))
+    if isinstance(value, dict):
+        return _length_delimited(_STRUCT, _struct_bytes(value))
+    if isinstance(value, (list, tuple)):
+        return _length_delimited(_LIST, _list_bytes(value))
+    np = _load_numpy()
+    if np is not None:
+        if isinstance(value, np.ndarray) and value.ndim:
+            return _length_delimited(_LIST, _array_bytes(value))
+        if isinstance(value, (np.ndarray, np.generic)):
+            return _value_bytes(value.item())
+    raise ValueError(f"Unexpected type: {value_type.__name__}")
+
+
+def _list_bytes(values: list | tuple) -> bytes:
+    if len(values) >= _MIN_NUMPY_LIST and _load_numpy() is not None:
+        if all(type(value) is float or type(value) is int for value in values):
+            return _number_bytes(values)
+    return b"".join(
+        [_length_delimited(_LIST_ITEM, _value_bytes(value)) for value in values]
+    )
+
+
+def _array_bytes(array: Any) -> bytes:
+    if array.dtype.kind not in "iuf":
+        # Booleans, strings and objects go value by value
+        return _list_bytes(array.tolist())
+    if array.ndim == 1:
+        if len(array) < _MIN_NUMPY_LIST:
+            return _list_bytes(array.tolist())
+        return _number_bytes(array)
+    return b"".join(
+        [
+            _length_delimited(_LIST_ITEM, _length_delimited(_LIST, _array_bytes(row)))
+            for row in array
+        ]
+    )
+
+
+def _number_bytes(values: Any) -> bytes:
+    items = _numpy.empty(len(values), dtype=_number_dtype)
+    items["header"] = _number_header
+    items["value"] = values
+    return items.tobytes()
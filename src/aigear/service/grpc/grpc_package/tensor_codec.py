@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Any
+
+from aigear.service.grpc.protos import grpc_pb2
+
+
+def decode_tensor(tensor: grpc_pb2.Tensor) -> Any:
+    """
+    Decode a `Tensor` message into a numpy array without copying the payload.
+
+    The array is a read-only view over the message bytes, so models must not
+    modify it in place (use `array.copy()` if they need to).
+
+    Raises:
+        ValueError: if the dtype is unknown or the shape does not match the data.
+    """
+    import numpy as np
+
+    try:
+        dtype = np.dtype(tensor.dtype)
+    except TypeError as e:
+        raise ValueError(f"Unknown tensor dtype: {tensor.dtype!r}.") from e
+    if dtype.hasobject:
+        raise ValueError(f"Object dtype is not supported: {tensor.dtype!r}.")
+    data = tensor.data
+    if len(data) % dtype.itemsize:
+        raise ValueError(
+            f"Tensor data size {len(data)} is not a multiple of {dtype} itemsize."
+        )
+    array = np.frombuffer(data, dtype=dtype)
+    return array.reshape(tuple(tensor.shape))
+
+
+def encode_tensor(array: Any, tensor: grpc_pb2.Tensor | None = None) -> grpc_pb2.Tensor:
+    """
+    Encode an array-like value into a `Tensor` message.
+
+    The dtype string keeps the byte order (e.g. "<f4"), so the receiver can
+    decode it on any platform.
+    """
+    import numpy as np
+
+    array = np.ascontiguousarray(array)
+    if array.dtype.hasobject:
+        raise ValueError("Object arrays cannot be encoded as a tensor.")
+    if tensor is None:
+        tensor = grpc_pb2.Tensor()
+    tensor.data = array.tobytes()
+    tensor.dtype = array.dtype.str
+    tensor.shape[:] = array.shape
+    return tensor
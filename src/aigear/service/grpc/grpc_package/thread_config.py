@@ -1,5 +1,8 @@
+from __future__ import annotations
+
 import os
 from contextlib import contextmanager
+from typing import Any
 
 # ---------------------------------------------------------------------------
 # Number of threads per framework — override via INFERENCE_NUM_THREADS env var
@@ -41,8 +44,27 @@ def configure_framework_threads(n: str = _N) -> None:
     _configure_tensorflow(n_int)
 
 
+def onnxruntime_session_options(n: str | None = None) -> Any:
+    """
+    onnxruntime `SessionOptions` with the thread limits of this process.
+
+    onnxruntime sizes its thread pools per session, not from the variables
+    above, so sessions must be created with these options. Intra-op threads
+    default to the `OMP_NUM_THREADS` set by `set_ml_thread_env_vars`; graphs
+    run sequentially with one inter-op thread, as torch and TF are limited.
+    """
+    import onnxruntime as ort
+
+    n_int = int(n if n is not None else os.environ.get("OMP_NUM_THREADS", _N))
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = n_int
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return options
+
+
 @contextmanager
-def ml_thread_scope(enabled: bool = True):
+def ml_thread_scope(enabled: bool = True, n: str = _N):
     """
     Context manager that sets ML thread env vars before the block
     and applies framework-level thread limits after.
@@ -53,10 +75,10 @@ def ml_thread_scope(enabled: bool = True):
             model = load_model(...)
     """
     if enabled:
-        set_ml_thread_env_vars()
+        set_ml_thread_env_vars(n)
     yield
     if enabled:
-        configure_framework_threads()
+        configure_framework_threads(n)
 
 
 def _configure_torch(n: int) -> None:
@@ -0,0 +1,200 @@
+"""
+CPU and memory limits of the container the model server runs in.
+
+Inside a Kubernetes pod `os.cpu_count()` reports the node's cores, not the
+pod's CPU quota. These helpers read the quota and memory limit from cgroup
+v2 (`cpu.max`, `memory.max`) or cgroup v1 (`cpu.cfs_quota_us`,
+`memory.limit_in_bytes`) and size the worker processes, gRPC threads and
+framework intra-op threads for `"auto"` settings in `multi_processing`.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from pathlib import Path
+
+from aigear.common.logger import Logging
+
+logger = Logging(log_name=__name__).console_logging()
+
+AUTO = "auto"
+DEFAULT_CGROUP_ROOT = "/sys/fs/cgroup"
+# cgroup v1 reports "no limit" as a page-rounded 2**63 - 1
+_UNLIMITED_MEMORY = 1 << 60
+_MB = 1024 * 1024
+
+
+def cgroup_cpu_limit(root: str | Path = DEFAULT_CGROUP_ROOT) -> float | None:
+    """CPU quota in cores (e.g. 2.5), or None when the cgroup sets no quota."""
+    root = Path(root)
+    cpu_max = _read(root / "cpu.max")
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota == "max":
+            return None
+        return int(quota) / int(period or 100000)
+    for cpu_dir in ("cpu", "cpu,cpuacct"):
+        quota = _read(root / cpu_dir / "cpu.cfs_quota_us")
+        period = _read(root / cpu_dir / "cpu.cfs_period_us")
+        if quota is not None and period is not None:
+            return int(quota) / int(period) if int(quota) > 0 else None
+    return None
+
+
+def cgroup_memory_limit(root: str | Path = DEFAULT_CGROUP_ROOT) -> int | None:
+    """Memory limit in bytes, or None when the cgroup sets no limit."""
+    root = Path(root)
+    limit = _read(root / "memory.max")
+    if limit is None:
+        limit = _read(root / "memory" / "memory.limit_in_bytes")
+    if limit is None or limit == "max" or int(limit) >= _UNLIMITED_MEMORY:
+        return None
+    return int(limit)
+
+
+def available_cpus() -> list:
+    """IDs of the CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class Topology:
+    """
+    Processes, threads and CPU sets resolved from `multi_processing`.
+
+    For `"auto"` values:
+
+    - `process_count`: one worker per whole core of the CPU quota (or of
+      the usable CPUs without a quota), lowered so that `worker_memory_mb`
+      per worker fits in the memory limit when both are known.
+    - `intra_op_threads`: the cores each worker gets, at least 1.
+    - `thread_count`: two gRPC threads per intra-op thread, so one request
+      can be decoded or encoded while another is computing.
+
+    With `pin_cpus`, the usable CPUs are split into one disjoint set per
+    worker process.
+    """
+
+    def __init__(
+        self,
+        multi_processing: dict | None = None,
+        cpu_limit: float | None = None,
+        memory_limit: int | None = None,
+        cpu_ids: list | None = None,
+    ):
+        multi_processing = multi_processing or {}
+        self.cpu_ids = list(cpu_ids) if cpu_ids else available_cpus()
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        cores = len(self.cpu_ids)
+        if cpu_limit is not None:
+            cores = min(cores, cpu_limit)
+        self.cores = max(1, math.floor(cores))
+
+        process_count = multi_processing.get("process_count", 2)
+        if not multi_processing.get("on", False):
+            process_count = 1
+        elif process_count == AUTO:
+            process_count = self.cores
+            worker_memory_mb = multi_processing.get("worker_memory_mb")
+            if worker_memory_mb and memory_limit is not None:
+                process_count = min(
+                    process_count, memory_limit // int(worker_memory_mb * _MB)
+                )
+        self.process_count = max(1, int(process_count))
+
+        intra_op_threads = multi_processing.get(
+            "intra_op_threads", os.environ.get("INFERENCE_NUM_THREADS", "1")
+        )
+        if intra_op_threads == AUTO:
+            intra_op_threads = self.cores // self.process_count
+        self.intra_op_threads = max(1, int(intra_op_threads))
+
+        thread_count = multi_processing.get("thread_count", 5)
+        if thread_count == AUTO:
+            thread_count = 2 * self.intra_op_threads
+        self.thread_count = max(1, int(thread_count))
+
+        self.cpu_sets = None
+        if multi_processing.get("pin_cpus", False) and multi_processing.get(
+            "on", False
+        ):
+            self.cpu_sets = split_cpus(self.cpu_ids, self.process_count)
+
+    @classmethod
+    def detect(
+        cls,
+        multi_processing: dict | None,
+        cgroup_root: str | Path = DEFAULT_CGROUP_ROOT,
+    ) -> "Topology":
+        """Resolve `multi_processing` against this container's cgroup limits."""
+        return cls(
+            multi_processing,
+            cpu_limit=cgroup_cpu_limit(cgroup_root),
+            memory_limit=cgroup_memory_limit(cgroup_root),
+        )
+
+    def apply(self, multi_processing: dict | None) -> dict:
+        """A copy of `multi_processing` with every `"auto"` value resolved."""
+        return {
+            **(multi_processing or {}),
+            "process_count": self.process_count,
+            "thread_count": self.thread_count,
+            "intra_op_threads": self.intra_op_threads,
+        }
+
+    def describe(self) -> str:
+        quota = "none" if self.cpu_limit is None else f"{self.cpu_limit:g}"
+        memory = (
+            "none" if self.memory_limit is None else f"{self.memory_limit // _MB}MB"
+        )
+        text = (
+            f"CPU quota: {quota} ({len(self.cpu_ids)} usable CPUs), "
+            f"memory limit: {memory}; {self.process_count} processes x "
+            f"{self.thread_count} gRPC threads, "
+            f"{self.intra_op_threads} intra-op threads each"
+        )
+        if self.cpu_sets is not None:
+            text += f", CPU sets: {[_cpu_range(cpus) for cpus in self.cpu_sets]}"
+        return text + "."
+
+
+def split_cpus(cpu_ids: list, count: int) -> list:
+    """
+    Split CPU ids into `count` disjoint, contiguous sets.
+
+    With fewer CPUs than sets, the CPUs are shared round-robin.
+    """
+    cpu_ids = list(cpu_ids)
+    if len(cpu_ids) < count:
+        return [[cpu_ids[i % len(cpu_ids)]] for i in range(count)]
+    size, extra = divmod(len(cpu_ids), count)
+    cpu_sets, start = [], 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        cpu_sets.append(cpu_ids[start:end])
+        start = end
+    return cpu_sets
+
+
+def pin_to_cpus(cpus: list | None) -> None:
+    """Restrict the current process, and the threads it starts later, to `cpus`."""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return
+    os.sched_setaffinity(0, cpus)
+    logger.info(f"Worker {os.getpid()} pinned to CPUs {_cpu_range(cpus)}.")
+
+
+def _cpu_range(cpus: list) -> str:
+    if len(cpus) > 1 and cpus[-1] - cpus[0] == len(cpus) - 1:
+        return f"{cpus[0]}-{cpus[-1]}"
+    return ",".join(str(cpu) for cpu in cpus)
+
+
+def _read(path: Path) -> str | None:
+    try:
+        return path.read_text().strip()
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+from aigear.common.logger import Logging
+
+logger = Logging(log_name=__name__).console_logging()
+
+DEFAULT_WARMUP_ITERATIONS = 10
+
+
+def load_warmup_payloads(path: str | Path) -> list:
+    """Read sample requests from a JSON file holding one request object or a list of them."""
+    payloads = json.loads(Path(path).read_text())
+    if isinstance(payloads, dict):
+        payloads = [payloads]
+    if not isinstance(payloads, list) or not all(
+        isinstance(payload, dict) for payload in payloads
+    ):
+        raise ValueError(
+            f"Warmup payload file must hold a request object or a list of them: {path}"
+        )
+    return payloads
+
+
+def warm_up(model_service: Any, warmup_config: dict | None = None) -> float:
+    """
+    Warm a ModelService before it takes traffic; returns the time taken (seconds).
+
+    With `warmup.on`, every one of `iterations` rounds calls the model's
+    `warmup()` method, if any, and predicts each request of `payload_file`.
+    Otherwise only `warmup()` is called, once. Errors are raised to the caller.
+    """
+    warmup_config = warmup_config or {}
+    started = time.monotonic()
+    hook = getattr(model_service, "warmup", None)
+    if not warmup_config.get("on", False):
+        if callable(hook):
+            _wait(hook())
+        return time.monotonic() - started
+
+    iterations = int(warmup_config.get("iterations", DEFAULT_WARMUP_ITERATIONS))
+    payload_file = warmup_config.get("payload_file")
+    payloads = load_warmup_payloads(payload_file) if payload_file else []
+    for _ in range(iterations):
+        if callable(hook):
+            _wait(hook())
+        for payload in payloads:
+            _wait(model_service.predict(payload))
+    return time.monotonic() - started
+
+
+def warm_up_models(models: Any) -> None:
+    """
+    Warm every model of a ModelRegistry with its own `warmup` options.
+
+    A model whose warmup fails is logged and served anyway: it is as ready as
+    it would have been without warmup.
+    """
+    for model in models:
+        warmup_config = model.grpc_options.get("warmup", {})
+        try:
+            seconds = warm_up(model.model_service, warmup_config)
+        except Exception as e:
+            logger.error(f"Warmup of model {model.name or 'default'} failed: {e}")
+            continue
+        if warmup_config.get("on", False):
+            logger.info(
+                f"Warmed up model {model.name or 'default'} in {seconds:.2f}s "
+                f"({warmup_config.get('iterations', DEFAULT_WARMUP_ITERATIONS)} iterations)."
+            )
+
+
+def _wait(result: Any) -> Any:
+    # An async ModelService (mode: aio) is warmed on a thread of its own, so
+    # its coroutines get a private event loop.
+    if inspect.isawaitable(result):
+        return asyncio.run(_await(result))
+    return result
+
+
+async def _await(awaitable: Any) -> Any:
+    return await awaitable
@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import os
+import random
+import signal
+import threading
+import time
+from multiprocessing.connection import wait
+from typing import Any, Callable
+
+import grpc
+
+from aigear.common.logger import Logging
+from aigear.service.grpc.grpc_package import metrics as server_metrics
+from aigear.service.grpc.grpc_package.profiler import PROFILE_SIGNAL
+from aigear.service.grpc.grpc_package.topology import pin_to_cpus
+
+logger = Logging(log_name=__name__).console_logging()
+
+# Exit status of a worker that stopped itself to be recycled (EX_TEMPFAIL)
+RECYCLE_EXIT_CODE = 75
+_HEALTH_METHOD_PREFIX = "/grpc.health."
+
+
+def current_rss_bytes() -> int | None:
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def process_memory() -> dict | None:
+    """
+    RSS, PSS and USS of this process in bytes, from /proc/self/smaps_rollup.
+
+    PSS splits each shared page evenly between the processes mapping it and
+    USS counts only private pages, so for forked workers the sum of PSS is
+    the real footprint and USS is what one more worker would add.
+    Returns None where smaps_rollup is not available.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.endswith("kB\n"):
+                    fields[name] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def start_memory_reporting(interval_seconds: float, gauge: Any = None) -> None:
+    """Log this worker's RSS/PSS/USS every `interval_seconds` and export them to `gauge`."""
+    if not interval_seconds or interval_seconds <= 0 or process_memory() is None:
+        return
+
+    def _report():
+        while True:
+            memory = process_memory()
+            if gauge is not None:
+                for kind, value in memory.items():
+                    gauge.labels(kind).set(value)
+            logger.info(
+                f"Worker {os.getpid()} memory: "
+                + ", ".join(f"{k}={v // (1024 * 1024)}MB" for k, v in memory.items())
+                + "."
+            )
+            time.sleep(interval_seconds)
+
+    threading.Thread(target=_report, name="aigear-memory", daemon=True).start()
+
+
+class WorkerRecycler:
+    """
+    Runs inside a worker process and stops its server once the worker has
+    handled `max_requests` requests or its RSS exceeds `max_rss_mb`, so the
+    supervisor can replace it with a fresh fork.
+
+    Each worker lowers its limits by a random fraction of up to `jitter`, so
+    workers started together do not all recycle at the same moment.
+    """
+
+    def __init__(
+        self,
+        max_requests: int = 0,
+        max_rss_mb: float = 0,
+        jitter: float = 0.1,
+        check_seconds: float = 5.0,
+        grace_seconds: float = 30.0,
+    ):
+        jitter = min(max(float(jitter), 0.0), 1.0)
+        self.max_requests = int(int(max_requests) * (1 - jitter * random.random()))
+        self.max_rss_bytes = int(
+            float(max_rss_mb) * 1024 * 1024 * (1 - jitter * random.random())
+        )
+        self.check_seconds = float(check_seconds)
+        self.grace_seconds = float(grace_seconds)
+        self.triggered = False
+        self._requests = itertools.count()
+        self._handled = 0
+
+    @classmethod
+    def from_config(cls, config: dict | None) -> "WorkerRecycler | None":
+        """Build the recycler for `multi_processing.recycle`, or None if no limit is set."""
+        config = config or {}
+        recycler = cls(
+            max_requests=config.get("max_requests", 0),
+            max_rss_mb=config.get("max_rss_mb", 0),
+            jitter=config.get("jitter", 0.1),
+            check_seconds=config.get("check_seconds", 5),
+            grace_seconds=config.get("grace_seconds", 30),
+        )
+        if recycler.max_requests <= 0 and recycler.max_rss_bytes <= 0:
+            return None
+        return recycler
+
+    @property
+    def requests(self) -> int:
+        return self._handled
+
+    def count(self) -> None:
+        # next() on itertools.count is atomic under the GIL
+        self._handled = next(self._requests) + 1
+
+    def interceptor(self) -> grpc.ServerInterceptor:
+        return _CountingInterceptor(self)
+
+    def aio_interceptor(self) -> grpc.aio.ServerInterceptor:
+        return _AsyncCountingInterceptor(self)
+
+    def reason(self) -> str | None:
+        """Why this worker should be recycled now, or None."""
+        if 0 < self.max_requests <= self.requests:
+            return f"handled {self.requests} requests"
+        if self.max_rss_bytes > 0:
+            rss = current_rss_bytes()
+            if rss is not None and rss > self.max_rss_bytes:
+                return f"RSS {rss // (1024 * 1024)}MB over limit"
+        return None
+
+    def watch(self, stop_server: Callable[[], Any]) -> threading.Thread:
+        """Poll the limits in a daemon thread and call `stop_server` once one is hit."""
+
+        def _watch():
+            while True:
+                time.sleep(self.check_seconds)
+                reason = self.reason()
+                if reason is not None:
+                    break
+            logger.info(f"Recycling worker {os.getpid()}: {reason}.")
+            self.triggered = True
+            stop_server()
+
+        thread = threading.Thread(target=_watch, name="aigear-recycler", daemon=True)
+        thread.start()
+        return thread
+
+
+def _counts(handler_call_details) -> bool:
+    return not handler_call_details.method.startswith(_HEALTH_METHOD_PREFIX)
+
+
+class _CountingInterceptor(grpc.ServerInterceptor):
+    def __init__(self, recycler: WorkerRecycler):
+        self._recycler = recycler
+
+    def intercept_service(self, continuation, handler_call_details):
+        if _counts(handler_call_details):
+            self._recycler.count()
+        return continuation(handler_call_details)
+
+
+class _AsyncCountingInterceptor(grpc.aio.ServerInterceptor):
+    def __init__(self, recycler: WorkerRecycler):
+        self._recycler = recycler
+
+    async def intercept_service(self, continuation, handler_call_details):
+        if _counts(handler_call_details):
+            self._recycler.count()
+        return await continuation(handler_call_details)
+
+
+class WorkerSupervisor:
+    """
+    Keeps `process_count` worker processes running.
+
+    Workers are forked from this (the pre-fork) process, so a replacement
+    shares the same frozen, copy-on-write model pages as the original. A
+    worker that exits with `RECYCLE_EXIT_CODE` is replaced at once; any other
+    exit counts as a crash. A worker that crashes within `min_uptime_seconds`
+    of starting is restarted with exponential backoff, up to
+    `max_backoff_seconds`, so a crash loop does not spin the CPU.
+    """
+
+    def __init__(
+        self,
+        target: Callable,
+        args: tuple = (),
+        process_count: int = 2,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 30.0,
+        min_uptime_seconds: float = 10.0,
+        cpu_sets: list | None = None,
+    ):
+        self.target = target
+        self.args = args
+        self.process_count = int(process_count)
+        self.backoff_seconds = float(backoff_seconds)
+        self.max_backoff_seconds = float(max_backoff_seconds)
+        self.min_uptime_seconds = float(min_uptime_seconds)
+        self.cpu_sets = cpu_sets
+        self.crashes = 0
+        self.restarts = 0
+        self.recycles = 0
+        self._workers: dict = {}
+        self._started_at: dict = {}
+        self._backoff: dict = {}
+        self._restart_at: dict = {}
+        self._stopping = threading.Event()
+
+    @classmethod
+    def from_config(
+        cls,
+        target: Callable,
+        args: tuple,
+        multi_processing: dict,
+        cpu_sets: list | None = None,
+    ) -> "WorkerSupervisor":
+        return cls(
+            target,
+            args,
+            process_count=multi_processing.get("process_count", 2),
+            backoff_seconds=multi_processing.get("restart_backoff_seconds", 1),
+            max_backoff_seconds=multi_processing.get("max_restart_backoff_seconds", 30),
+            cpu_sets=cpu_sets,
+        )
+
+    @property
+    def alive(self) -> int:
+        # Also read by the metrics thread while workers are being replaced
+        return sum(1 for worker in list(self._workers.values()) if worker.is_alive())
+
+    def stats(self) -> dict:
+        return {
+            "alive": self.alive,
+            "crashes": self.crashes,
+            "restarts": self.restarts,
+            "recycles": self.recycles,
+        }
+
+    def run(self) -> None:
+        """Start the workers and supervise them until `stop()` or SIGTERM."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+            if PROFILE_SIGNAL is not None:
+                signal.signal(
+                    PROFILE_SIGNAL, lambda signum, frame: self.signal_workers(signum)
+                )
+        for slot in range(self.process_count):
+            self._start(slot)
+        try:
+            while self._workers or (self._restart_at and not self._stopping.is_set()):
+                self._supervise_once()
+        except KeyboardInterrupt:
+            self.stop()
+            for worker in self._workers.values():
+                worker.join()
+        logger.info(f"Worker supervisor stopped. {self.stats()}")
+
+    def stop(self) -> None:
+        """Stop restarting workers and ask the running ones to shut down."""
+        self._stopping.set()
+        self._restart_at.clear()
+        for worker in list(self._workers.values()):
+            if worker.is_alive():
+                worker.terminate()
+
+    def signal_workers(self, signum: int) -> None:
+        """Send `signum` to every running worker, e.g. to profile them all."""
+        for worker in list(self._workers.values()):
+            if worker.is_alive():
+                os.kill(worker.pid, signum)
+
+    def _supervise_once(self) -> None:
+        timeout = 1.0
+        if self._restart_at:
+            timeout = min(
+                timeout, max(0.0, min(self._restart_at.values()) - time.monotonic())
+            )
+        sentinels = {worker.sentinel: slot for slot, worker in self._workers.items()}
+        for sentinel in wait(list(sentinels), timeout):
+            self._on_exit(sentinels[sentinel])
+        now = time.monotonic()
+        for slot, restart_at in list(self._restart_at.items()):
+            if restart_at <= now and not self._stopping.is_set():
+                del self._restart_at[slot]
+                self.restarts += 1
+                self._start(slot)
+
+    def _start(self, slot: int) -> None:
+        # A replacement runs on the same CPU set as the worker it replaces
+        cpus = self.cpu_sets[slot] if self.cpu_sets else None
+        worker = multiprocessing.Process(
+            target=_worker_main,
+            args=(self.target, self.args, cpus),
+            name=f"aigear-worker-{slot}",
+        )
+        worker.start()
+        self._workers[slot] = worker
+        self._started_at[slot] = time.monotonic()
+
+    def _on_exit(self, slot: int) -> None:
+        worker = self._workers.pop(slot)
+        worker.join()
+        server_metrics.mark_worker_dead(worker.pid)
+        if self._stopping.is_set():
+            return
+        uptime = time.monotonic() - self._started_at[slot]
+        if worker.exitcode == RECYCLE_EXIT_CODE:
+            self.recycles += 1
+            self._backoff.pop(slot, None)
+            delay = 0.0
+            logger.info(f"Worker {worker.pid} recycled after {uptime:.0f}s.")
+        else:
+            self.crashes += 1
+            if uptime < self.min_uptime_seconds:
+                delay = min(
+                    self._backoff.get(slot, self.backoff_seconds / 2) * 2,
+                    self.max_backoff_seconds,
+                )
+                self._backoff[slot] = delay
+            else:
+                self._backoff.pop(slot, None)
+                delay = 0.0
+            logger.error(
+                f"Worker {worker.pid} exited with code {worker.exitcode} after "
+                f"{uptime:.0f}s; restarting in {delay:.1f}s. {self.stats()}"
+            )
+        self._restart_at[slot] = time.monotonic() + delay
+
+
+def _worker_main(target: Callable, args: tuple, cpus: list | None = None) -> None:
+    # Forked workers must not inherit the supervisor's signal handlers. A
+    # worker ignores the profile signal until it installs its own handler.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if PROFILE_SIGNAL is not None:
+        signal.signal(PROFILE_SIGNAL, signal.SIG_IGN)
+    pin_to_cpus(cpus)
+    target(*args)
@@ -1,108 +1,570 @@
-import multiprocessing
+from __future__ import annotations
+
 import platform
+import queue
 import sys
+import threading
+import time
 from concurrent import futures
-from typing import Any
+from contextlib import contextmanager
+from typing import Any, Iterator
 import gc
 import grpc
-from google.protobuf import struct_pb2
-from google.protobuf.json_format import MessageToDict
-from grpc_health.v1 import health, health_pb2_grpc
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
 from sentry_sdk import init as sentry_init
 from sentry_sdk.integrations.grpc.server import ServerInterceptor
 
 from aigear.common.config import PipelinesConfig, get_environment
 from aigear.service.grpc.constant import DEFAULT_GRPC_HOST, DEFAULT_GRPC_PORT
-from aigear.common.loading_module import LoadModule
 from aigear.common.logger import Logging
-from aigear.service.grpc.grpc_package import grpc_features, thread_config
+from aigear.service.grpc.grpc_package import (
+    arrow_codec,
+    grpc_features,
+    tensor_codec,
+    thread_config,
+)
+from aigear.service.grpc.grpc_package import metrics as server_metrics
+from aigear.service.grpc.grpc_package.admission import AdmissionControl
+from aigear.service.grpc.grpc_package.coalescing import SingleFlight
+from aigear.service.grpc.grpc_package.metrics import (
+    NULL_METRICS,
+    MeteredThreadPoolExecutor,
+    ServerMetrics,
+)
+from aigear.service.grpc.grpc_package.model_registry import (
+    ModelRegistry,
+    ServedModel,
+    UnknownModelError,
+    load_served_model,
+)
+from aigear.service.grpc.grpc_package.prediction import (
+    StreamEnd,
+    arrow_model_call,
+    batch_response,
+    cache_lookup,
+    cache_store,
+    decode_request,
+    encode_response,
+    item_model,
+    predict_items,
+    stream_response,
+    unknown_model,
+)
+from aigear.service.grpc.grpc_package.profiler import ProfilerControl
+from aigear.service.grpc.grpc_package.request_context import (
+    COMPLETED,
+    NO_CONTEXT,
+    QUEUED,
+    AbandonedRequests,
+    RequestAbandoned,
+    RequestContext,
+    call_model,
+)
+from aigear.service.grpc.grpc_package.request_logging import RequestLogger
+from aigear.service.grpc.grpc_package.server_setup import (
+    health_names,
+    server_options,
+    start_memory_reporting,
+    start_model_reloaders,
+)
+from aigear.service.grpc.grpc_package.topology import Topology
+from aigear.service.grpc.grpc_package.warmup import warm_up_models
+from aigear.service.grpc.grpc_package.response_cache import (
+    SharedResponseCache,
+    create_response_cache,
+    request_digest,
+)
+from aigear.service.grpc.grpc_package.worker_pool import (
+    RECYCLE_EXIT_CODE,
+    WorkerRecycler,
+    WorkerSupervisor,
+)
 from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
 
 logger = Logging(log_name=__name__).console_logging()
 
 
 class MLServicer(grpc_pb2_grpc.MLServicer):
-    def __init__(self, model_instance):
-        self.model_service = model_instance
+    def __init__(
+        self,
+        model_instance,
+        grpc_options: dict | None = None,
+        response_cache: SharedResponseCache | None = None,
+        metrics: ServerMetrics | None = None,
+        model_release: str | None = None,
+    ):
+        grpc_options = grpc_options or {}
+        # A ModelRegistry hosts several pipeline versions; a bare ModelService is the only model
+        if isinstance(model_instance, ModelRegistry):
+            self.models = model_instance
+        else:
+            self.models = ModelRegistry.single(
+                model_instance, grpc_options, model_release
+            )
+        self.response_cache = response_cache
+        self.metrics = metrics or NULL_METRICS
+        self.request_logger = RequestLogger.from_config(
+            grpc_options.get("request_logging")
+        )
+        # Items of a PredictStream call run on their own pool so a single
+        # stream can pipeline many predictions while holding one server thread.
+        thread_count = grpc_options.get("multi_processing", {}).get("thread_count", 5)
+        self.stream_executor = futures.ThreadPoolExecutor(
+            max_workers=thread_count, thread_name_prefix="aigear-stream"
+        )
+        self.stream_max_in_flight = grpc_options.get("streaming", {}).get(
+            "max_in_flight", 64
+        )
+        self.coalescer = SingleFlight.from_config(
+            grpc_options.get("coalescing"), self.metrics.coalesced
+        )
+        self.abandoned = AbandonedRequests(self.metrics.abandoned)
 
     def Predict(self, request, context):
-        logger.info("Predict function called:")
-        request = MessageToDict(request).get("request", {})
-        logger.info(f"Model input: {request}.")
-        model_out = self.model_service.predict(request)
-        logger.info(f"Model output: {model_out}.")
-        response_data = struct_pb2.Struct()
-        response_data.update({"response": model_out})
-        return grpc_pb2.MLResponse(response=response_data)
-
-
-def _run_server(bind_address: str, model_instance: Any, grpc_options: dict) -> None:
-    """Start a server in a subprocess."""
-    logger.info("Starting new server.")
+        model = self._resolve(context, request.model)
+        with self.metrics.track("Predict", context, model.name):
+            with self._request_context("Predict", context) as request_context:
+                if self.coalescer is None:
+                    return self._handle_predict(model, request, request_context)
+                try:
+                    # A coalesced call answers every follower, so it does not
+                    # stop when the leader's client does.
+                    return self.coalescer.do(
+                        request_digest(request.request, model.cache_salt),
+                        lambda: self._handle_predict(model, request, NO_CONTEXT),
+                        model.name,
+                        request_context.time_remaining(),
+                    )
+                except futures.TimeoutError:
+                    context.abort(
+                        grpc.StatusCode.DEADLINE_EXCEEDED,
+                        "Deadline exceeded waiting for an identical request.",
+                    )
+
+    def PredictStream(self, request_iterator, context):
+        model = self._resolve(context)
+        with self.metrics.track("PredictStream", context, model.name):
+            yield from self._handle_predict_stream(model, request_iterator)
+
+    def PredictTensor(self, request, context):
+        model = self._resolve(context, request.model)
+        with self.metrics.track("PredictTensor", context, model.name):
+            with self._request_context("PredictTensor", context) as request_context:
+                return self._handle_predict_tensor(
+                    model, request, context, request_context
+                )
+
+    def PredictBatch(self, request, context):
+        model = self._resolve(context, request.model)
+        with self.metrics.track("PredictBatch", context, model.name):
+            with self._request_context("PredictBatch", context) as request_context:
+                return self._handle_predict_batch(model, request, request_context)
+
+    def PredictArrow(self, request, context):
+        model = self._resolve(context, request.model)
+        with self.metrics.track("PredictArrow", context, model.name):
+            with self._request_context("PredictArrow", context) as request_context:
+                return self._handle_predict_arrow(
+                    model, request, context, request_context
+                )
+
+    def _resolve(self, context, name: str = "") -> ServedModel:
+        model = self.models.resolve(context, name)
+        if model is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, unknown_model(self.models))
+        return model
+
+    @contextmanager
+    def _request_context(self, method: str, context) -> Iterator[RequestContext]:
+        """
+        The RequestContext of a unary call. A call the client gave up on while
+        it waited for a thread is answered without running the model.
+        """
+        request_context = RequestContext(context)
+        reason = request_context.abandoned()
+        if reason is not None:
+            self._abandon(method, context, RequestAbandoned(reason, QUEUED))
+        try:
+            yield request_context
+        except RequestAbandoned as e:
+            self._abandon(method, context, e)
+        reason = request_context.abandoned()
+        if reason is not None:
+            self.abandoned.record(method, reason, COMPLETED)
+
+    def _abandon(self, method: str, context, abandoned: RequestAbandoned) -> None:
+        self.abandoned.record(method, abandoned.reason, abandoned.stage)
+        context.abort(abandoned.code, str(abandoned))
+
+    def _handle_predict(
+        self, model: ServedModel, request, request_context: RequestContext
+    ):
+        metrics = self.metrics
+        request_log = self.request_logger.sample()
+        request_log.info("Predict function called:")
+        cache_key, cached = cache_lookup(
+            self.response_cache, request, request_log, model.cache_salt
+        )
+        if cached is not None:
+            return cached
+        with metrics.stage("Predict", "decode", model.name):
+            request = decode_request(request.request, model.numpy_inputs)
+        request_log.payload("Model input", request)
+        with metrics.stage("Predict", "predict", model.name):
+            model_out = self._predict(model, request, request_context)
+        request_log.payload("Model output", model_out)
+        with metrics.stage("Predict", "encode", model.name):
+            response = grpc_pb2.MLResponse(response=encode_response(model_out))
+        cache_store(self.response_cache, cache_key, response)
+        return response
 
-    options = [
-        ("grpc.so_reuseport", 1),  # Non blocking settings
-    ]
-    # Add keepalive
-    keepalive_time = grpc_options.get("keep_alive", {}).get("time")
-    keepalive_timeout = grpc_options.get("keep_alive", {}).get("timeout")
-    if keepalive_time and keepalive_timeout:
-        options.extend(
-            [
-                ("grpc.keepalive_time_ms", keepalive_time * 1000),
-                # send keepalive ping every x second, default is 2 hours
-                ("grpc.keepalive_timeout_ms", keepalive_timeout * 1000),
-                # keepalive ping time out after x seconds, default is 20 seconds
-                (
-                    "grpc.keepalive_permit_without_calls",
-                    True,
-                ),  # allow keepalive pings when there are no gRPC calls
+    def _handle_predict_stream(self, stream_model: ServedModel, request_iterator):
+        logger.info("PredictStream opened.")
+        # Futures are queued as they complete, so responses leave in completion
+        # order. The reader thread queues StreamEnd once the client half-closes.
+        completed = queue.Queue()
+        in_flight = threading.BoundedSemaphore(self.stream_max_in_flight)
+
+        def _on_done(request_id, future):
+            in_flight.release()
+            completed.put((request_id, future))
+
+        def _read_requests():
+            count = 0
+            try:
+                for request in request_iterator:
+                    in_flight.acquire()
+                    # An item that cannot be submitted is answered with its error;
+                    # its failed future gives the slot back through _on_done.
+                    try:
+                        future = self._submit_item(stream_model, request)
+                    except Exception as e:
+                        future = _failed_future(e)
+                    future.add_done_callback(
+                        lambda f, request_id=request.request_id: _on_done(request_id, f)
+                    )
+                    count += 1
+            except grpc.RpcError:
+                # Client cancelled or the stream broke; nothing left to answer.
+                pass
+            finally:
+                completed.put(StreamEnd(count))
+
+        reader = threading.Thread(
+            target=_read_requests, name="aigear-stream-reader", daemon=True
+        )
+        reader.start()
+
+        total, sent = None, 0
+        while total is None or sent < total:
+            item = completed.get()
+            if isinstance(item, StreamEnd):
+                total = item.count
+                continue
+            request_id, future = item
+            sent += 1
+            yield stream_response(request_id, future)
+        logger.info(f"PredictStream closed after {sent} predictions.")
+
+    def _handle_predict_tensor(
+        self, model: ServedModel, request, context, request_context: RequestContext
+    ):
+        metrics = self.metrics
+        self.request_logger.sample().info(
+            f"PredictTensor function called: dtype={request.tensor.dtype}, "
+            f"shape={list(request.tensor.shape)}."
+        )
+        with metrics.stage("PredictTensor", "decode", model.name):
+            try:
+                model_input = tensor_codec.decode_tensor(request.tensor)
+            except ValueError as e:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+            except ImportError:
+                context.abort(
+                    grpc.StatusCode.FAILED_PRECONDITION,
+                    "PredictTensor requires numpy on the server.",
+                )
+        with metrics.stage("PredictTensor", "predict", model.name):
+            model_out = self._predict_tensor(model, model_input, request_context)
+        with metrics.stage("PredictTensor", "encode", model.name):
+            response = grpc_pb2.TensorResponse()
+            tensor_codec.encode_tensor(model_out, response.tensor)
+        return response
+
+    def _handle_predict_batch(
+        self, model: ServedModel, request, request_context: RequestContext
+    ):
+        metrics = self.metrics
+        self.request_logger.sample().info(
+            f"PredictBatch function called: {len(request.requests)} inputs."
+        )
+        with metrics.stage("PredictBatch", "decode", model.name):
+            model_inputs = [
+                decode_request(item, model.numpy_inputs) for item in request.requests
             ]
+        with metrics.stage("PredictBatch", "predict", model.name):
+            results = predict_items(model.model_service, model_inputs, request_context)
+        with metrics.stage("PredictBatch", "encode", model.name):
+            return batch_response(results)
+
+    def _handle_predict_arrow(
+        self, model: ServedModel, request, context, request_context: RequestContext
+    ):
+        metrics = self.metrics
+        with metrics.stage("PredictArrow", "decode", model.name):
+            try:
+                table = arrow_codec.decode_table(request.data)
+                predict, model_input = arrow_model_call(model.model_service, table)
+            except ValueError as e:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+            except ImportError as e:
+                context.abort(
+                    grpc.StatusCode.FAILED_PRECONDITION,
+                    f"PredictArrow requires {e.name or 'pyarrow'} on the server.",
+                )
+        self.request_logger.sample().info(
+            f"PredictArrow function called: {table.num_rows} rows x "
+            f"{table.num_columns} columns."
+        )
+        with metrics.stage("PredictArrow", "predict", model.name):
+            model_out = call_model(predict, model_input, request_context)
+        with metrics.stage("PredictArrow", "encode", model.name):
+            return grpc_pb2.ArrowResponse(data=arrow_codec.encode_table(model_out))
+
+    def _submit_item(
+        self, stream_model: ServedModel, request: grpc_pb2.MLStreamRequest
+    ) -> futures.Future:
+        model = item_model(self.models, stream_model, request.model)
+        if model is None:
+            raise UnknownModelError(unknown_model(self.models))
+        return self._submit(model, decode_request(request.request, model.numpy_inputs))
+
+    def _submit(self, model: ServedModel, model_input: Any) -> futures.Future:
+        if model.batcher is not None:
+            return model.batcher.submit(model_input)
+        return self.stream_executor.submit(model.model_service.predict, model_input)
+
+    def _predict(
+        self, model: ServedModel, model_input: Any, request_context: RequestContext
+    ) -> Any:
+        if model.batcher is not None:
+            return model.batcher(model_input, request_context)
+        return call_model(model.model_service.predict, model_input, request_context)
+
+    def _predict_tensor(
+        self, model: ServedModel, model_input: Any, request_context: RequestContext
+    ) -> Any:
+        # Models may provide an array-native entry point; otherwise the array
+        # is passed to the regular `predict`.
+        model_service = model.model_service
+        predict_tensor = getattr(model_service, "predict_tensor", None)
+        if not callable(predict_tensor):
+            predict_tensor = model_service.predict
+        return call_model(predict_tensor, model_input, request_context)
+
+
+def _failed_future(error: Exception) -> futures.Future:
+    future = futures.Future()
+    future.set_exception(error)
+    return future
+
+
+def _run_server(
+    bind_address: str,
+    model_instance: Any,
+    grpc_options: dict,
+    response_cache: SharedResponseCache | None = None,
+    supervised: bool = False,
+) -> None:
+    """
+    Start a server in a subprocess.
+
+    `model_instance` is a ModelService or a ModelRegistry of several.
+
+    A supervised worker may recycle itself: it then stops serving and exits
+    with `RECYCLE_EXIT_CODE` so the supervisor starts a replacement.
+    """
+    recycler = None
+    if supervised:
+        recycler = WorkerRecycler.from_config(
+            grpc_options.get("multi_processing", {}).get("recycle")
         )
-        logger.info(
-            f"gRPC has added Keepalive. interval time: {keepalive_time}s, timeout: {keepalive_timeout}s."
+    profiler = ProfilerControl.from_config(grpc_options.get("profiling"), supervised)
+    if grpc_options.get("mode", "sync") == "aio":
+        from aigear.service.grpc.grpc_aio_service import run_aio_server
+
+        run_aio_server(
+            bind_address,
+            model_instance,
+            grpc_options,
+            response_cache,
+            recycler,
+            profiler,
         )
+    else:
+        _run_sync_server(
+            bind_address,
+            model_instance,
+            grpc_options,
+            response_cache,
+            recycler,
+            profiler,
+        )
+    if recycler is not None and recycler.triggered:
+        sys.exit(RECYCLE_EXIT_CODE)
+
 
+def _run_sync_server(
+    bind_address: str,
+    model_instance: Any,
+    grpc_options: dict,
+    response_cache: SharedResponseCache | None,
+    recycler: WorkerRecycler | None,
+    profiler: ProfilerControl | None = None,
+) -> None:
+    logger.info("Starting new server.")
+    options = server_options(grpc_options)
+    metrics = server_metrics.create_server_metrics(grpc_options.get("metrics"))
     max_workers = grpc_options.get("multi_processing", {}).get("thread_count", 5)
     logger.info(f"Enable thread count: {max_workers}.")
+    admission = AdmissionControl.from_config(
+        grpc_options.get("admission"), max_workers, metrics.rejections
+    )
     server = grpc.server(
-        thread_pool=futures.ThreadPoolExecutor(max_workers=max_workers),
-        interceptors=[ServerInterceptor()],
+        thread_pool=MeteredThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="aigear-grpc",
+            queue_depth=metrics.queue_depth,
+            on_submit=admission.track if admission is not None else None,
+        ),
+        interceptors=_interceptors(recycler, admission),
         options=options,
     )
-    grpc_pb2_grpc.add_MLServicer_to_server(MLServicer(model_instance), server)
+    servicer = MLServicer(model_instance, grpc_options, response_cache, metrics)
+    grpc_pb2_grpc.add_MLServicer_to_server(servicer, server)
 
-    # health check service - add this service to server
+    # health check service - add this service to server; each model is also a health service name.
+    # It reports NOT_SERVING until the models are warmed up.
     health_servicer = health.HealthServicer()
     health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    for name in health_names(servicer.models):
+        health_servicer.set(name, health_pb2.HealthCheckResponse.NOT_SERVING)
+    if profiler is not None:
+        grpc_pb2_grpc.add_AdminServicer_to_server(profiler.servicer(), server)
+        profiler.install_signal_handler()
 
+    # Warm before binding: with SO_REUSEPORT the kernel hands connections to a
+    # worker as soon as it listens.
+    warm_up_models(servicer.models)
+    for name in health_names(servicer.models):
+        health_servicer.set(name, health_pb2.HealthCheckResponse.SERVING)
     server.add_insecure_port(bind_address)
     server.start()
+    start_model_reloaders(servicer.models)
+    start_memory_reporting(grpc_options, metrics)
+    if recycler is not None:
+        recycler.watch(lambda: server.stop(grace=recycler.grace_seconds))
     grpc_features.wait_until_closed(server)
 
 
-def grpc_service(pipeline_version: str, model_class_path: str) -> None:
-    # Get environment variables
-    pipeline_version_config = PipelinesConfig.get_version_config(pipeline_version)
-    if pipeline_version_config is None:
-        logger.error(
-            f"No pipeline_version({pipeline_version}) config found in `env.json`."
+def _interceptors(
+    recycler: WorkerRecycler | None, admission: AdmissionControl | None = None
+) -> list:
+    interceptors = [ServerInterceptor()]
+    # Admission runs first so shed requests cost as little as possible
+    if admission is not None:
+        interceptors.insert(0, admission.interceptor())
+    if recycler is not None:
+        interceptors.append(recycler.interceptor())
+    return interceptors
+
+
+def _start_cache_stats_logging(
+    response_cache: SharedResponseCache, interval_seconds: float
+) -> None:
+    logger.info(
+        f"Enable shared response cache. capacity: {response_cache.capacity}, "
+        f"ttl: {response_cache.ttl_seconds}s."
+    )
+
+    def _log_stats():
+        while True:
+            time.sleep(interval_seconds)
+            logger.info(f"Response cache stats: {response_cache.stats()}.")
+
+    if interval_seconds and interval_seconds > 0:
+        threading.Thread(
+            target=_log_stats, name="aigear-cache-stats", daemon=True
+        ).start()
+
+
+def _start_metrics_server(
+    metrics_config: dict,
+    response_cache: SharedResponseCache | None,
+    worker_pool: WorkerSupervisor | None = None,
+) -> None:
+    if metrics_config.get("on", False):
+        server_metrics.start_metrics_server(
+            metrics_config.get("port", server_metrics.DEFAULT_METRICS_PORT),
+            response_cache,
+            worker_pool,
         )
-        return
 
-    ms_config = pipeline_version_config.get("model_service", {})
-    grpc_config = ms_config.get("grpc", {})
-    multi_processing = grpc_config.get("multi_processing", {})
-    disable_omp = multi_processing.get("disable_omp", True)
-    # load ml module
-    logger.info(f"gRPC load module: {model_class_path}...")
-    with thread_config.ml_thread_scope(disable_omp):
-        model_class = LoadModule(model_class_path).load_module()
-        if model_class is None:
-            logger.error("model module instance fail!!!!!!")
+
+def grpc_service(pipeline_version: str, model_class_path: str | None = None) -> None:
+    """
+    Serve the model of `pipeline_version`, or of several comma-separated
+    versions from one server. Server-wide settings come from the first
+    version's `model_service.grpc`; `batching` and `reload` are per model.
+    """
+    pipeline_versions = [v.strip() for v in pipeline_version.split(",")]
+    # Get environment variables
+    ms_configs = {}
+    for version in pipeline_versions:
+        pipeline_version_config = PipelinesConfig.get_version_config(version)
+        if pipeline_version_config is None:
+            logger.error(f"No pipeline_version({version}) config found in `env.json`.")
             return
-        model_instance = model_class()
-    logger.info("gRPC load module successfully.")
+        ms_configs[version] = pipeline_version_config.get("model_service", {})
+
+    grpc_config = ms_configs[pipeline_versions[0]].get("grpc", {})
+    # Resolve "auto" process / thread counts against the container's cgroup limits
+    multi_processing = grpc_config.get("multi_processing", {})
+    topology = Topology.detect(multi_processing)
+    logger.info(f"Server topology: {topology.describe()}")
+    # Framework threads are capped with disable_omp or an explicit intra_op_threads
+    limit_ml_threads = (
+        multi_processing.get("disable_omp", True)
+        or "intra_op_threads" in multi_processing
+    )
+    multi_processing = topology.apply(multi_processing)
+    grpc_config = {**grpc_config, "multi_processing": multi_processing}
+
+    # Metrics endpoint - served by this process, aggregating every worker. The
+    # directory is set before the models load, so metrics they create are
+    # multiprocess metrics too.
+    metrics_config = grpc_config.get("metrics", {})
+    if metrics_config.get("on", False):
+        server_metrics.prepare_metrics_dir(
+            metrics_config.get("multiproc_dir", server_metrics.DEFAULT_METRICS_DIR)
+        )
+
+    # load ml modules
+    served_models = []
+    with thread_config.ml_thread_scope(
+        limit_ml_threads, str(topology.intra_op_threads)
+    ):
+        for version in pipeline_versions:
+            class_path = model_class_path
+            if class_path is None or len(pipeline_versions) > 1:
+                class_path = ms_configs[version].get("model_class_path")
+            served_model = load_served_model(
+                version, class_path, ms_configs[version].get("grpc", {})
+            )
+            if served_model is None:
+                return
+            served_models.append(served_model)
+    models = ModelRegistry(served_models)
 
     # Enable Sentry
     sentry_cog = grpc_config.get("sentry", {})
@@ -116,6 +578,13 @@ def grpc_service(pipeline_version: str, model_class_path: str) -> None:
             environment=environment,
         )
 
+    # Shared response cache - created before forking so every worker maps the same block
+    response_cache = create_response_cache(grpc_config.get("cache", {}))
+    if response_cache is not None:
+        _start_cache_stats_logging(
+            response_cache, grpc_config["cache"].get("stats_log_seconds", 60)
+        )
+
     # grpc
     is_windows = platform.system().lower() == "windows"
     process_switch = multi_processing.get("on", False)
@@ -123,33 +592,28 @@ def grpc_service(pipeline_version: str, model_class_path: str) -> None:
     service_host = grpc_config.get("service_host", DEFAULT_GRPC_HOST)
     if process_switch and not is_windows:
         # Move PyTorch model weights to shared memory to avoid COW on C++ refcount updates
-        inner_model = getattr(model_instance, "model", None)
-        if callable(getattr(inner_model, "share_memory", None)):
-            inner_model.share_memory()
+        for served_model in models:
+            inner_model = getattr(served_model.model_service, "model", None)
+            if callable(getattr(inner_model, "share_memory", None)):
+                inner_model.share_memory()
         # Freeze GC before fork to prevent GC scanning from dirtying shared pages (COW)
         gc.freeze()
         with grpc_features.reserve_port(port) as grpc_port:
             bind_address = f"{service_host}:{grpc_port}"
             sys.stdout.flush()
-            # multiprocessing
-            workers = []
-            process_count = multi_processing.get("process_count", 2)
-            for _ in range(process_count):
-                worker = multiprocessing.Process(
-                    target=_run_server,
-                    args=(
-                        bind_address,
-                        model_instance,
-                        grpc_config,
-                    ),
-                )
-                worker.start()
-                workers.append(worker)
-            for worker in workers:
-                worker.join()
+            # multiprocessing - the supervisor restarts workers that crash or recycle
+            supervisor = WorkerSupervisor.from_config(
+                _run_server,
+                (bind_address, models, grpc_config, response_cache, True),
+                multi_processing,
+                topology.cpu_sets,
+            )
+            _start_metrics_server(metrics_config, response_cache, supervisor)
+            supervisor.run()
     else:
         bind_address = f"{service_host}:{port}"
-        _run_server(bind_address, model_instance, grpc_config)
+        _start_metrics_server(metrics_config, response_cache)
+        _run_server(bind_address, models, grpc_config, response_cache)
 
 
 if __name__ == "__main__":
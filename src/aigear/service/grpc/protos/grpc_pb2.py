@@ -14,7 +14,7 @@ _sym_db = _symbol_database.Default()
 from google.protobuf import struct_pb2 as google_dot_protobuf_dot_struct__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10proto/grpc.proto\x1a\x1cgoogle/protobuf/struct.proto\"5\n\tMLRequest\x12(\n\x07request\x18\x01 \x01(\x0b\x32\x17.google.protobuf.Struct\"7\n\nMLResponse\x12)\n\x08response\x18\x02 \x01(\x0b\x32\x17.google.protobuf.Struct2*\n\x02ML\x12$\n\x07Predict\x12\n.MLRequest\x1a\x0b.MLResponse\"\x00\x42\tZ\x07./protob\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10proto/grpc.proto\x1a\x1cgoogle/protobuf/struct.proto\"D\n\tMLRequest\x12(\n\x07request\x18\x01 \x01(\x0b\x32\x17.google.protobuf.Struct\x12\r\n\x05model\x18\x02 \x01(\t\"7\n\nMLResponse\x12)\n\x08response\x18\x02 \x01(\x0b\x32\x17.google.protobuf.Struct\"^\n\x0fMLStreamRequest\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12(\n\x07request\x18\x02 \x01(\x0b\x32\x17.google.protobuf.Struct\x12\r\n\x05model\x18\x03 \x01(\t\"n\n\x10MLStreamResponse\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12)\n\x08response\x18\x02 \x01(\x0b\x32\x17.google.protobuf.Struct\x12\x0c\n\x04\x63ode\x18\x03 \x01(\x05\x12\r\n\x05\x65rror\x18\x04 \x01(\t\"J\n\x0eMLBatchRequest\x12)\n\x08requests\x18\x01 \x03(\x0b\x32\x17.google.protobuf.Struct\x12\r\n\x05model\x18\x02 \x01(\t\"W\n\rMLBatchResult\x12)\n\x08response\x18\x01 \x01(\x0b\x32\x17.google.protobuf.Struct\x12\x0c\n\x04\x63ode\x18\x02 \x01(\x05\x12\r\n\x05\x65rror\x18\x03 \x01(\t\"2\n\x0fMLBatchResponse\x12\x1f\n\x07results\x18\x01 \x03(\x0b\x32\x0e.MLBatchResult\"4\n\x06Tensor\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x12\r\n\x05\x64type\x18\x02 \x01(\t\x12\r\n\x05shape\x18\x03 \x03(\x03\"7\n\rTensorRequest\x12\x17\n\x06tensor\x18\x01 \x01(\x0b\x32\x07.Tensor\x12\r\n\x05model\x18\x02 \x01(\t\")\n\x0eTensorResponse\x12\x17\n\x06tensor\x18\x01 \x01(\x0b\x32\x07.Tensor\"+\n\x0c\x41rrowRequest\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x12\r\n\x05model\x18\x02 \x01(\t\"\x1d\n\rArrowResponse\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\"6\n\x0eProfileRequest\x12\x0f\n\x07seconds\x18\x01 \x01(\x01\x12\x13\n\x0b\x61ll_workers\x18\x02 \x01(\x08\"C\n\x0fProfileResponse\x12\x0e\n\x06output\x18\x01 \x01(\t\x12\x0b\n\x03pid\x18\x02 \x01(\x05\x12\x13\n\x0b\x61ll_workers\x18\x03 \x01(\x08\x32\x80\x02\n\x02ML\x12$\n\x07Predict\x12\n.MLRequest\x1a\x0b.MLResponse\"\x00\x12\x32\n\rPredictTensor\x12\x0e.TensorRequest\x1a\x0f.TensorResponse\"\x00\x12:\n\rPredictStream\x12\x10.MLStreamRequest\x1a\x11.MLStreamResponse\"\x00(\x01\x30\x01\x12\x33\n\x0cPredictBatch\x12\x0f.MLBatchRequest\x1a\x10.MLBatchResponse\"\x00\x12/\n\x0cPredictArrow\x12\r.ArrowRequest\x1a\x0e.ArrowResponse\"\x00\x32\x37\n\x05\x41\x64min\x12.\n\x07Profile\x12\x0f.ProfileRequest\x1a\x10.ProfileResponse\"\x00\x42\tZ\x07./protob\x06proto3')
 
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'proto.grpc_pb2', globals())
@@ -23,9 +23,35 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   DESCRIPTOR._options = None
   DESCRIPTOR._serialized_options = b'Z\007./proto'
   _MLREQUEST._serialized_start=50
-  _MLREQUEST._serialized_end=103
-  _MLRESPONSE._serialized_start=105
-  _MLRESPONSE._serialized_end=160
-  _ML._serialized_start=162
-  _ML._serialized_end=204
+  _MLREQUEST._serialized_end=118
+  _MLRESPONSE._serialized_start=120
+  _MLRESPONSE._serialized_end=175
+  _MLSTREAMREQUEST._serialized_start=177
+  _MLSTREAMREQUEST._serialized_end=271
+  _MLSTREAMRESPONSE._serialized_start=273
+  _MLSTREAMRESPONSE._serialized_end=383
+  _MLBATCHREQUEST._serialized_start=385
+  _MLBATCHREQUEST._serialized_end=459
+  _MLBATCHRESULT._serialized_start=461
+  _MLBATCHRESULT._serialized_end=548
+  _MLBATCHRESPONSE._serialized_start=550
+  _MLBATCHRESPONSE._serialized_end=600
+  _TENSOR._serialized_start=602
+  _TENSOR._serialized_end=654
+  _TENSORREQUEST._serialized_start=656
+  _TENSORREQUEST._serialized_end=711
+  _TENSORRESPONSE._serialized_start=713
+  _TENSORRESPONSE._serialized_end=754
+  _ARROWREQUEST._serialized_start=756
+  _ARROWREQUEST._serialized_end=799
+  _ARROWRESPONSE._serialized_start=801
+  _ARROWRESPONSE._serialized_end=830
+  _PROFILEREQUEST._serialized_start=832
+  _PROFILEREQUEST._serialized_end=886
+  _PROFILERESPONSE._serialized_start=888
+  _PROFILERESPONSE._serialized_end=955
+  _ML._serialized_start=958
+  _ML._serialized_end=1214
+  _ADMIN._serialized_start=1216
+  _ADMIN._serialized_end=1271
 # @@protoc_insertion_point(module_scope)
@@ -19,6 +19,26 @@ class MLStub(object):
                 request_serializer=proto_dot_grpc__pb2.MLRequest.SerializeToString,
                 response_deserializer=proto_dot_grpc__pb2.MLResponse.FromString,
                 )
+        self.PredictTensor = channel.unary_unary(
+                '/ML/PredictTensor',
+                request_serializer=proto_dot_grpc__pb2.TensorRequest.SerializeToString,
+                response_deserializer=proto_dot_grpc__pb2.TensorResponse.FromString,
+                )
+        self.PredictStream = channel.stream_stream(
+                '/ML/PredictStream',
+                request_serializer=proto_dot_grpc__pb2.MLStreamRequest.SerializeToString,
+                response_deserializer=proto_dot_grpc__pb2.MLStreamResponse.FromString,
+                )
+        self.PredictBatch = channel.unary_unary(
+                '/ML/PredictBatch',
+                request_serializer=proto_dot_grpc__pb2.MLBatchRequest.SerializeToString,
+                response_deserializer=proto_dot_grpc__pb2.MLBatchResponse.FromString,
+                )
+        self.PredictArrow = channel.unary_unary(
+                '/ML/PredictArrow',
+                request_serializer=proto_dot_grpc__pb2.ArrowRequest.SerializeToString,
+                response_deserializer=proto_dot_grpc__pb2.ArrowResponse.FromString,
+                )
 
 
 class MLServicer(object):
@@ -30,6 +50,30 @@ class MLServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def PredictTensor(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def PredictStream(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def PredictBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def PredictArrow(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_MLServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -38,6 +82,26 @@ def add_MLServicer_to_server(servicer, server):
                     request_deserializer=proto_dot_grpc__pb2.MLRequest.FromString,
                     response_serializer=proto_dot_grpc__pb2.MLResponse.SerializeToString,
             ),
+            'PredictTensor': grpc.unary_unary_rpc_method_handler(
+                    servicer.PredictTensor,
+                    request_deserializer=proto_dot_grpc__pb2.TensorRequest.FromString,
+                    response_serializer=proto_dot_grpc__pb2.TensorResponse.SerializeToString,
+            ),
+            'PredictStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.PredictStream,
+                    request_deserializer=proto_dot_grpc__pb2.MLStreamRequest.FromString,
+                    response_serializer=proto_dot_grpc__pb2.MLStreamResponse.SerializeToString,
+            ),
+            'PredictBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.PredictBatch,
+                    request_deserializer=proto_dot_grpc__pb2.MLBatchRequest.FromString,
+                    response_serializer=proto_dot_grpc__pb2.MLBatchResponse.SerializeToString,
+            ),
+            'PredictArrow': grpc.unary_unary_rpc_method_handler(
+                    servicer.PredictArrow,
+                    request_deserializer=proto_dot_grpc__pb2.ArrowRequest.FromString,
+                    response_serializer=proto_dot_grpc__pb2.ArrowResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'ML', rpc_method_handlers)
@@ -64,3 +128,135 @@ class ML(object):
             proto_dot_grpc__pb2.MLResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def PredictTensor(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/ML/PredictTensor',
+            proto_dot_grpc__pb2.TensorRequest.SerializeToString,
+            proto_dot_grpc__pb2.TensorResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def PredictStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/ML/PredictStream',
+            proto_dot_grpc__pb2.MLStreamRequest.SerializeToString,
+            proto_dot_grpc__pb2.MLStreamResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def PredictBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/ML/PredictBatch',
+            proto_dot_grpc__pb2.MLBatchRequest.SerializeToString,
+            proto_dot_grpc__pb2.MLBatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def PredictArrow(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/ML/PredictArrow',
+            proto_dot_grpc__pb2.ArrowRequest.SerializeToString,
+            proto_dot_grpc__pb2.ArrowResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+
+class AdminStub(object):
+    """Served only when `model_service.grpc.profiling` is on.
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Profile = channel.unary_unary(
+                '/Admin/Profile',
+                request_serializer=proto_dot_grpc__pb2.ProfileRequest.SerializeToString,
+                response_deserializer=proto_dot_grpc__pb2.ProfileResponse.FromString,
+                )
+
+
+class AdminServicer(object):
+    """Served only when `model_service.grpc.profiling` is on.
+    """
+
+    def Profile(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_AdminServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Profile': grpc.unary_unary_rpc_method_handler(
+                    servicer.Profile,
+                    request_deserializer=proto_dot_grpc__pb2.ProfileRequest.FromString,
+                    response_serializer=proto_dot_grpc__pb2.ProfileResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'Admin', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+
+
+ # This class is part of an EXPERIMENTAL API.
+class Admin(object):
+    """Served only when `model_service.grpc.profiling` is on.
+    """
+
+    @staticmethod
+    def Profile(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/Admin/Profile',
+            proto_dot_grpc__pb2.ProfileRequest.SerializeToString,
+            proto_dot_grpc__pb2.ProfileResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
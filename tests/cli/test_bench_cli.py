@@ -0,0 +1,52 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from aigear.cli.bench_cli import bench
+
+SUMMARY = {
+    "mode": "closed",
+    "concurrency": 4,
+    "duration_seconds": 1.0,
+    "requests": 100,
+    "ok": 99,
+    "errors": {"UNAVAILABLE": 1},
+    "error_rate": 0.01,
+    "throughput_rps": 99.0,
+    "latency_ms": {
+        "mean": 2.0,
+        "p50": 1.5,
+        "p90": 3.0,
+        "p99": 8.0,
+        "p999": 9.0,
+        "max": 9.5,
+    },
+}
+
+
+@pytest.fixture
+def payload(tmp_path):
+    path = tmp_path / "payload.json"
+    path.write_text(json.dumps({"x": 1}))
+    return str(path)
+
+
+def test_bench_passes_options_and_writes_json(payload, tmp_path, capsys):
+    report = tmp_path / "report.json"
+    with patch(
+        "aigear.cli.bench_cli.run_benchmark", return_value=SUMMARY
+    ) as run_benchmark:
+        bench(["--payload", payload, "--qps", "50", "--json", str(report)])
+    assert run_benchmark.call_args.args == ("localhost:50051", [{"x": 1}])
+    assert run_benchmark.call_args.kwargs["qps"] == 50
+    assert json.loads(report.read_text()) == SUMMARY
+    assert "UNAVAILABLE: 1" in capsys.readouterr().out
+
+
+def test_bench_exits_non_zero_when_a_threshold_is_exceeded(payload):
+    with patch("aigear.cli.bench_cli.run_benchmark", return_value=SUMMARY):
+        bench(["--payload", payload, "--max-p99-ms", "10"])
+        with pytest.raises(SystemExit) as exit_info:
+            bench(["--payload", payload, "--max-p99-ms", "5"])
+    assert exit_info.value.code == 1
@@ -0,0 +1,20 @@
+import pytest
+
+from aigear.common.row_files import file_format, read_chunks
+
+
+def test_file_format_from_extension():
+    assert file_format("a/b.JSONL") == "jsonl"
+    assert file_format("b.csv") == "csv"
+    assert file_format("b.pq") == "parquet"
+    with pytest.raises(ValueError):
+        file_format("b.txt")
+
+
+def test_read_chunks_streams_csv_with_numbers(tmp_path):
+    path = tmp_path / "input.csv"
+    path.write_text("id,x,name\n007,1.5,a\n8,2,\n9,3,c\n")
+    chunks = list(read_chunks(path, chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[0][0] == {"id": "007", "x": 1.5, "name": "a"}
+    assert chunks[0][1] == {"id": 8, "x": 2, "name": None}
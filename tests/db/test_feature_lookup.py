@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import time
+from concurrent import futures
+
+import pytest
+
+from aigear.db.feature_lookup import FeatureLookup
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class _CountingCollection:
+    """A mongomock collection that records the keys of every query."""
+
+    def __init__(self, collection, seconds=0.0):
+        self.collection = collection
+        self.name = collection.name
+        self.seconds = seconds
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(sorted(next(iter(query.values()))["$in"]))
+        time.sleep(self.seconds)
+        return self.collection.find(query, projection)
+
+
+@pytest.fixture
+def collection():
+    features = mongomock.MongoClient().db.user_features
+    features.insert_many(
+        [{"_id": f"u{index}", "age": 20 + index, "segment": "a"} for index in range(20)]
+    )
+    return _CountingCollection(features)
+
+
+def _lookup(collection, **kwargs):
+    return FeatureLookup(collection, metrics=False, **kwargs)
+
+
+def test_get_caches_documents_and_missing_keys(collection):
+    lookup = _lookup(collection)
+    try:
+        assert lookup.get("u1")["age"] == 21
+        assert lookup.get("u1")["age"] == 21
+        assert lookup.get("nobody") is None
+        assert lookup.get("nobody") is None
+    finally:
+        lookup.close()
+    assert collection.queries == [["u1"], ["nobody"]]
+    stats = lookup.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_concurrent_misses_are_batched_into_few_queries():
+    features = mongomock.MongoClient().db.user_features
+    features.insert_many([{"_id": f"u{index}", "age": index} for index in range(20)])
+    collection = _CountingCollection(features, seconds=0.05)
+    lookup = _lookup(collection, max_wait_ms=20)
+    keys = [f"u{index}" for index in range(20)]
+    try:
+        with futures.ThreadPoolExecutor(max_workers=20) as pool:
+            documents = list(pool.map(lookup.get, keys))
+    finally:
+        lookup.close()
+    assert [document["age"] for document in documents] == list(range(20))
+    # The first miss runs on its own, the others queue up behind it
+    assert len(collection.queries) <= 3
+    assert sorted(key for keys in collection.queries for key in keys) == sorted(keys)
+
+
+def test_get_many_reads_missing_keys_in_one_query(collection):
+    lookup = _lookup(collection)
+    try:
+        lookup.get("u1")
+        documents = lookup.get_many(["u1", "u2", "u3", "nobody"])
+    finally:
+        lookup.close()
+    assert documents["u2"]["age"] == 22
+    assert documents["nobody"] is None
+    assert collection.queries == [["u1"], ["nobody", "u2", "u3"]]
+
+
+def test_expired_and_evicted_keys_are_read_again(collection):
+    lookup = _lookup(collection, ttl_seconds=0.05, max_entries=2)
+    try:
+        lookup.get("u1")
+        time.sleep(0.06)
+        lookup.get("u1")
+        lookup.get("u2")
+        lookup.get("u3")
+        lookup.get("u1")
+        lookup.get("u2")
+    finally:
+        lookup.close()
+    assert collection.queries == [["u1"], ["u1"], ["u2"], ["u3"], ["u1"], ["u2"]]
+
+
+def test_hot_keys_are_refreshed_in_the_background(collection):
+    lookup = _lookup(collection, ttl_seconds=0.3, refresh_ahead=0.5)
+    try:
+        assert lookup.get("u1")["age"] == 21
+        collection.collection.update_one({"_id": "u1"}, {"$set": {"age": 99}})
+        time.sleep(0.2)
+        # Served from the cache, and reloaded behind the request
+        assert lookup.get("u1")["age"] == 21
+        deadline = time.monotonic() + 5
+        while lookup.stats()["queries"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert lookup.get("u1")["age"] == 99
+    finally:
+        lookup.close()
+    stats = lookup.stats()
+    assert (stats["misses"], stats["refreshes"]) == (1, 1)
+
+
+def test_fields_limit_the_projection(collection):
+    lookup = _lookup(collection, fields=["age"])
+    try:
+        assert lookup.get("u1") == {"_id": "u1", "age": 21}
+    finally:
+        lookup.close()
+
+
+def test_query_errors_reach_the_caller():
+    class _BrokenCollection:
+        name = "broken"
+
+        def find(self, query, projection=None):
+            raise RuntimeError("connection refused")
+
+    lookup = _lookup(_BrokenCollection())
+    try:
+        with pytest.raises(RuntimeError):
+            lookup.get("u1")
+    finally:
+        lookup.close()
+    assert lookup.stats()["entries"] == 0
+
+
+def _get_in_fork(lookup, key, results):
+    results.put(lookup.get(key)["age"])
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_lookup_built_before_fork_works_in_the_worker(collection):
+    lookup = _lookup(collection)
+    try:
+        # The parent's query thread is running when the worker is forked
+        lookup.get("u1")
+        context = multiprocessing.get_context("fork")
+        results = context.SimpleQueue()
+        worker = context.Process(target=_get_in_fork, args=(lookup, "u2", results))
+        worker.start()
+        worker.join(timeout=10)
+        if worker.is_alive():
+            worker.kill()
+    finally:
+        lookup.close()
+    assert worker.exitcode == 0
+    assert results.get() == 22
@@ -0,0 +1,43 @@
+import pickle
+
+import pytest
+
+from aigear.management.model_artifact import load_model, save_model
+
+np = pytest.importorskip("numpy")
+
+
+def _model():
+    return {
+        "coef": np.arange(100_000, dtype=np.float32).reshape(500, 200),
+        "coef_f": np.asfortranarray(np.ones((200, 300))),
+        "bias": np.ones(3),
+        "name": "ranker",
+    }
+
+
+def test_round_trip_maps_large_arrays_read_only(tmp_path):
+    model = _model()
+    loaded = load_model(save_model(model, tmp_path / "model.pkl"))
+
+    assert loaded["name"] == "ranker"
+    for key in ("coef", "coef_f", "bias"):
+        assert np.array_equal(loaded[key], model[key])
+    # Large arrays are views of the mapped file, small ones stay in the pickle
+    assert not loaded["coef"].flags.writeable
+    assert loaded["coef_f"].flags.f_contiguous and not loaded["coef_f"].flags.writeable
+    assert loaded["bias"].flags.writeable
+    assert loaded["coef"].ctypes.data % 64 == 0
+
+
+def test_load_without_mmap_copies_buffers(tmp_path):
+    path = save_model(_model(), tmp_path / "model.pkl")
+    loaded = load_model(path, mmap_buffers=False)
+    assert np.array_equal(loaded["coef"], _model()["coef"])
+
+
+def test_plain_pickle_files_still_load(tmp_path):
+    path = tmp_path / "scaler.pkl"
+    with open(path, "wb") as f:
+        pickle.dump({"mean": [1.0, 2.0]}, f)
+    assert load_model(path) == {"mean": [1.0, 2.0]}
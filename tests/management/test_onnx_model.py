@@ -0,0 +1,119 @@
+import pickle
+
+import pytest
+
+from aigear.management.onnx_model import (
+    OnnxModel,
+    ParityError,
+    check_parity,
+    compare_backends,
+    convert_to_onnx,
+    load_holdout,
+    onnx_release,
+    release_onnx,
+)
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("skl2onnx")
+linear_model = pytest.importorskip("sklearn.linear_model")
+pipeline = pytest.importorskip("sklearn.pipeline")
+preprocessing = pytest.importorskip("sklearn.preprocessing")
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    features = rng.random((200, 6))
+    return features, (features[:, 0] > 0.5).astype(int)
+
+
+@pytest.fixture
+def classifier(data):
+    return pipeline.make_pipeline(
+        preprocessing.StandardScaler(), linear_model.LogisticRegression()
+    ).fit(*data)
+
+
+def test_classifier_export_matches_labels_and_probabilities(classifier, data, tmp_path):
+    features, _ = data
+    report = release_onnx(classifier, features, tmp_path / "model.onnx")
+
+    assert report["passed"] and report["mismatches"] == 0
+    # labels and both class probabilities of every row
+    assert report["values"] == 3 * len(features)
+    onnx_model = OnnxModel(report["path"])
+    np.testing.assert_array_equal(
+        onnx_model.predict(features), classifier.predict(features)
+    )
+    np.testing.assert_array_equal(
+        onnx_model.predict(features[0]), classifier.predict(features[:1])
+    )
+
+
+def test_regressor_outputs_are_compared_within_tolerance(data, tmp_path):
+    features, _ = data
+    model = linear_model.Ridge().fit(features, features[:, 1])
+    onnx_model = OnnxModel(convert_to_onnx(model, features, tmp_path / "m.onnx"))
+
+    assert check_parity(model, onnx_model, features)["passed"]
+    model.coef_ = model.coef_ + 0.1
+    report = check_parity(model, onnx_model, features)
+    assert not report["passed"]
+    assert report["max_abs_diff"] > 0.01
+
+
+def test_failed_parity_removes_the_export(data, tmp_path):
+    features, _ = data
+
+    model = linear_model.Ridge().fit(features, features[:, 1])
+    # The converter reads the coefficients, so only the native output drifts
+    native_predict = model.predict
+    model.predict = lambda inputs: native_predict(inputs) + 1
+    with pytest.raises(ParityError) as error:
+        release_onnx(model, features, tmp_path / "model.onnx")
+    assert error.value.report["mismatches"] == len(features)
+    assert not (tmp_path / "model.onnx").exists()
+
+
+def test_session_threads_come_from_thread_config(
+    classifier, data, tmp_path, monkeypatch
+):
+    monkeypatch.setenv("OMP_NUM_THREADS", "3")
+    path = convert_to_onnx(classifier, data[0], tmp_path / "model.onnx")
+    options = OnnxModel(path).session.get_session_options()
+    assert options.intra_op_num_threads == 3
+    assert options.inter_op_num_threads == 1
+    assert OnnxModel(path, 2).session.get_session_options().intra_op_num_threads == 2
+
+
+def test_load_holdout_reads_feature_columns(tmp_path):
+    (tmp_path / "holdout.csv").write_text("a,b\n1,2.5\n3,4\n5,6\n")
+    holdout = load_holdout(tmp_path / "holdout.csv", rows=2)
+    assert holdout.dtype == np.float32
+    np.testing.assert_array_equal(holdout, [[1, 2.5], [3, 4]])
+
+
+def test_onnx_release_reports_parity_and_both_backends(classifier, data, tmp_path):
+    features, _ = data
+    with open(tmp_path / "model.pkl", "wb") as f:
+        pickle.dump(classifier, f)
+    np.save(tmp_path / "holdout.npy", features)
+
+    report = onnx_release(
+        tmp_path / "model.pkl", tmp_path / "holdout.npy", benchmark_iterations=5
+    )
+
+    assert report["parity"]["path"] == str(tmp_path / "model.onnx")
+    for backend in ("native", "onnx"):
+        assert report["benchmark"][backend]["p50_ms"] > 0
+        assert "memory_bytes" in report["benchmark"][backend]
+    assert report["benchmark"]["faster"] in ("native", "onnx")
+
+
+def test_compare_backends_reports_load_errors(tmp_path):
+    report = compare_backends(
+        tmp_path / "missing.pkl", tmp_path / "missing.onnx", np.ones((1, 2)), 1
+    )
+    assert "error" in report["native"] and "error" in report["onnx"]
+    assert "faster" not in report
@@ -0,0 +1,146 @@
+import time
+
+import grpc
+import pytest
+from google.protobuf import struct_pb2
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+
+from aigear.service.grpc.grpc_package.admission import AdmissionControl
+from aigear.service.grpc.grpc_package.metrics import MeteredThreadPoolExecutor
+from aigear.service.grpc.grpc_service import MLServicer
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+
+class _SlowModel:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.calls = 0
+
+    def predict(self, data):
+        self.calls += 1
+        time.sleep(self.seconds)
+        return [data["x"]]
+
+
+def _request(x):
+    struct = struct_pb2.Struct()
+    struct.update({"x": x})
+    return grpc_pb2.MLRequest(request=struct)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def _serve(model, admission):
+        server = grpc.server(
+            thread_pool=MeteredThreadPoolExecutor(
+                max_workers=1, on_submit=admission.track
+            ),
+            interceptors=[admission.interceptor()],
+        )
+        grpc_pb2_grpc.add_MLServicer_to_server(MLServicer(model), server)
+        health_pb2_grpc.add_HealthServicer_to_server(health.HealthServicer(), server)
+        port = server.add_insecure_port("localhost:0")
+        server.start()
+        servers.append(server)
+        return grpc.insecure_channel(f"localhost:{port}")
+
+    yield _serve
+    for server in servers:
+        server.stop(grace=None)
+
+
+def _codes(calls):
+    codes = []
+    for call in calls:
+        try:
+            call.result()
+            codes.append(grpc.StatusCode.OK)
+        except grpc.RpcError as e:
+            codes.append(e.code())
+    return codes
+
+
+def test_admission_disabled_by_default():
+    assert AdmissionControl.from_config(None, 4) is None
+    admission = AdmissionControl.from_config({"on": True, "max_queue": 6}, 4)
+    assert admission.max_admitted == 10
+    assert AdmissionControl(4, max_queue=0).max_admitted is None
+
+
+def test_full_queue_is_rejected_at_once(serve):
+    admission = AdmissionControl(1, max_queue=1, queue_budget_ms=0)
+    stub = grpc_pb2_grpc.MLStub(serve(_SlowModel(0.2), admission))
+    calls = []
+    for i in range(5):
+        calls.append(stub.Predict.future(_request(i)))
+        time.sleep(0.02)
+    codes = _codes(calls)
+    assert codes[:2] == [grpc.StatusCode.OK] * 2
+    assert codes[2:] == [grpc.StatusCode.RESOURCE_EXHAUSTED] * 3
+    assert admission.stats()["queue_full"] == 3
+    # Every slot is given back once the calls complete
+    assert _codes([stub.Predict.future(_request(9))]) == [grpc.StatusCode.OK]
+
+
+def test_health_checks_are_served_while_the_queue_is_full(serve):
+    admission = AdmissionControl(1, max_queue=1, queue_budget_ms=0)
+    channel = serve(_SlowModel(0.2), admission)
+    stub = grpc_pb2_grpc.MLStub(channel)
+    health_stub = health_pb2_grpc.HealthStub(channel)
+    calls = []
+    for i in range(3):
+        calls.append(stub.Predict.future(_request(i)))
+        time.sleep(0.02)
+    checks = [
+        health_stub.Check.future(health_pb2.HealthCheckRequest()) for _ in range(3)
+    ]
+    assert _codes(calls)[2] == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert [check.result().status for check in checks] == [
+        health_pb2.HealthCheckResponse.SERVING
+    ] * 3
+    assert admission.stats()["queue_full"] == 1
+
+
+def test_requests_queued_past_budget_are_not_computed(serve):
+    model = _SlowModel(0.1)
+    admission = AdmissionControl(1, max_queue=0, queue_budget_ms=20)
+    stub = grpc_pb2_grpc.MLStub(serve(model, admission))
+    codes = _codes([stub.Predict.future(_request(i)) for i in range(3)])
+    assert sorted(code.name for code in codes) == [
+        "OK",
+        "RESOURCE_EXHAUSTED",
+        "RESOURCE_EXHAUSTED",
+    ]
+    assert model.calls == 1
+    assert admission.stats()["queue_budget"] == 2
+
+
+def test_requests_past_their_deadline_are_not_computed(serve):
+    model = _SlowModel(0.2)
+    admission = AdmissionControl(1, max_queue=0, queue_budget_ms=0)
+    stub = grpc_pb2_grpc.MLStub(serve(model, admission))
+    codes = _codes([stub.Predict.future(_request(i), timeout=0.1) for i in range(2)])
+    assert codes == [grpc.StatusCode.DEADLINE_EXCEEDED] * 2
+    time.sleep(0.3)
+    assert model.calls == 1
+
+
+class _Context:
+    def __init__(self, time_remaining):
+        self._time_remaining = time_remaining
+
+    def time_remaining(self):
+        return self._time_remaining
+
+
+def test_rejection_reasons():
+    admission = AdmissionControl(1, queue_budget_ms=50)
+    now = time.monotonic()
+    assert admission._rejection("Predict", now, _Context(None)) is None
+    code, _ = admission._rejection("Predict", now, _Context(0))
+    assert code == grpc.StatusCode.DEADLINE_EXCEEDED
+    code, _ = admission._rejection("Predict", now - 0.1, _Context(5))
+    assert code == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert admission.stats() == {"queue_full": 0, "queue_budget": 1, "deadline": 1}
@@ -0,0 +1,39 @@
+import pytest
+
+from aigear.service.grpc.grpc_package.arrow_codec import decode_table, encode_table
+
+pa = pytest.importorskip("pyarrow")
+np = pytest.importorskip("numpy")
+
+
+def test_round_trip_keeps_columns_and_types():
+    table = pa.table({"x": [1.0, 2.5], "id": ["a", "b"], "n": [1, 2]})
+    decoded = decode_table(encode_table(table))
+    assert decoded.equals(table)
+
+
+def test_decoded_columns_are_views_over_the_payload():
+    data = encode_table(pa.table({"x": np.arange(1000, dtype=np.float64)}))
+    column = decode_table(data).column("x").chunk(0)
+    payload = pa.py_buffer(data)
+    values = column.buffers()[1]
+    assert payload.address <= values.address < payload.address + payload.size
+
+
+def test_lists_and_arrays_become_a_prediction_column():
+    assert decode_table(encode_table([0.5, 1.5])).to_pydict() == {
+        "prediction": [0.5, 1.5]
+    }
+    decoded = decode_table(encode_table(np.ones((2, 3), dtype=np.float32)))
+    assert decoded.column("prediction").to_pylist() == [[1.0] * 3, [1.0] * 3]
+
+
+def test_dicts_and_record_batches_are_encoded_as_tables():
+    batch = pa.RecordBatch.from_pydict({"score": [0.1, 0.2]})
+    assert decode_table(encode_table(batch)).to_pydict() == {"score": [0.1, 0.2]}
+    assert decode_table(encode_table({"label": ["x"]})).to_pydict() == {"label": ["x"]}
+
+
+def test_decode_rejects_invalid_payload():
+    with pytest.raises(ValueError):
+        decode_table(b"not an arrow stream")
@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from aigear.service.grpc.grpc_package.batching import MicroBatcher
+
+
+def test_single_call_returns_its_own_output():
+    batcher = MicroBatcher(lambda items: [i * 2 for i in items], max_wait_ms=0)
+    try:
+        assert batcher(21) == 42
+    finally:
+        batcher.close()
+
+
+def test_concurrent_calls_are_batched_and_routed_back():
+    sizes = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def handler(items):
+        sizes.append(len(items))
+        entered.set()
+        release.wait(timeout=5)
+        return [i + 100 for i in items]
+
+    batcher = MicroBatcher(handler, max_batch_size=8, max_wait_ms=50)
+    try:
+        # The first call occupies the batch thread, the rest queue up behind it
+        first = batcher.submit(0)
+        assert entered.wait(timeout=5)
+        futures = [batcher.submit(i) for i in range(1, 9)]
+        release.set()
+        assert first.result(timeout=5) == 100
+        assert [f.result(timeout=5) for f in futures] == [i + 100 for i in range(1, 9)]
+    finally:
+        batcher.close()
+    assert sizes[0] == 1
+    assert max(sizes[1:]) > 1
+    assert all(size <= 8 for size in sizes)
+
+
+def test_handler_error_is_raised_to_every_caller():
+    def handler(items):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(handler, max_wait_ms=0)
+    try:
+        with pytest.raises(RuntimeError, match="boom"):
+            batcher(1)
+    finally:
+        batcher.close()
+
+
+def test_output_length_mismatch_is_an_error():
+    batcher = MicroBatcher(lambda items: [], max_wait_ms=0)
+    try:
+        with pytest.raises(ValueError):
+            batcher(1)
+    finally:
+        batcher.close()
+
+
+def test_many_threads_all_get_results():
+    batcher = MicroBatcher(
+        lambda items: [-i for i in items], max_batch_size=4, max_wait_ms=2
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(batcher, range(200)))
+    finally:
+        batcher.close()
+    assert results == [-i for i in range(200)]
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+from google.protobuf import struct_pb2
+
+from aigear.service.grpc.grpc_package.coalescing import SingleFlight
+from aigear.service.grpc.grpc_service import MLServicer
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+
+class _SlowModel:
+    def __init__(self, seconds=0.2):
+        self.seconds = seconds
+        self.calls = 0
+
+    def predict(self, data):
+        self.calls += 1
+        time.sleep(self.seconds)
+        return [data["x"]]
+
+
+def _followers(flight, key, call, count):
+    with futures.ThreadPoolExecutor(max_workers=count) as pool:
+        return list(pool.map(lambda _: flight.do(key, call), range(count)))
+
+
+def test_identical_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+
+    def _call():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    assert _followers(flight, b"key", _call, 4) == ["result"] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {"leaders": 1, "followers": 3}
+    # Nothing is kept: the next call runs again
+    assert flight.do(b"key", _call) == "result"
+    assert len(calls) == 2 and flight.in_flight() == 0
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight()
+
+    def _call():
+        time.sleep(0.1)
+        raise ValueError("model failed")
+
+    with futures.ThreadPoolExecutor(max_workers=3) as pool:
+        results = [pool.submit(flight.do, b"key", _call) for _ in range(3)]
+    for result in results:
+        with pytest.raises(ValueError, match="model failed"):
+            result.result()
+    assert flight.stats() == {"leaders": 1, "followers": 2}
+
+
+def test_follower_stops_waiting_at_its_timeout():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=(b"key", release.wait))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(futures.TimeoutError):
+        flight.do(b"key", lambda: "unused", timeout=0.05)
+    release.set()
+    leader.join()
+
+
+def test_async_followers_survive_a_cancelled_leader():
+    flight = SingleFlight()
+    calls = []
+
+    async def _call():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def _run():
+        leader = asyncio.ensure_future(flight.do_async(b"key", _call))
+        await asyncio.sleep(0)
+        followers = [flight.do_async(b"key", _call) for _ in range(3)]
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(_run()) == ["result"] * 3
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+
+
+@pytest.mark.parametrize("timeout", [5, None])
+def test_servicer_coalesces_identical_predicts(timeout):
+    model = _SlowModel()
+    servicer = MLServicer(model, {"coalescing": {"on": True}})
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
+    grpc_pb2_grpc.add_MLServicer_to_server(servicer, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    try:
+        with grpc.insecure_channel(f"localhost:{port}") as channel:
+            stub = grpc_pb2_grpc.MLStub(channel)
+
+            def _predict(x):
+                struct = struct_pb2.Struct()
+                struct.update({"x": x})
+                return stub.Predict(
+                    grpc_pb2.MLRequest(request=struct), timeout=timeout
+                )
+
+            with futures.ThreadPoolExecutor(max_workers=6) as pool:
+                responses = list(pool.map(_predict, [1, 1, 1, 1, 2, 2]))
+    finally:
+        server.stop(grace=None)
+    assert [list(r.response["response"]) for r in responses] == [[1]] * 4 + [[2]] * 2
+    assert model.calls == 2
+    assert servicer.coalescer.stats() == {"leaders": 2, "followers": 4}
+
+
+def test_coalescing_is_off_by_default():
+    assert MLServicer(_SlowModel()).coalescer is None
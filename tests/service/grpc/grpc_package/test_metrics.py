@@ -0,0 +1,95 @@
+import threading
+
+import grpc
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from aigear.service.grpc.grpc_package.metrics import (  # noqa: E402
+    NULL_METRICS,
+    MeteredThreadPoolExecutor,
+    ServerMetrics,
+    create_server_metrics,
+)
+
+
+class _Context:
+    def __init__(self, code=None):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+def _sample(metric, name, **labels):
+    for family in metric.collect():
+        for sample in family.samples:
+            if sample.name == name and sample.labels == labels:
+                return sample.value
+    return None
+
+
+def test_track_counts_requests_by_status_code_and_model():
+    metrics = ServerMetrics()
+    in_flight = "aigear_grpc_in_flight_requests"
+    with metrics.track("Predict", _Context(), "ranker"):
+        assert (
+            _sample(metrics.in_flight, in_flight, method="Predict", model="ranker") == 1
+        )
+    with pytest.raises(RuntimeError):
+        with metrics.track("Predict", _Context(), "ranker"):
+            raise RuntimeError("model failed")
+    with metrics.track("Predict", _Context(grpc.StatusCode.INVALID_ARGUMENT), "ctr"):
+        pass
+
+    name = "aigear_grpc_requests_total"
+    requests = metrics.requests
+    assert _sample(requests, name, method="Predict", code="OK", model="ranker") == 1
+    assert (
+        _sample(requests, name, method="Predict", code="UNKNOWN", model="ranker") == 1
+    )
+    assert (
+        _sample(requests, name, method="Predict", code="INVALID_ARGUMENT", model="ctr")
+        == 1
+    )
+    assert _sample(metrics.in_flight, in_flight, method="Predict", model="ranker") == 0
+
+
+def test_stage_observes_latency():
+    metrics = ServerMetrics()
+    for _ in range(3):
+        with metrics.stage("Predict", "decode"):
+            pass
+    count = _sample(
+        metrics.latency,
+        "aigear_grpc_request_duration_seconds_count",
+        method="Predict",
+        stage="decode",
+        model="",
+    )
+    assert count == 3
+
+
+def test_metered_executor_reports_queue_depth():
+    metrics = ServerMetrics()
+    release = threading.Event()
+    with MeteredThreadPoolExecutor(
+        max_workers=1, queue_depth=metrics.queue_depth
+    ) as executor:
+        running = executor.submit(release.wait)
+        waiting = [executor.submit(lambda: None) for _ in range(3)]
+        depth = _sample(metrics.queue_depth, "aigear_grpc_thread_pool_queue_depth")
+        release.set()
+        running.result()
+        for future in waiting:
+            future.result()
+    # The blocked task may or may not have been picked up when sampled
+    assert depth in (3, 4)
+    assert _sample(metrics.queue_depth, "aigear_grpc_thread_pool_queue_depth") == 0
+
+
+def test_metrics_off_by_default():
+    assert create_server_metrics(None) is NULL_METRICS
+    assert create_server_metrics({"on": False}) is NULL_METRICS
+    with NULL_METRICS.track("Predict", None), NULL_METRICS.stage("Predict", "encode"):
+        pass
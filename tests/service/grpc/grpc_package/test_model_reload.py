@@ -0,0 +1,95 @@
+import threading
+from unittest.mock import MagicMock
+
+from aigear.service.grpc.grpc_package.model_reload import (
+    ModelReloader,
+    load_release,
+    read_release_pointer,
+)
+
+
+class _Model:
+    def __init__(self, release=None):
+        self.release = release
+        self.warmed = False
+
+    @classmethod
+    def from_release(cls, release):
+        return cls(release)
+
+    def warmup(self):
+        self.warmed = True
+
+
+def _reloader(pointer, swap, release="v1", load=None):
+    return ModelReloader(
+        str(pointer),
+        load or (lambda release: load_release(_Model, release)),
+        swap,
+        release=release,
+    )
+
+
+def test_read_release_pointer_from_local_file(tmp_path):
+    pointer = tmp_path / "RELEASE"
+    pointer.write_text("2026-10-18\n")
+    assert read_release_pointer(str(pointer)) == "2026-10-18"
+    assert read_release_pointer(str(tmp_path / "missing")) is None
+
+
+def test_read_release_pointer_from_bucket():
+    client = MagicMock()
+    client.bucket.return_value.blob.return_value.download_as_text.return_value = "v7"
+    assert read_release_pointer("gs://models/ranker/RELEASE", client) == "v7"
+    client.bucket.assert_called_once_with("models")
+    client.bucket.return_value.blob.assert_called_once_with("ranker/RELEASE")
+
+
+def test_load_release_falls_back_to_constructor():
+    class Plain:
+        pass
+
+    assert isinstance(load_release(Plain, "v2"), Plain)
+    assert load_release(_Model, "v2").release == "v2"
+
+
+def test_reloader_swaps_warmed_model_when_pointer_moves(tmp_path):
+    pointer = tmp_path / "RELEASE"
+    pointer.write_text("v1")
+    swap = MagicMock()
+    reloader = _reloader(pointer, swap)
+
+    assert reloader.check() is False
+    pointer.write_text("v2")
+    assert reloader.check() is True
+
+    model, release = swap.call_args.args
+    assert (model.release, model.warmed, release) == ("v2", True, "v2")
+    assert reloader.release == "v2"
+    assert reloader.check() is False
+
+
+def test_reloader_keeps_current_model_when_load_fails(tmp_path):
+    pointer = tmp_path / "RELEASE"
+    pointer.write_text("v2")
+    swap = MagicMock()
+
+    def _fail(release):
+        raise RuntimeError("artifact missing")
+
+    reloader = _reloader(pointer, swap, load=_fail)
+    assert reloader.check() is False
+    swap.assert_not_called()
+    assert reloader.release == "v1"
+
+
+def test_reloader_checks_pointer_as_soon_as_it_starts(tmp_path):
+    pointer = tmp_path / "RELEASE"
+    pointer.write_text("v2")
+    swapped = threading.Event()
+    reloader = _reloader(pointer, lambda model, release: swapped.set())
+    reloader.poll_seconds = 3600
+
+    reloader.start()
+    assert swapped.wait(timeout=5)
+    assert reloader.release == "v2"
@@ -0,0 +1,130 @@
+import json
+import os
+import signal
+import threading
+import time
+from concurrent import futures
+from unittest.mock import MagicMock
+
+import grpc
+import pytest
+
+from aigear.service.grpc.grpc_package.profiler import (
+    PROFILE_SIGNAL,
+    ProfilerControl,
+    SamplingProfiler,
+    write_profile,
+)
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+
+def _spin_in_model(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_pool():
+    stop = threading.Event()
+    pool = futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="aigear-grpc")
+    for _ in range(2):
+        pool.submit(_spin_in_model, stop)
+    yield
+    stop.set()
+    pool.shutdown()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_sampling_profiler_names_process_and_thread_pool(busy_pool):
+    profiler = SamplingProfiler(interval_ms=1, process="aigear-worker-0").run(0.05)
+    assert profiler.samples > 0
+    pool_stacks = [s for s in profiler.stacks if s[1] == "aigear-grpc"]
+    assert pool_stacks
+    assert all(stack[0] == "aigear-worker-0" for stack in profiler.stacks)
+    assert any("_spin_in_model" in stack[-1] for stack in pool_stacks)
+
+    line = profiler.collapsed().splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert stack.startswith("aigear-worker-0;") and int(count) > 0
+
+
+def test_speedscope_output_has_one_profile_per_thread(busy_pool):
+    profiler = SamplingProfiler(interval_ms=1, process="p").run(0.05)
+    speedscope = profiler.speedscope()
+    names = [profile["name"] for profile in speedscope["profiles"]]
+    assert "p aigear-grpc" in names
+    frame_count = len(speedscope["shared"]["frames"])
+    for profile in speedscope["profiles"]:
+        assert profile["type"] == "sampled"
+        assert len(profile["samples"]) == len(profile["weights"])
+        assert all(0 <= i < frame_count for s in profile["samples"] for i in s)
+
+
+def test_write_profile_uploads_to_bucket():
+    storage_client = MagicMock()
+    location = write_profile(
+        "a;b 1\n", "gs://bucket/profiles/", "w.collapsed", storage_client
+    )
+    assert location == "gs://bucket/profiles/w.collapsed"
+    storage_client.bucket.assert_called_once_with("bucket")
+    storage_client.bucket().blob.assert_called_once_with("profiles/w.collapsed")
+    storage_client.bucket().blob().upload_from_string.assert_called_once_with("a;b 1\n")
+
+
+def test_profiler_control_runs_one_profile_at_a_time(tmp_path):
+    control = ProfilerControl(seconds=0.1, interval_ms=5, output=str(tmp_path))
+    location = control.start()
+    assert location.startswith(str(tmp_path))
+    assert control.start() is None
+    assert _wait_for(lambda: not control.running)
+    assert control.last_output == location
+    assert os.path.getsize(location) > 0
+
+
+def test_profiler_is_off_by_default():
+    assert ProfilerControl.from_config(None) is None
+    assert ProfilerControl.from_config({"on": False}) is None
+    with pytest.raises(ValueError):
+        ProfilerControl(output_format="pprof")
+
+
+@pytest.mark.skipif(PROFILE_SIGNAL is None, reason="no SIGUSR2 on this platform")
+def test_signal_starts_a_profile(tmp_path):
+    control = ProfilerControl(seconds=0.05, output=str(tmp_path))
+    previous = signal.getsignal(PROFILE_SIGNAL)
+    try:
+        control.install_signal_handler()
+        os.kill(os.getpid(), PROFILE_SIGNAL)
+        assert _wait_for(lambda: control.last_output is not None)
+    finally:
+        signal.signal(PROFILE_SIGNAL, previous)
+
+
+def test_admin_rpc_profiles_the_worker(tmp_path):
+    control = ProfilerControl(
+        seconds=5, interval_ms=5, output=str(tmp_path), output_format="speedscope"
+    )
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    grpc_pb2_grpc.add_AdminServicer_to_server(control.servicer(), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    try:
+        with grpc.insecure_channel(f"localhost:{port}") as channel:
+            stub = grpc_pb2_grpc.AdminStub(channel)
+            response = stub.Profile(grpc_pb2.ProfileRequest(seconds=0.1))
+            assert response.pid == os.getpid()
+            assert response.output.endswith(".speedscope.json")
+            with pytest.raises(grpc.RpcError) as e:
+                stub.Profile(grpc_pb2.ProfileRequest(seconds=0.1))
+            assert e.value.code() is grpc.StatusCode.FAILED_PRECONDITION
+            assert _wait_for(lambda: control.last_output == response.output)
+    finally:
+        server.stop(grace=None)
+    with open(response.output) as f:
+        assert json.load(f)["exporter"] == "aigear"
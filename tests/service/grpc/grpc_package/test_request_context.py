@@ -0,0 +1,169 @@
+import gc
+import time
+import weakref
+
+import grpc
+import pytest
+
+from aigear.service.grpc.grpc_package.batching import MicroBatcher
+from aigear.service.grpc.grpc_package.request_context import (
+    NO_CONTEXT,
+    QUEUED,
+    RUNNING,
+    AbandonedRequests,
+    RequestAbandoned,
+    RequestContext,
+    accepts_context,
+    call_model,
+    run_queued,
+)
+
+
+class _SyncContext:
+    def __init__(self, time_remaining=None):
+        self.active = True
+        self.callbacks = []
+        self._time_remaining = time_remaining
+
+    def time_remaining(self):
+        return self._time_remaining
+
+    def is_active(self):
+        return self.active
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+        return True
+
+
+class _AioContext:
+    def __init__(self):
+        self.is_cancelled = False
+        self.callbacks = []
+
+    def time_remaining(self):
+        return None
+
+    def cancelled(self):
+        return self.is_cancelled
+
+    def add_done_callback(self, callback):
+        self.callbacks.append(callback)
+
+
+def test_no_context_is_never_abandoned():
+    assert NO_CONTEXT.time_remaining() is None
+    assert NO_CONTEXT.abandoned() is None
+    NO_CONTEXT.check()
+    assert not NO_CONTEXT.add_callback(lambda: None)
+
+
+def test_deadline_counts_down_and_expires():
+    context = RequestContext(_SyncContext(time_remaining=0.05))
+    assert 0 < context.time_remaining() <= 0.05
+    assert context.abandoned() is None
+    time.sleep(0.06)
+    assert context.time_remaining() == 0
+    assert context.abandoned() == "deadline"
+    with pytest.raises(RequestAbandoned) as error:
+        context.check()
+    assert error.value.code == grpc.StatusCode.DEADLINE_EXCEEDED
+    assert error.value.stage == RUNNING
+
+
+def test_cancellation_of_sync_and_aio_rpcs():
+    sync_context = _SyncContext()
+    context = RequestContext(sync_context)
+    assert not context.cancelled
+    sync_context.active = False
+    assert context.abandoned() == "cancelled"
+
+    aio_context = _AioContext()
+    context = RequestContext(aio_context)
+    assert not context.cancelled
+    aio_context.is_cancelled = True
+    assert context.cancelled
+
+
+def test_callbacks_run_when_the_rpc_ends():
+    calls = []
+    sync_context, aio_context = _SyncContext(), _AioContext()
+    assert RequestContext(sync_context).add_callback(lambda: calls.append("sync"))
+    assert RequestContext(aio_context).add_callback(lambda: calls.append("aio"))
+    sync_context.callbacks[0]()
+    aio_context.callbacks[0](aio_context)
+    assert calls == ["sync", "aio"]
+
+
+def test_context_is_passed_only_to_methods_that_take_it():
+    class _Model:
+        def predict(self, data):
+            return data
+
+        def predict_tensor(self, data, context=None):
+            return context
+
+    model = _Model()
+    context = RequestContext()
+    assert not accepts_context(model.predict)
+    assert accepts_context(model.predict_tensor)
+    assert call_model(model.predict, 1, context) == 1
+    assert call_model(model.predict_tensor, 1, context) is context
+
+
+def test_context_cache_does_not_keep_replaced_models_alive():
+    def _model():
+        def predict(data, context=None):
+            return data
+
+        return predict
+
+    predict = _model()
+    assert accepts_context(predict)
+    assert not accepts_context(len)
+    collected = weakref.ref(predict)
+    del predict
+    gc.collect()
+    assert collected() is None
+
+
+def test_run_queued_skips_abandoned_calls():
+    sync_context = _SyncContext()
+    sync_context.active = False
+    with pytest.raises(RequestAbandoned) as error:
+        run_queued(lambda data: data, 1, RequestContext(sync_context))
+    assert (error.value.reason, error.value.stage) == ("cancelled", QUEUED)
+    assert run_queued(lambda data: data, 1, NO_CONTEXT) == 1
+
+
+def test_batcher_drops_items_abandoned_while_queued():
+    batches = []
+    batcher = MicroBatcher(lambda items: batches.append(items) or items, max_wait_ms=0)
+    sync_context = _SyncContext()
+    sync_context.active = False
+    try:
+        with pytest.raises(RequestAbandoned) as error:
+            batcher(1, RequestContext(sync_context))
+        assert error.value.stage == QUEUED
+        assert batcher(2, RequestContext(_SyncContext())) == 2
+    finally:
+        batcher.close()
+    assert batches == [[2]]
+
+
+def test_abandoned_requests_are_counted_by_reason_and_stage():
+    abandoned = AbandonedRequests()
+    abandoned.record("Predict", "deadline", "queued")
+    abandoned.record("Predict", "deadline", "queued")
+    abandoned.record("PredictBatch", "cancelled", "running")
+    assert abandoned.stats() == {
+        "cancelled": {"queued": 0, "running": 1, "completed": 0},
+        "deadline": {"queued": 2, "running": 0, "completed": 0},
+    }
+
+
+def test_sync_call_without_deadline_has_no_time_remaining():
+    # What a sync server reports when the client set no deadline
+    context = RequestContext(_SyncContext(time_remaining=9.223372035062469e18))
+    assert context.time_remaining() is None
+    assert not context.expired
@@ -0,0 +1,86 @@
+import logging
+import time
+
+import pytest
+
+from aigear.service.grpc.grpc_package.request_logging import RequestLogger
+
+
+class _ExplodingRepr:
+    def __repr__(self):
+        raise AssertionError("payload was formatted")
+
+    __str__ = __repr__
+
+
+def _logger(name, **kwargs):
+    return RequestLogger(log_name=f"tests.request_logging.{name}", **kwargs)
+
+
+def test_unsampled_requests_never_format_payloads():
+    request_logger = _logger("off", sample_rate=0.0, payload="full")
+    assert not request_logger.enabled
+    request_log = request_logger.sample()
+    request_log.payload("Model input", _ExplodingRepr())
+    request_log.info("ignored")
+
+
+def test_level_names_are_case_insensitive():
+    request_logger = _logger("lowercase", level="debug")
+    assert request_logger.level == logging.DEBUG
+    assert request_logger.enabled
+
+
+def test_debug_level_logs_debug_records():
+    request_logger = _logger("debug", level="DEBUG")
+    assert request_logger.logger.isEnabledFor(logging.DEBUG)
+    assert type(request_logger.sample()).__name__ == "_RequestLog"
+
+
+def test_unknown_level_is_rejected():
+    with pytest.raises(ValueError):
+        _logger("unknown", level="verbose")
+
+
+def test_sample_rate_controls_fraction_of_logged_requests():
+    request_logger = _logger("sampled", sample_rate=0.25)
+    sampled = sum(
+        type(request_logger.sample()).__name__ == "_RequestLog" for _ in range(2000)
+    )
+    assert 300 < sampled < 700
+
+
+def test_truncate_bounds_rendered_payload():
+    request_logger = _logger("truncate", payload="truncate", max_payload_chars=50)
+    rendered = request_logger.render({"features": list(range(100000))})
+    assert len(rendered) <= 50 + len("...<truncated>")
+
+
+def test_hash_mode_renders_stable_digest():
+    request_logger = _logger("hash", payload="hash")
+    assert request_logger.render({"a": 1}) == request_logger.render({"a": 1})
+    assert request_logger.render({"a": 1}).startswith("<hash:")
+
+
+def test_none_mode_skips_payload_records():
+    request_logger = _logger("none", payload="none")
+    assert request_logger.render({"a": 1}) is None
+
+
+def test_invalid_payload_mode_is_rejected():
+    with pytest.raises(ValueError):
+        _logger("invalid", payload="everything")
+
+
+def test_sampled_records_are_written_by_background_thread(capsys):
+    request_logger = _logger("written")
+    request_log = request_logger.sample()
+    request_log.info("Predict function called:")
+    request_log.payload("Model input", {"x": 1})
+    deadline = time.monotonic() + 2
+    out = ""
+    while "Model input" not in out and time.monotonic() < deadline:
+        time.sleep(0.01)
+        out += capsys.readouterr().out
+    assert "Predict function called:" in out
+    assert "Model input: {'x': 1}." in out
@@ -0,0 +1,138 @@
+import multiprocessing
+import sys
+import time
+from multiprocessing import shared_memory
+
+import pytest
+from google.protobuf import struct_pb2
+
+from aigear.service.grpc.grpc_package.response_cache import (
+    SharedResponseCache,
+    create_response_cache,
+    request_digest,
+)
+
+
+def _digest(name: str) -> bytes:
+    struct = struct_pb2.Struct()
+    struct.update({"key": name})
+    return request_digest(struct)
+
+
+@pytest.fixture
+def cache():
+    caches = []
+
+    def _make(**kwargs):
+        c = SharedResponseCache(**kwargs)
+        caches.append(c)
+        return c
+
+    yield _make
+    for c in caches:
+        c.close()
+
+
+def test_request_digest_ignores_key_order():
+    a, b = struct_pb2.Struct(), struct_pb2.Struct()
+    a.update({"item": "1", "store": "9"})
+    b.update({"store": "9", "item": "1"})
+    assert request_digest(a) == request_digest(b)
+
+
+def test_get_returns_stored_value_and_counts_hits(cache):
+    c = cache(max_entries=16)
+    assert c.get(_digest("a")) is None
+    assert c.put(_digest("a"), b"value-a")
+    assert c.get(_digest("a")) == b"value-a"
+    stats = c.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_put_overwrites_existing_entry(cache):
+    c = cache(max_entries=16)
+    c.put(_digest("a"), b"old")
+    c.put(_digest("a"), b"new")
+    assert c.get(_digest("a")) == b"new"
+
+
+def test_entries_expire_after_their_ttl(cache):
+    c = cache(max_entries=16, ttl_seconds=60)
+    c.put(_digest("short"), b"x", ttl_seconds=0.05)
+    c.put(_digest("long"), b"y")
+    time.sleep(0.1)
+    assert c.get(_digest("short")) is None
+    assert c.get(_digest("long")) == b"y"
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    c = cache(max_entries=2, ways=2)
+    c.put(_digest("a"), b"a")
+    c.put(_digest("b"), b"b")
+    assert c.get(_digest("a")) == b"a"  # "b" is now least recently used
+    c.put(_digest("c"), b"c")
+    assert c.get(_digest("b")) is None
+    assert c.get(_digest("a")) == b"a"
+    assert c.get(_digest("c")) == b"c"
+    assert c.stats()["evictions"] == 1
+
+
+def test_oversized_values_are_not_stored(cache):
+    c = cache(max_entries=4, max_entry_bytes=8)
+    assert not c.put(_digest("a"), b"x" * 9)
+    assert c.get(_digest("a")) is None
+
+
+def _child_put(c):
+    c.put(_digest("from-child"), b"shared")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fork is not available")
+def test_entries_are_shared_with_forked_workers(cache):
+    c = cache(max_entries=16)
+    worker = multiprocessing.get_context("fork").Process(target=_child_put, args=(c,))
+    worker.start()
+    worker.join()
+    assert c.get(_digest("from-child")) == b"shared"
+
+
+def _child_close(c):
+    c.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fork is not available")
+def test_forked_workers_do_not_unlink_the_block(cache):
+    c = cache(max_entries=16)
+    c.put(_digest("a"), b"value")
+    worker = multiprocessing.get_context("fork").Process(target=_child_close, args=(c,))
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+    assert c.get(_digest("a")) == b"value"
+
+
+def test_block_is_unlinked_once_the_cache_is_collected():
+    c = SharedResponseCache(max_entries=16)
+    name = c._shm.name
+    del c
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_unpickled_state_attaches_to_same_block(cache):
+    c = cache(max_entries=16)
+    c.put(_digest("a"), b"value")
+    state = c.__getstate__()
+    assert state["_shm"] == c._shm.name
+    clone = SharedResponseCache.__new__(SharedResponseCache)
+    clone.__setstate__(state)
+    try:
+        assert clone.get(_digest("a")) == b"value"
+    finally:
+        clone.close()  # not the owner, so the block is not unlinked
+    assert c.get(_digest("a")) == b"value"
+
+
+def test_create_response_cache_is_off_by_default():
+    assert create_response_cache({}) is None
@@ -0,0 +1,107 @@
+import pytest
+from google.protobuf import struct_pb2
+from google.protobuf.json_format import MessageToDict
+
+from aigear.service.grpc.grpc_package.struct_codec import decode_struct, encode_struct
+
+np = pytest.importorskip("numpy")
+
+PAYLOAD = {
+    "user_id": "u-123",
+    "store_id": 12,
+    "member": True,
+    "coupon": None,
+    "features": [0.5 * index for index in range(32)],
+    "short": [1.0, 2.0],
+    "mixed": [1.0, "a", None, False] * 3,
+    "candidates": [
+        {"sku": f"sku-{index}", "price": 1.25 * index, "tags": ["new", "sale"]}
+        for index in range(10)
+    ],
+    "matrix": [[float(row * 10 + column) for column in range(10)] for row in range(3)],
+    "empty": {"list": [], "struct": {}},
+    "text": "日本語",
+}
+
+
+def _struct(payload: dict) -> struct_pb2.Struct:
+    struct = struct_pb2.Struct()
+    struct.update(payload)
+    return struct
+
+
+def test_decode_matches_message_to_dict():
+    struct = _struct(PAYLOAD)
+    assert decode_struct(struct) == MessageToDict(struct)
+
+
+def test_encode_matches_struct_update():
+    assert encode_struct(PAYLOAD) == _struct(PAYLOAD)
+
+
+def test_decode_numpy_arrays():
+    decoded = decode_struct(_struct(PAYLOAD), numpy_arrays=True)
+    assert decoded["features"].dtype == np.float64
+    np.testing.assert_array_equal(decoded["features"], PAYLOAD["features"])
+    np.testing.assert_array_equal(decoded["short"], [1.0, 2.0])
+    assert decoded["matrix"].shape == (3, 10)
+    assert decoded["mixed"] == PAYLOAD["mixed"]
+    assert decoded["candidates"][0]["tags"] == ["new", "sale"]
+    assert decoded["empty"] == {"list": [], "struct": {}}
+    assert decoded["features"].flags.writeable
+
+
+def test_numbers_with_other_values_are_not_an_array():
+    payload = {
+        "values": [float(index) for index in range(10)] + [True],
+        "rows": [[1.0, 2.0, 3.0], [4.0, "x", 6.0], [7.0, 8.0, 9.0]],
+    }
+    decoded = decode_struct(_struct(payload), numpy_arrays=True)
+    assert decoded["values"] == payload["values"]
+    assert decoded["rows"][1] == [4.0, "x", 6.0]
+    np.testing.assert_array_equal(decoded["rows"][0], [1.0, 2.0, 3.0])
+
+
+def test_ragged_rows_stay_a_list():
+    payload = {"rows": [[float(index)] * 10 for index in range(3)] + [[1.0] * 9]}
+    assert decode_struct(_struct(payload)) == payload
+    decoded = decode_struct(_struct(payload), numpy_arrays=True)
+    assert isinstance(decoded["rows"], list)
+    np.testing.assert_array_equal(decoded["rows"][3], [1.0] * 9)
+
+
+def test_encode_numpy_values():
+    matrix = np.arange(20, dtype=np.int32).reshape(2, 10)
+    encoded = encode_struct(
+        {
+            "scores": np.linspace(0, 1, 16),
+            "matrix": matrix,
+            "mask": np.array([True, False]),
+            "top": np.int64(3),
+            "score": np.float32(0.5),
+            "scalar": np.array(2.0),
+        }
+    )
+    assert encoded == _struct(
+        {
+            "scores": np.linspace(0, 1, 16).tolist(),
+            "matrix": matrix.tolist(),
+            "mask": [True, False],
+            "top": 3,
+            "score": 0.5,
+            "scalar": 2.0,
+        }
+    )
+
+
+def test_encode_fills_existing_message_and_round_trips_nan():
+    response = struct_pb2.Struct()
+    encode_struct({"response": [float("nan")] * 8}, response)
+    decoded = decode_struct(response)
+    assert len(decoded["response"]) == 8
+    assert all(value != value for value in decoded["response"])
+
+
+def test_encode_rejects_unknown_types():
+    with pytest.raises(ValueError):
+        encode_struct({"response": object()})
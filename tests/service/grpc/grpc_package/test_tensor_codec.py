@@ -0,0 +1,55 @@
+import pytest
+
+from aigear.service.grpc.grpc_package.tensor_codec import decode_tensor, encode_tensor
+from aigear.service.grpc.protos import grpc_pb2
+
+np = pytest.importorskip("numpy")
+
+
+def test_round_trip_keeps_dtype_and_shape():
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    tensor = encode_tensor(array)
+    assert tensor.dtype == array.dtype.str
+    assert list(tensor.shape) == [3, 4]
+    decoded = decode_tensor(tensor)
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, array)
+
+
+def test_decoded_array_is_a_read_only_view():
+    tensor = encode_tensor(np.ones(4, dtype=np.float64))
+    decoded = decode_tensor(tensor)
+    assert not decoded.flags.writeable
+    assert not decoded.flags.owndata
+
+
+def test_non_contiguous_input_is_encoded_in_c_order():
+    array = np.arange(6, dtype=np.int64).reshape(2, 3).T
+    decoded = decode_tensor(encode_tensor(array))
+    np.testing.assert_array_equal(decoded, array)
+
+
+def test_encode_fills_existing_message():
+    response = grpc_pb2.TensorResponse()
+    encode_tensor([1.0, 2.0], response.tensor)
+    np.testing.assert_array_equal(decode_tensor(response.tensor), [1.0, 2.0])
+
+
+def test_decode_rejects_unknown_dtype():
+    with pytest.raises(ValueError):
+        decode_tensor(grpc_pb2.Tensor(data=b"\x00" * 4, dtype="nope", shape=[1]))
+
+
+def test_decode_rejects_shape_mismatch():
+    with pytest.raises(ValueError):
+        decode_tensor(grpc_pb2.Tensor(data=b"\x00" * 8, dtype="<f4", shape=[3]))
+
+
+def test_decode_rejects_partial_items():
+    with pytest.raises(ValueError):
+        decode_tensor(grpc_pb2.Tensor(data=b"\x00" * 6, dtype="<f4", shape=[1]))
+
+
+def test_encode_rejects_object_arrays():
+    with pytest.raises(ValueError):
+        encode_tensor(np.array([{"a": 1}], dtype=object))
@@ -0,0 +1,74 @@
+from aigear.service.grpc.grpc_package.topology import (
+    Topology,
+    cgroup_cpu_limit,
+    cgroup_memory_limit,
+    split_cpus,
+)
+
+GB = 1024**3
+
+
+def test_reads_cgroup_v2_limits(tmp_path):
+    (tmp_path / "cpu.max").write_text("250000 100000\n")
+    (tmp_path / "memory.max").write_text(f"{4 * GB}\n")
+    assert cgroup_cpu_limit(tmp_path) == 2.5
+    assert cgroup_memory_limit(tmp_path) == 4 * GB
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    (tmp_path / "memory.max").write_text("max\n")
+    assert cgroup_cpu_limit(tmp_path) is None
+    assert cgroup_memory_limit(tmp_path) is None
+
+
+def test_reads_cgroup_v1_limits(tmp_path):
+    (tmp_path / "cpu,cpuacct").mkdir()
+    (tmp_path / "cpu,cpuacct" / "cpu.cfs_quota_us").write_text("300000")
+    (tmp_path / "cpu,cpuacct" / "cpu.cfs_period_us").write_text("100000")
+    (tmp_path / "memory").mkdir()
+    (tmp_path / "memory" / "memory.limit_in_bytes").write_text("9223372036854771712")
+    assert cgroup_cpu_limit(tmp_path) == 3.0
+    assert cgroup_memory_limit(tmp_path) is None
+
+
+def test_no_cgroup_means_no_limits(tmp_path):
+    assert cgroup_cpu_limit(tmp_path) is None
+    assert cgroup_memory_limit(tmp_path) is None
+
+
+def test_auto_sizes_from_cpu_quota_not_visible_cpus():
+    auto = {
+        "on": True,
+        "process_count": "auto",
+        "thread_count": "auto",
+        "intra_op_threads": "auto",
+    }
+    topology = Topology(auto, cpu_limit=4.5, cpu_ids=range(64))
+    assert (topology.process_count, topology.thread_count) == (4, 2)
+    assert topology.intra_op_threads == 1
+
+    topology = Topology({**auto, "process_count": 2}, cpu_limit=8, cpu_ids=range(64))
+    assert (topology.process_count, topology.intra_op_threads) == (2, 4)
+    assert topology.thread_count == 8
+
+
+def test_auto_process_count_fits_memory_limit():
+    multi_processing = {"on": True, "process_count": "auto", "worker_memory_mb": 1500}
+    topology = Topology(
+        multi_processing, cpu_limit=8, memory_limit=4 * GB, cpu_ids=range(8)
+    )
+    assert topology.process_count == 2
+
+
+def test_explicit_values_are_kept():
+    multi_processing = {"on": True, "process_count": 3, "thread_count": 10}
+    topology = Topology(multi_processing, cpu_limit=1, cpu_ids=range(4))
+    resolved = topology.apply(multi_processing)
+    assert (resolved["process_count"], resolved["thread_count"]) == (3, 10)
+    assert resolved["on"] is True
+
+
+def test_pin_cpus_gives_each_worker_a_disjoint_set():
+    multi_processing = {"on": True, "process_count": 3, "pin_cpus": True}
+    topology = Topology(multi_processing, cpu_ids=range(8))
+    assert topology.cpu_sets == [[0, 1, 2], [3, 4, 5], [6, 7]]
+    assert "CPU sets: ['0-2', '3-5', '6-7']" in topology.describe()
+    assert split_cpus([0, 1], 3) == [[0], [1], [0]]
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from aigear.service.grpc.grpc_package.model_registry import ModelRegistry
+from aigear.service.grpc.grpc_package.warmup import (
+    load_warmup_payloads,
+    warm_up,
+    warm_up_models,
+)
+
+
+class _Model:
+    def __init__(self):
+        self.warmups = 0
+        self.inputs = []
+
+    def warmup(self):
+        self.warmups += 1
+
+    def predict(self, data):
+        self.inputs.append(data)
+        return [data["x"]]
+
+
+class _AsyncModel:
+    def __init__(self):
+        self.inputs = []
+
+    async def predict(self, data):
+        self.inputs.append(data)
+        return [data["x"]]
+
+
+def _payload_file(tmp_path, payloads):
+    path = tmp_path / "warmup.json"
+    path.write_text(json.dumps(payloads))
+    return str(path)
+
+
+def test_load_warmup_payloads_accepts_object_or_list(tmp_path):
+    assert load_warmup_payloads(_payload_file(tmp_path, {"x": 1})) == [{"x": 1}]
+    assert load_warmup_payloads(_payload_file(tmp_path, [{"x": 1}, {"x": 2}])) == [
+        {"x": 1},
+        {"x": 2},
+    ]
+    with pytest.raises(ValueError):
+        load_warmup_payloads(_payload_file(tmp_path, [1, 2]))
+
+
+def test_warm_up_without_config_only_calls_hook_once():
+    model = _Model()
+    warm_up(model)
+    assert model.warmups == 1
+    assert model.inputs == []
+
+
+def test_warm_up_runs_hook_and_payloads_for_each_iteration(tmp_path):
+    model = _Model()
+    payload_file = _payload_file(tmp_path, [{"x": 1}, {"x": 2}])
+    seconds = warm_up(
+        model, {"on": True, "iterations": 3, "payload_file": payload_file}
+    )
+    assert seconds >= 0
+    assert model.warmups == 3
+    assert model.inputs == [{"x": 1}, {"x": 2}] * 3
+
+
+def test_warm_up_awaits_async_predict(tmp_path):
+    model = _AsyncModel()
+    payload_file = _payload_file(tmp_path, {"x": 1})
+    warm_up(model, {"on": True, "iterations": 2, "payload_file": payload_file})
+    assert model.inputs == [{"x": 1}] * 2
+
+
+def test_warm_up_models_keeps_going_after_a_failure(tmp_path):
+    model = _Model()
+    models = ModelRegistry.single(
+        model,
+        {"warmup": {"on": True, "iterations": 2, "payload_file": str(tmp_path / "no")}},
+    )
+    warm_up_models(models)
+    assert model.warmups == 0
@@ -0,0 +1,147 @@
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+import pytest
+
+from aigear.service.grpc.grpc_package.profiler import PROFILE_SIGNAL
+from aigear.service.grpc.grpc_package.worker_pool import (
+    RECYCLE_EXIT_CODE,
+    WorkerRecycler,
+    WorkerSupervisor,
+    process_memory,
+)
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="workers are forked processes"
+)
+
+
+def test_recycler_disabled_without_limits():
+    assert WorkerRecycler.from_config(None) is None
+    assert WorkerRecycler.from_config({"jitter": 0.5}) is None
+
+
+def test_recycler_limits_are_jittered_down():
+    limits = {
+        WorkerRecycler(max_requests=1000, jitter=0.2).max_requests for _ in range(50)
+    }
+    assert all(800 <= limit <= 1000 for limit in limits)
+    assert len(limits) > 1
+
+
+def test_recycler_stops_server_after_max_requests():
+    recycler = WorkerRecycler(max_requests=5, jitter=0, check_seconds=0.01)
+    stopped = threading.Event()
+    recycler.watch(stopped.set)
+    for _ in range(4):
+        recycler.count()
+    assert not stopped.wait(0.1)
+    recycler.count()
+    assert stopped.wait(2)
+    assert recycler.triggered
+    assert recycler.reason() == "handled 5 requests"
+
+
+def _exit_with(starts, codes):
+    with starts.get_lock():
+        starts.value += 1
+        index = starts.value - 1
+    os._exit(codes[min(index, len(codes) - 1)])
+
+
+def _supervise(codes, min_starts):
+    starts = multiprocessing.Value("i", 0)
+    supervisor = WorkerSupervisor(
+        _exit_with,
+        args=(starts, codes),
+        process_count=1,
+        backoff_seconds=0.01,
+        max_backoff_seconds=0.05,
+    )
+
+    def _stop_when_started():
+        deadline = time.monotonic() + 10
+        while starts.value < min_starts and time.monotonic() < deadline:
+            time.sleep(0.01)
+        supervisor.stop()
+
+    threading.Thread(target=_stop_when_started, daemon=True).start()
+    supervisor.run()
+    return supervisor, starts.value
+
+
+def test_supervisor_restarts_crashed_and_recycled_workers():
+    supervisor, starts = _supervise([1, RECYCLE_EXIT_CODE, 1, 0], min_starts=4)
+    assert starts >= 4
+    stats = supervisor.stats()
+    assert stats["recycles"] == 1
+    assert stats["crashes"] >= 2
+    # The last exit may be seen after stop(), without a restart
+    assert 3 <= stats["restarts"] <= stats["crashes"] + stats["recycles"]
+    assert stats["alive"] == 0
+
+
+def test_process_memory_reports_rss_pss_uss():
+    memory = process_memory()
+    if memory is None:
+        pytest.skip("/proc/self/smaps_rollup is not available")
+    assert set(memory) == {"rss", "pss", "uss"}
+    assert 0 < memory["uss"] <= memory["pss"] <= memory["rss"]
+
+
+def _report_affinity(results):
+    results.put(sorted(os.sched_getaffinity(0)))
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "sched_setaffinity"), reason="CPU affinity is Linux only"
+)
+def test_supervisor_pins_each_worker_to_its_cpu_set():
+    cpu = sorted(os.sched_getaffinity(0))[0]
+    results = multiprocessing.Queue()
+    supervisor = WorkerSupervisor(
+        _report_affinity, args=(results,), process_count=1, cpu_sets=[[cpu]]
+    )
+    seen = []
+
+    def _stop_after_report():
+        seen.append(results.get(timeout=10))
+        supervisor.stop()
+
+    threading.Thread(target=_stop_after_report, daemon=True).start()
+    supervisor.run()
+    assert seen == [[cpu]]
+
+
+def _report_profile_signal(results):
+    signal.signal(PROFILE_SIGNAL, lambda signum, frame: results.put(os.getpid()))
+    results.put("ready")
+    while True:
+        time.sleep(0.01)
+
+
+def test_supervisor_forwards_profile_signal_to_every_worker():
+    results = multiprocessing.Queue()
+    supervisor = WorkerSupervisor(
+        _report_profile_signal, args=(results,), process_count=2
+    )
+    signalled = []
+
+    def _signal_when_ready():
+        assert [results.get(timeout=10) for _ in range(2)] == ["ready", "ready"]
+        os.kill(os.getpid(), PROFILE_SIGNAL)
+        signalled.extend(results.get(timeout=10) for _ in range(2))
+        supervisor.stop()
+
+    previous = signal.getsignal(PROFILE_SIGNAL)
+    threading.Thread(target=_signal_when_ready, daemon=True).start()
+    try:
+        supervisor.run()
+    finally:
+        signal.signal(PROFILE_SIGNAL, previous)
+    assert len(set(signalled)) == 2
+    assert os.getpid() not in signalled
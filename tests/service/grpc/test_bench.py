@@ -0,0 +1,93 @@
+import json
+from concurrent import futures
+
+import grpc
+import pytest
+
+from aigear.service.grpc.bench import (
+    format_summary,
+    load_payloads,
+    percentile,
+    run_benchmark,
+    run_open_loop,
+)
+from aigear.service.grpc.grpc_service import MLServicer
+from aigear.service.grpc.protos import grpc_pb2_grpc
+
+
+class _Model:
+    def predict(self, data):
+        if data["x"] < 0:
+            raise ValueError("negative input")
+        return [data["x"]]
+
+
+@pytest.fixture
+def target():
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    grpc_pb2_grpc.add_MLServicer_to_server(
+        MLServicer(_Model(), {"request_logging": {"sample_rate": 0}}), server
+    )
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    yield f"localhost:{port}"
+    server.stop(grace=None)
+
+
+def test_load_payloads_reads_json_and_jsonl(tmp_path):
+    json_file = tmp_path / "payload.json"
+    json_file.write_text(json.dumps({"x": 1}))
+    jsonl_file = tmp_path / "payload.jsonl"
+    jsonl_file.write_text('{"x": 1}\n\n{"x": 2}\n')
+    assert load_payloads(json_file) == [{"x": 1}]
+    assert load_payloads(jsonl_file) == [{"x": 1}, {"x": 2}]
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 99.9) == 100
+    assert percentile([], 50) == 0.0
+
+
+def test_closed_loop_reports_throughput_and_errors(target):
+    summary = run_benchmark(
+        target, [{"x": 1}, {"x": -1}], concurrency=2, duration=0.3, warmup=0.1
+    )
+    assert summary["mode"] == "closed"
+    assert summary["requests"] > 0
+    assert summary["ok"] == pytest.approx(summary["requests"] / 2, abs=2)
+    assert summary["errors"] == {"UNKNOWN": summary["requests"] - summary["ok"]}
+    assert summary["throughput_rps"] > 0
+    latency = summary["latency_ms"]
+    assert 0 < latency["p50"] <= latency["p99"] <= latency["p999"] <= latency["max"]
+    assert "UNKNOWN" in format_summary(summary)
+
+
+def test_benchmark_needs_a_positive_duration(target):
+    for warmup in (0, 0.1):
+        with pytest.raises(ValueError):
+            run_benchmark(target, [{"x": 1}], duration=0, warmup=warmup)
+
+
+def test_open_loop_sends_at_fixed_rate(target):
+    summary = run_benchmark(target, [{"x": 1}], qps=100, duration=0.5, warmup=0)
+    assert summary["mode"] == "open"
+    assert summary["requests"] == 50
+    assert summary["ok"] == 50
+    assert summary["duration_seconds"] >= 0.49
+
+
+class _CancelledStub:
+    class Predict:
+        @staticmethod
+        def future(request, timeout=None):
+            future = futures.Future()
+            future.set_exception(grpc.FutureCancelledError())
+            return future
+
+
+def test_open_loop_counts_requests_that_fail_without_a_status():
+    result = run_open_loop(_CancelledStub(), [None], qps=100, duration=0.05)
+    assert result.summary()["errors"] == {"CANCELLED": 5}
@@ -0,0 +1,170 @@
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+
+from aigear.service.grpc.client import ModelClient, PredictionError, service_config
+from aigear.service.grpc.grpc_service import MLServicer
+from aigear.service.grpc.protos import grpc_pb2_grpc
+
+
+class _Model:
+    def __init__(self):
+        self.batches = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def predict(self, data):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if data.get("slow_first") and call == 1:
+            time.sleep(1)
+        time.sleep(data.get("sleep", 0))
+        if data["x"] < 0:
+            raise ValueError("negative input")
+        return [data["x"] * 2]
+
+    def predict_batch(self, inputs):
+        self.batches.append(len(inputs))
+        return [self.predict(data) for data in inputs]
+
+    def predict_tensor(self, array):
+        return array * 2
+
+    def predict_arrow(self, table):
+        return {"y": [x * 2 for x in table.column("x").to_pylist()]}
+
+
+class _SheddingServicer(grpc_pb2_grpc.MLServicer):
+    """Answers the first call with RESOURCE_EXHAUSTED, then delegates."""
+
+    def __init__(self, servicer):
+        self.servicer = servicer
+        self.calls = 0
+
+    def Predict(self, request, context):
+        self.calls += 1
+        if self.calls == 1:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "overloaded")
+        return self.servicer.Predict(request, context)
+
+
+def _serve(servicer):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
+    grpc_pb2_grpc.add_MLServicer_to_server(servicer, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, f"localhost:{port}"
+
+
+@pytest.fixture
+def model():
+    return _Model()
+
+
+@pytest.fixture
+def target(model):
+    server, address = _serve(MLServicer(model, {"request_logging": {"sample_rate": 0}}))
+    yield address
+    server.stop(grace=None)
+
+
+def test_predict_round_robins_over_channel_pool(target):
+    with ModelClient(target, pool_size=3) as client:
+        client.wait_ready(timeout=5)
+        assert [client.predict({"x": x}) for x in range(6)] == [
+            [x * 2.0] for x in range(6)
+        ]
+        assert len(client._channels) == 3
+        assert next(client._counter) == 6
+
+
+def test_predict_raises_rpc_error(target):
+    with ModelClient(target) as client:
+        with pytest.raises(grpc.RpcError) as e:
+            client.predict({"x": -1})
+    assert e.value.code() is grpc.StatusCode.UNKNOWN
+
+
+def test_predict_batch_returns_item_errors(target, model):
+    with ModelClient(target) as client:
+        results = client.predict_batch([{"x": 1}, {"x": -1}, {"x": 3}])
+    assert results[0] == [2.0] and results[2] == [6.0]
+    assert isinstance(results[1], PredictionError)
+    assert results[1].code is grpc.StatusCode.INTERNAL
+    assert "negative input" in results[1].message
+
+
+def test_predict_arrow_round_trips_tables(target):
+    pa = pytest.importorskip("pyarrow")
+    with ModelClient(target) as client:
+        result = client.predict_arrow(pa.table({"x": [1, 2, 3]}))
+    assert result.to_pydict() == {"y": [2, 4, 6]}
+
+
+def test_predict_tensor_round_trips_arrays(target):
+    np = pytest.importorskip("numpy")
+    array = np.arange(6, dtype=np.float32).reshape(2, 3)
+    with ModelClient(target) as client:
+        np.testing.assert_array_equal(client.predict_tensor(array), array * 2)
+
+
+def test_client_batching_sends_concurrent_calls_together(target, model):
+    with ModelClient(
+        target, batching={"max_batch_size": 16, "max_wait_ms": 20}
+    ) as client:
+        with futures.ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda x: client.predict({"x": x}), range(16)))
+        with pytest.raises(PredictionError):
+            client.predict({"x": -1})
+    assert results == [[x * 2.0] for x in range(16)]
+    assert sum(model.batches[:-1]) == 16
+    assert max(model.batches) > 1
+
+
+def test_hedging_answers_from_the_faster_call(target):
+    with ModelClient(target, pool_size=2, hedging_delay_ms=50) as client:
+        client.wait_ready(timeout=5)
+        started = time.monotonic()
+        assert client.predict({"x": 1, "slow_first": True}) == [2.0]
+    assert time.monotonic() - started < 0.9
+
+
+def test_hedged_copies_share_the_call_deadline(target):
+    with ModelClient(target, pool_size=2, hedging_delay_ms=200) as client:
+        client.wait_ready(timeout=5)
+        started = time.monotonic()
+        with pytest.raises(grpc.RpcError) as e:
+            client.predict({"x": 1, "sleep": 0.4}, timeout=0.3)
+    assert e.value.code() is grpc.StatusCode.DEADLINE_EXCEEDED
+    assert time.monotonic() - started < 0.5
+
+
+def test_retries_resource_exhausted(model):
+    servicer = _SheddingServicer(MLServicer(model))
+    server, address = _serve(servicer)
+    try:
+        with ModelClient(address) as client:
+            assert client.predict({"x": 1}) == [2.0]
+        assert servicer.calls == 2
+        servicer.calls = 0
+        with ModelClient(address, retry=None) as client:
+            with pytest.raises(grpc.RpcError) as e:
+                client.predict({"x": 1})
+        assert e.value.code() is grpc.StatusCode.RESOURCE_EXHAUSTED
+    finally:
+        server.stop(grace=None)
+
+
+def test_service_config_sets_round_robin_and_retry_policy():
+    import json
+
+    config = json.loads(service_config({"max_attempts": 4}))
+    assert config["loadBalancingConfig"] == [{"round_robin": {}}]
+    policy = config["methodConfig"][0]["retryPolicy"]
+    assert policy["maxAttempts"] == 4
+    assert policy["initialBackoff"] == "0.05s"
+    assert "methodConfig" not in json.loads(service_config(None))
@@ -0,0 +1,220 @@
+import asyncio
+import threading
+
+import grpc
+import pytest
+from google.protobuf import struct_pb2
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+from aigear.service.grpc.grpc_aio_service import build_aio_server
+from aigear.service.grpc.grpc_package import arrow_codec
+from aigear.service.grpc.grpc_package.arrow_codec import decode_table, encode_table
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+
+class _SyncModel:
+    def __init__(self):
+        self.threads = set()
+
+    def predict(self, data):
+        self.threads.add(threading.current_thread().name)
+        return [data["x"] + 1]
+
+
+class _AsyncModel:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    async def predict(self, data):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.05)
+        self.running -= 1
+        return [data["x"] * 10]
+
+
+def _struct(payload: dict) -> struct_pb2.Struct:
+    struct = struct_pb2.Struct()
+    struct.update(payload)
+    return struct
+
+
+async def _with_stub(model, grpc_options, call):
+    server = await build_aio_server(model, grpc_options)
+    port = server.add_insecure_port("localhost:0")
+    await server.start()
+    try:
+        async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+            return await call(grpc_pb2_grpc.MLStub(channel))
+    finally:
+        await server.stop(grace=None)
+
+
+def test_sync_predict_runs_on_bounded_executor():
+    model = _SyncModel()
+
+    async def call(stub):
+        return await stub.Predict(grpc_pb2.MLRequest(request=_struct({"x": 1})))
+
+    response = asyncio.run(
+        _with_stub(model, {"multi_processing": {"thread_count": 2}}, call)
+    )
+    assert list(response.response["response"]) == [2]
+    assert all(name.startswith("aigear-aio") for name in model.threads)
+
+
+def test_async_predict_is_awaited_concurrently():
+    model = _AsyncModel()
+
+    async def call(stub):
+        requests = [
+            stub.Predict(grpc_pb2.MLRequest(request=_struct({"x": i})))
+            for i in range(10)
+        ]
+        return await asyncio.gather(*requests)
+
+    responses = asyncio.run(
+        _with_stub(model, {"multi_processing": {"thread_count": 1}}, call)
+    )
+    assert [list(r.response["response"]) for r in responses] == [
+        [i * 10] for i in range(10)
+    ]
+    # Concurrency is not capped by thread_count for async models
+    assert model.max_running > 1
+
+
+def test_predict_stream_answers_every_request():
+    model = _AsyncModel()
+
+    async def call(stub):
+        requests = [
+            grpc_pb2.MLStreamRequest(request_id=str(i), request=_struct({"x": i}))
+            for i in range(5)
+        ]
+        return [r async for r in stub.PredictStream(iter(requests))]
+
+    responses = asyncio.run(_with_stub(model, {}, call))
+    by_id = {r.request_id: r for r in responses}
+    assert sorted(by_id) == [str(i) for i in range(5)]
+    assert list(by_id["3"].response["response"]) == [30]
+
+
+class _SlowWarmupModel(_SyncModel):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def warmup(self):
+        self.release.wait(5)
+
+
+def test_server_is_warm_before_it_is_returned():
+    model = _SlowWarmupModel()
+
+    async def run():
+        build = asyncio.ensure_future(build_aio_server(model, {}))
+        await asyncio.sleep(0.2)
+        built_while_cold = build.done()
+        model.release.set()
+        server = await build
+        port = server.add_insecure_port("localhost:0")
+        await server.start()
+        try:
+            async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+                stub = health_pb2_grpc.HealthStub(channel)
+                response = await stub.Check(health_pb2.HealthCheckRequest())
+                return built_while_cold, response.status
+        finally:
+            await server.stop(grace=None)
+
+    built_while_cold, status = asyncio.run(run())
+    assert built_while_cold is False
+    assert status == health_pb2.HealthCheckResponse.SERVING
+
+
+def test_predict_batch_runs_async_predicts_concurrently():
+    model = _AsyncModel()
+
+    async def call(stub):
+        request = grpc_pb2.MLBatchRequest()
+        for i in range(5):
+            request.requests.add().update({"x": i})
+        return await stub.PredictBatch(request)
+
+    response = asyncio.run(_with_stub(model, {}, call))
+    assert [list(r.response["response"]) for r in response.results] == [
+        [i * 10] for i in range(5)
+    ]
+    assert model.max_running > 1
+
+
+def test_identical_async_predicts_are_coalesced():
+    model = _AsyncModel()
+
+    async def call(stub):
+        requests = [
+            stub.Predict(grpc_pb2.MLRequest(request=_struct({"x": i % 2})))
+            for i in range(6)
+        ]
+        return await asyncio.gather(*requests)
+
+    responses = asyncio.run(_with_stub(model, {"coalescing": {"on": True}}, call))
+    assert [list(r.response["response"]) for r in responses] == [[0], [10]] * 3
+    assert model.max_running == 2
+
+
+def test_predict_arrow_runs_async_predict_arrow():
+    pa = pytest.importorskip("pyarrow")
+
+    class _ArrowModel:
+        async def predict_arrow(self, table):
+            return pa.table({"n": [table.num_rows]})
+
+    async def call(stub):
+        return await stub.PredictArrow(
+            grpc_pb2.ArrowRequest(data=encode_table({"x": [1, 2, 3]}))
+        )
+
+    response = asyncio.run(_with_stub(_ArrowModel(), {}, call))
+    assert decode_table(response.data).to_pydict() == {"n": [3]}
+
+
+def test_predict_arrow_without_pyarrow_fails_precondition(monkeypatch):
+    def _missing_pyarrow(data):
+        raise ModuleNotFoundError("No module named 'pyarrow'", name="pyarrow")
+
+    monkeypatch.setattr(arrow_codec, "decode_table", _missing_pyarrow)
+
+    async def call(stub):
+        try:
+            await stub.PredictArrow(grpc_pb2.ArrowRequest(data=b"table"))
+        except grpc.RpcError as e:
+            return e.code()
+
+    code = asyncio.run(_with_stub(_SyncModel(), {}, call))
+    assert code == grpc.StatusCode.FAILED_PRECONDITION
+
+
+def test_admission_sheds_calls_beyond_the_bound():
+    model = _AsyncModel()
+    grpc_options = {
+        "multi_processing": {"thread_count": 1},
+        "admission": {"on": True, "max_queue": 1, "queue_budget_ms": 0},
+    }
+
+    async def call(stub):
+        requests = [
+            stub.Predict(grpc_pb2.MLRequest(request=_struct({"x": i})))
+            for i in range(4)
+        ]
+        codes = []
+        for result in await asyncio.gather(*requests, return_exceptions=True):
+            codes.append(result.code() if isinstance(result, grpc.RpcError) else "OK")
+        # The slots are free again once the calls complete
+        await stub.Predict(grpc_pb2.MLRequest(request=_struct({"x": 9})))
+        return codes
+
+    codes = asyncio.run(_with_stub(model, grpc_options, call))
+    assert codes.count("OK") == 2
+    assert codes.count(grpc.StatusCode.RESOURCE_EXHAUSTED) == 2
@@ -0,0 +1,509 @@
+import gc
+import multiprocessing
+import os
+import threading
+import time
+from concurrent import futures
+from unittest.mock import MagicMock
+
+import grpc
+import pytest
+from google.protobuf import struct_pb2
+
+from aigear.service.grpc.grpc_package import arrow_codec, struct_codec, tensor_codec
+from aigear.service.grpc.grpc_package.arrow_codec import decode_table, encode_table
+from aigear.service.grpc.grpc_package.model_registry import (
+    MODEL_METADATA_KEY,
+    ModelRegistry,
+    ServedModel,
+)
+from aigear.service.grpc.grpc_package.response_cache import SharedResponseCache
+from aigear.service.grpc.grpc_package.tensor_codec import decode_tensor, encode_tensor
+from aigear.service.grpc.grpc_service import MLServicer
+from aigear.service.grpc.protos import grpc_pb2, grpc_pb2_grpc
+
+
+class _Model:
+    def predict(self, data):
+        return [data["x"] * 2]
+
+
+class _BatchModel(_Model):
+    def __init__(self):
+        self.batches = []
+
+    def predict_batch(self, inputs):
+        self.batches.append(len(inputs))
+        return [[item["x"] * 3] for item in inputs]
+
+
+def _request(payload: dict):
+    struct = struct_pb2.Struct()
+    struct.update(payload)
+    return grpc_pb2.MLRequest(request=struct)
+
+
+def test_predict_returns_model_output_in_response_struct():
+    servicer = MLServicer(_Model())
+    response = servicer.Predict(_request({"x": 2}), MagicMock())
+    assert list(response.response["response"]) == [4]
+
+
+def test_predict_uses_predict_batch_when_batching_on():
+    model = _BatchModel()
+    servicer = MLServicer(model, {"batching": {"on": True, "max_wait_ms": 0}})
+    try:
+        response = servicer.Predict(_request({"x": 2}), MagicMock())
+    finally:
+        servicer.models.default.batcher.close()
+    assert list(response.response["response"]) == [6]
+    assert model.batches == [1]
+
+
+def _predict_in_fork(servicer, results):
+    response = servicer.Predict(_request({"x": 3}), MagicMock())
+    results.put(list(response.response["response"]))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_batched_predict_works_in_a_forked_worker():
+    model = _BatchModel()
+    servicer = MLServicer(model, {"batching": {"on": True, "max_wait_ms": 0}})
+    try:
+        # The parent's batch thread is running when the worker is forked
+        servicer.Predict(_request({"x": 1}), MagicMock())
+        # Servers left over from other tests would be finalized in the worker
+        gc.collect()
+        context = multiprocessing.get_context("fork")
+        results = context.SimpleQueue()
+        worker = context.Process(target=_predict_in_fork, args=(servicer, results))
+        worker.start()
+        worker.join(timeout=10)
+        if worker.is_alive():
+            worker.kill()
+    finally:
+        servicer.models.default.batcher.close()
+    assert worker.exitcode == 0
+    assert results.get() == [9]
+
+
+def test_batching_falls_back_to_predict_without_predict_batch():
+    servicer = MLServicer(_Model(), {"batching": {"on": True}})
+    assert servicer.models.default.batcher is None
+    response = servicer.Predict(_request({"x": 5}), MagicMock())
+    assert list(response.response["response"]) == [10]
+
+
+def test_predict_tensor_passes_array_to_predict_tensor():
+    np = pytest.importorskip("numpy")
+
+    class _TensorModel:
+        def predict_tensor(self, array):
+            return array.sum(axis=1)
+
+    servicer = MLServicer(_TensorModel())
+    request = grpc_pb2.TensorRequest(
+        tensor=encode_tensor(np.ones((2, 3), dtype=np.float32))
+    )
+    response = servicer.PredictTensor(request, MagicMock())
+    np.testing.assert_array_equal(decode_tensor(response.tensor), [3.0, 3.0])
+
+
+def test_predict_tensor_aborts_on_invalid_tensor():
+    pytest.importorskip("numpy")
+    context = MagicMock()
+    context.abort.side_effect = RuntimeError("aborted")
+    servicer = MLServicer(_Model())
+    request = grpc_pb2.TensorRequest(
+        tensor=grpc_pb2.Tensor(data=b"\x00" * 3, dtype="<f4", shape=[1])
+    )
+    with pytest.raises(RuntimeError, match="aborted"):
+        servicer.PredictTensor(request, context)
+    assert context.abort.call_args[0][0] == grpc.StatusCode.INVALID_ARGUMENT
+
+
+def test_predict_tensor_without_numpy_fails_precondition(monkeypatch):
+    def _missing_numpy(tensor):
+        raise ModuleNotFoundError("No module named 'numpy'", name="numpy")
+
+    monkeypatch.setattr(tensor_codec, "decode_tensor", _missing_numpy)
+    context = MagicMock()
+    context.abort.side_effect = RuntimeError("aborted")
+    servicer = MLServicer(_Model())
+    with pytest.raises(RuntimeError, match="aborted"):
+        servicer.PredictTensor(grpc_pb2.TensorRequest(), context)
+    assert context.abort.call_args[0][0] == grpc.StatusCode.FAILED_PRECONDITION
+
+
+def test_predict_arrow_passes_table_to_predict_arrow():
+    pa = pytest.importorskip("pyarrow")
+
+    class _ArrowModel:
+        def predict_arrow(self, table):
+            return {"score": [x * 2 for x in table.column("x").to_pylist()]}
+
+    servicer = MLServicer(_ArrowModel())
+    request = grpc_pb2.ArrowRequest(data=encode_table(pa.table({"x": [1.0, 2.0]})))
+    response = servicer.PredictArrow(request, MagicMock())
+    assert decode_table(response.data).to_pydict() == {"score": [2.0, 4.0]}
+
+
+def test_predict_arrow_falls_back_to_predict_with_a_dataframe():
+    pytest.importorskip("pyarrow")
+    pytest.importorskip("pandas")
+
+    class _FrameModel:
+        def predict(self, frame):
+            return (frame["x"] + 1).to_numpy()
+
+    servicer = MLServicer(_FrameModel())
+    request = grpc_pb2.ArrowRequest(data=encode_table({"x": [1, 2]}))
+    response = servicer.PredictArrow(request, MagicMock())
+    assert decode_table(response.data).to_pydict() == {"prediction": [2, 3]}
+
+
+def test_predict_arrow_aborts_on_invalid_payload():
+    pytest.importorskip("pyarrow")
+    context = MagicMock()
+    context.abort.side_effect = RuntimeError("aborted")
+    servicer = MLServicer(_Model())
+    with pytest.raises(RuntimeError, match="aborted"):
+        servicer.PredictArrow(grpc_pb2.ArrowRequest(data=b"junk"), context)
+    assert context.abort.call_args[0][0] == grpc.StatusCode.INVALID_ARGUMENT
+
+
+class _TableWithoutPandas:
+    num_rows = 1
+    num_columns = 1
+
+    def to_pandas(self):
+        raise ModuleNotFoundError("No module named 'pandas'", name="pandas")
+
+
+@pytest.mark.parametrize("missing", ["pyarrow", "pandas"])
+def test_predict_arrow_without_dependency_fails_precondition(monkeypatch, missing):
+    def _decode_table(data):
+        if missing == "pyarrow":
+            raise ModuleNotFoundError("No module named 'pyarrow'", name="pyarrow")
+        return _TableWithoutPandas()
+
+    monkeypatch.setattr(arrow_codec, "decode_table", _decode_table)
+    context = MagicMock()
+    context.abort.side_effect = RuntimeError("aborted")
+    servicer = MLServicer(_Model())
+    with pytest.raises(RuntimeError, match="aborted"):
+        servicer.PredictArrow(grpc_pb2.ArrowRequest(data=b"table"), context)
+    code, details = context.abort.call_args[0]
+    assert code == grpc.StatusCode.FAILED_PRECONDITION
+    assert missing in details
+
+
+@pytest.fixture
+def grpc_stub():
+    servers = []
+
+    def _start(model, grpc_options=None):
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        grpc_pb2_grpc.add_MLServicer_to_server(MLServicer(model, grpc_options), server)
+        port = server.add_insecure_port("localhost:0")
+        server.start()
+        servers.append(server)
+        channel = grpc.insecure_channel(f"localhost:{port}")
+        return grpc_pb2_grpc.MLStub(channel)
+
+    yield _start
+    for server in servers:
+        server.stop(grace=None)
+
+
+def _stream_request(request_id: str, payload: dict):
+    struct = struct_pb2.Struct()
+    struct.update(payload)
+    return grpc_pb2.MLStreamRequest(request_id=request_id, request=struct)
+
+
+class _SlowFirstModel:
+    def predict(self, data):
+        if data["x"] == 0:
+            time.sleep(0.3)
+        if data["x"] < 0:
+            raise ValueError("negative input")
+        return [data["x"]]
+
+
+def test_predict_stream_answers_every_request_by_id(grpc_stub):
+    stub = grpc_stub(_SlowFirstModel(), {"multi_processing": {"thread_count": 4}})
+    requests = [_stream_request(f"id-{i}", {"x": i}) for i in range(5)]
+    responses = list(stub.PredictStream(iter(requests)))
+    assert sorted(r.request_id for r in responses) == [f"id-{i}" for i in range(5)]
+    for response in responses:
+        assert response.code == 0
+        assert list(response.response["response"]) == [int(response.request_id[3:])]
+    # The slow first request is answered after the fast ones
+    assert responses[-1].request_id == "id-0"
+
+
+def test_predict_stream_reports_item_errors_without_failing_stream(grpc_stub):
+    stub = grpc_stub(_SlowFirstModel())
+    requests = [_stream_request("bad", {"x": -1}), _stream_request("good", {"x": 1})]
+    responses = {r.request_id: r for r in stub.PredictStream(iter(requests))}
+    assert responses["bad"].code == grpc.StatusCode.INTERNAL.value[0]
+    assert "negative input" in responses["bad"].error
+    assert responses["good"].code == 0
+
+
+def test_predict_stream_answers_requests_that_fail_to_decode(monkeypatch):
+    decode_struct = struct_codec.decode_struct
+
+    def _decode_struct(struct, numpy_arrays=False):
+        if struct["x"] < 0:
+            raise TypeError("undecodable input")
+        return decode_struct(struct, numpy_arrays)
+
+    monkeypatch.setattr(struct_codec, "decode_struct", _decode_struct)
+    servicer = MLServicer(_Model(), {"streaming": {"max_in_flight": 1}})
+    requests = [_stream_request(str(i), {"x": x}) for i, x in enumerate([-1, -2, 3])]
+    responses = {
+        r.request_id: r for r in servicer.PredictStream(iter(requests), MagicMock())
+    }
+    assert "undecodable input" in responses["0"].error
+    assert responses["1"].code == grpc.StatusCode.INTERNAL.value[0]
+    assert list(responses["2"].response["response"]) == [6]
+
+
+def test_predict_stream_uses_batcher_when_enabled(grpc_stub):
+    model = _BatchModel()
+    stub = grpc_stub(model, {"batching": {"on": True, "max_wait_ms": 20}})
+    requests = [_stream_request(str(i), {"x": i}) for i in range(20)]
+    responses = {r.request_id: r for r in stub.PredictStream(iter(requests))}
+    assert len(responses) == 20
+    assert list(responses["7"].response["response"]) == [21]
+    assert sum(model.batches) == 20
+
+
+def _batch_request(*payloads):
+    request = grpc_pb2.MLBatchRequest()
+    for payload in payloads:
+        request.requests.add().update(payload)
+    return request
+
+
+def _batch_outputs(response):
+    return [
+        list(r.response["response"]) if r.code == 0 else r.code
+        for r in response.results
+    ]
+
+
+def test_predict_batch_calls_predict_batch_once():
+    model = _BatchModel()
+    servicer = MLServicer(model)
+    response = servicer.PredictBatch(_batch_request({"x": 1}, {"x": 2}), MagicMock())
+    assert _batch_outputs(response) == [[3], [6]]
+    assert model.batches == [2]
+
+
+def test_predict_batch_loops_predict_and_keeps_item_errors():
+    servicer = MLServicer(_SlowFirstModel())
+    response = servicer.PredictBatch(
+        _batch_request({"x": 1}, {"x": -1}, {"x": 2}), MagicMock()
+    )
+    assert _batch_outputs(response) == [[1], grpc.StatusCode.INTERNAL.value[0], [2]]
+    assert "negative input" in response.results[1].error
+
+
+def test_predict_batch_falls_back_to_predict_when_predict_batch_fails():
+    class _FailingBatchModel(_Model):
+        def predict_batch(self, inputs):
+            raise ValueError("bad batch")
+
+    servicer = MLServicer(_FailingBatchModel())
+    response = servicer.PredictBatch(_batch_request({"x": 1}, {"x": 2}), MagicMock())
+    assert _batch_outputs(response) == [[2], [4]]
+
+
+def test_predict_serves_repeated_request_from_cache():
+    model = MagicMock()
+    model.predict.return_value = [1]
+    cache = SharedResponseCache(max_entries=16)
+    try:
+        servicer = MLServicer(model, response_cache=cache)
+        first = servicer.Predict(_request({"item": "a", "store": "b"}), MagicMock())
+        second = servicer.Predict(_request({"store": "b", "item": "a"}), MagicMock())
+        stats = cache.stats()
+    finally:
+        cache.close()
+    assert model.predict.call_count == 1
+    assert second == first
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_model_swap_serves_new_model_and_bypasses_old_cache_entries():
+    old_model, new_model = MagicMock(), MagicMock()
+    old_model.predict.return_value = ["old"]
+    new_model.predict.return_value = ["new"]
+    cache = SharedResponseCache(max_entries=16)
+    try:
+        servicer = MLServicer(old_model, response_cache=cache, model_release="v1")
+        before = servicer.Predict(_request({"x": 1}), MagicMock())
+        servicer.models.default.swap(new_model, "v2")
+        after = servicer.Predict(_request({"x": 1}), MagicMock())
+    finally:
+        cache.close()
+    assert list(before.response["response"]) == ["old"]
+    assert list(after.response["response"]) == ["new"]
+    assert servicer.models.default.model_release == "v2"
+
+
+class _NamedModel:
+    def __init__(self, name):
+        self.name = name
+
+    def predict(self, data):
+        return [self.name]
+
+
+def _two_models():
+    return ModelRegistry(
+        [
+            ServedModel("ranker", _NamedModel("ranker")),
+            ServedModel("ctr", _NamedModel("ctr")),
+        ]
+    )
+
+
+def test_predict_routes_by_model_field_and_metadata(grpc_stub):
+    stub = grpc_stub(_two_models())
+    by_default = stub.Predict(_request({"x": 1}))
+    by_metadata = stub.Predict(
+        _request({"x": 1}), metadata=[(MODEL_METADATA_KEY, "ctr")]
+    )
+    request = _request({"x": 1})
+    request.model = "ranker"
+    by_field = stub.Predict(request, metadata=[(MODEL_METADATA_KEY, "ctr")])
+    assert list(by_default.response["response"]) == ["ranker"]
+    assert list(by_metadata.response["response"]) == ["ctr"]
+    assert list(by_field.response["response"]) == ["ranker"]
+
+
+def test_predict_rejects_unknown_model(grpc_stub):
+    stub = grpc_stub(_two_models())
+    with pytest.raises(grpc.RpcError) as exc_info:
+        stub.Predict(_request({"x": 1}), metadata=[(MODEL_METADATA_KEY, "missing")])
+    assert exc_info.value.code() == grpc.StatusCode.NOT_FOUND
+
+
+def test_predict_stream_routes_each_item(grpc_stub):
+    stub = grpc_stub(_two_models())
+    requests = [_stream_request("a", {"x": 1}), _stream_request("b", {"x": 1})]
+    requests[1].model = "ctr"
+    bad = _stream_request("c", {"x": 1})
+    bad.model = "missing"
+    responses = {r.request_id: r for r in stub.PredictStream(iter(requests + [bad]))}
+    assert list(responses["a"].response["response"]) == ["ranker"]
+    assert list(responses["b"].response["response"]) == ["ctr"]
+    assert responses["c"].code == grpc.StatusCode.NOT_FOUND.value[0]
+
+
+class _ContextModel:
+    def __init__(self):
+        self.calls = []
+        self.entered = threading.Event()
+
+    def predict(self, data, context):
+        self.calls.append(data["x"])
+        if data["x"] == 2:
+            # Works until the client gives up
+            self.entered.set()
+            while True:
+                context.check()
+                time.sleep(0.01)
+        return [context.time_remaining() is not None]
+
+
+class _SlowBatchModel(_Model):
+    def __init__(self):
+        self.inputs = []
+        self.entered = threading.Event()
+
+    def predict_batch(self, inputs):
+        self.inputs.extend(item["x"] for item in inputs)
+        self.entered.set()
+        time.sleep(0.3)
+        return [[item["x"]] for item in inputs]
+
+
+def _serve(servicer, max_workers=1):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    grpc_pb2_grpc.add_MLServicer_to_server(servicer, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, grpc_pb2_grpc.MLStub(grpc.insecure_channel(f"localhost:{port}"))
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_model_with_context_parameter_sees_the_deadline():
+    servicer = MLServicer(_ContextModel())
+    server, stub = _serve(servicer)
+    try:
+        assert list(stub.Predict(_request({"x": 1}), timeout=5).response["response"])[0]
+        assert not list(stub.Predict(_request({"x": 1})).response["response"])[0]
+    finally:
+        server.stop(grace=None)
+
+
+def test_request_expired_in_the_batcher_queue_is_not_predicted():
+    model = _SlowBatchModel()
+    servicer = MLServicer(
+        model, {"batching": {"on": True, "max_batch_size": 1, "max_wait_ms": 0}}
+    )
+    server, stub = _serve(servicer, max_workers=4)
+    try:
+        # The batcher is busy with the first call while the second one's deadline passes
+        slow = stub.Predict.future(_request({"x": 0}))
+        assert model.entered.wait(timeout=5)
+        with pytest.raises(grpc.RpcError) as error:
+            stub.Predict(_request({"x": 1}), timeout=0.1)
+        assert error.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+        slow.result()
+        assert _wait_for(lambda: servicer.abandoned.stats()["deadline"]["queued"] == 1)
+    finally:
+        server.stop(grace=None)
+        servicer.models.default.batcher.close()
+    assert model.inputs == [0]
+
+
+def test_model_stops_when_the_client_cancels():
+    model = _ContextModel()
+    servicer = MLServicer(model)
+    server, stub = _serve(servicer)
+    try:
+        call = stub.Predict.future(_request({"x": 2}))
+        assert model.entered.wait(timeout=5)
+        call.cancel()
+        assert _wait_for(
+            lambda: servicer.abandoned.stats()["cancelled"]["running"] == 1
+        )
+    finally:
+        server.stop(grace=None)
+
+
+class _NumpyModel:
+    def predict(self, data):
+        return data["features"] * 2
+
+
+def test_numpy_inputs_pass_numeric_lists_as_arrays():
+    np = pytest.importorskip("numpy")
+    servicer = MLServicer(_NumpyModel(), {"numpy_inputs": {"on": True}})
+    features = [float(index) for index in range(16)]
+    response = servicer.Predict(_request({"features": features}), MagicMock())
+    np.testing.assert_array_equal(
+        list(response.response["response"]), np.array(features) * 2
+    )
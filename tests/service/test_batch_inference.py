@@ -0,0 +1,120 @@
+import csv
+import json
+import sys
+
+import pytest
+
+from aigear.service.batch_inference import Progress, run_batch
+
+
+class _Model:
+    def predict(self, data):
+        if data["x"] < 0:
+            raise ValueError("negative input")
+        return [data["x"] * 2]
+
+
+class _BatchModel(_Model):
+    def __init__(self):
+        self.batches = []
+
+    def predict_batch(self, inputs):
+        self.batches.append(len(inputs))
+        return [[item["x"] * 3] for item in inputs]
+
+
+def _write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+
+def _read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_run_batch_keeps_order_and_item_errors(tmp_path):
+    input_path = tmp_path / "input.jsonl"
+    output_path = tmp_path / "output.jsonl"
+    _write_jsonl(input_path, [{"id": i, "x": -1 if i == 3 else i} for i in range(10)])
+    stats = run_batch(_Model(), input_path, output_path, chunk_size=4)
+    assert stats["rows"] == 10 and stats["errors"] == 1
+    rows = _read_jsonl(output_path)
+    assert [row["id"] for row in rows] == list(range(10))
+    assert rows[0] == {"id": 0, "x": 0, "prediction": [0], "error": None}
+    assert rows[3]["prediction"] is None and rows[3]["error"] == "negative input"
+
+
+def test_run_batch_uses_predict_batch_per_chunk(tmp_path):
+    input_path = tmp_path / "input.jsonl"
+    output_path = tmp_path / "output.csv"
+    _write_jsonl(input_path, [{"id": i, "x": i} for i in range(5)])
+    model = _BatchModel()
+    run_batch(model, input_path, output_path, chunk_size=2, keep_columns=["id"])
+    assert model.batches == [2, 2, 1]
+    with open(output_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[4] == {"id": "4", "prediction": "[12]", "error": ""}
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="workers are forked processes")
+def test_run_batch_fans_chunks_out_to_processes(tmp_path):
+    input_path = tmp_path / "input.jsonl"
+    output_path = tmp_path / "output.jsonl"
+    _write_jsonl(input_path, [{"id": i, "x": i} for i in range(100)])
+    stats = run_batch(_Model(), input_path, output_path, chunk_size=7, processes=3)
+    assert stats["rows"] == 100
+    rows = _read_jsonl(output_path)
+    assert [row["prediction"] for row in rows] == [[i * 2] for i in range(100)]
+
+
+def test_run_batch_reads_and_writes_parquet(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    input_path = tmp_path / "input.parquet"
+    output_path = tmp_path / "output.parquet"
+    pq.write_table(pa.Table.from_pylist([{"x": i} for i in range(5)]), input_path)
+    stats = run_batch(_Model(), input_path, output_path, chunk_size=2)
+    assert stats["rows"] == 5
+    assert pq.read_table(output_path).column("prediction").to_pylist()[4] == [8]
+
+
+class _ChangingModel:
+    def predict(self, data):
+        if data["x"] < 2:
+            raise ValueError("warming up")
+        if data["x"] == 7:
+            return "n/a"
+        return data["x"] if data["x"] < 4 else data["x"] / 2
+
+
+def test_run_batch_writes_parquet_when_the_prediction_type_changes(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    input_path = tmp_path / "input.parquet"
+    output_path = tmp_path / "output.parquet"
+    pq.write_table(pa.Table.from_pylist([{"x": i} for i in range(9)]), input_path)
+    # Errors only, then integers, then floats and a string
+    stats = run_batch(_ChangingModel(), input_path, output_path, chunk_size=2)
+    assert (stats["rows"], stats["errors"]) == (9, 3)
+    table = pq.read_table(output_path)
+    assert table.schema.field("prediction").type == pa.float64()
+    assert table.column("prediction").to_pylist() == [
+        None,
+        None,
+        2.0,
+        3.0,
+        2.0,
+        2.5,
+        3.0,
+        None,
+        4.0,
+    ]
+    errors = table.column("error").to_pylist()
+    assert errors[:2] == ["warming up"] * 2
+    assert "does not fit" in errors[7]
+
+
+def test_progress_reports_rows_and_throughput():
+    progress = Progress(total_rows=4, interval_seconds=0)
+    progress.update([{"error": None}, {"error": "failed"}])
+    assert progress.stats()["rows"] == 2 and progress.errors == 1
+    assert "2/4 (50.0%)" in progress.describe()